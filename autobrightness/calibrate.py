@@ -0,0 +1,295 @@
+"""Fits a brightness curve to traces recorded with --record.
+
+Traces are streamed in chunks of `chunk_size` events, so memory stays
+bounded however many rows and machines are processed. For every interval
+between two events the light level and the brightness kept on screen are
+accumulated per log-lux bin, weighted by the interval length. Manual
+corrections, the `bias` events, count as `CORRECTION_WEIGHT` seconds on
+top. Intervals while the display is dimmed by PowerDevil are skipped.
+
+Bins are then split into buckets by dynamic programming, minimizing the
+weighted squared error between bucket brightness and the brightness users
+kept. Bucket overlaps are sized from the short-term lux fluctuation seen
+in the traces, so noise alone does not switch buckets.
+
+Requires NumPy, installed with the `calibrate` extra.
+"""
+
+import numpy as np
+
+from autobrightness.curve import BrightnessCurve
+from autobrightness.trace import read_trace
+
+BINS_PER_DECADE = 20
+DECADES = 5  # log10(lux + 1) up to 100000 lux
+DELTA_BINS = 200  # lux fluctuation histogram, 0.01 decades per bin
+DELTA_STEP = 0.01
+
+# seconds of dwell time a manual correction is worth
+CORRECTION_WEIGHT = 600.0
+# longer gaps between events, e.g. suspend, are capped
+MAX_DWELL = 600.0
+# overlap covers this quantile of lux changes between consecutive readings
+FLUCTUATION_QUANTILE = 0.9
+MIN_OVERLAP = 0.02
+MAX_OVERLAP = 0.5
+
+
+def to_x(lux):
+    return np.log10(np.maximum(lux, 0) + 1)
+
+
+def to_lux(x: float) -> float:
+    return 10**x - 1
+
+
+def significant(value: float) -> float:
+    return float(f"{max(value, 0):.3g}")
+
+
+class CalibrationData:
+    """Per-bin totals of dwell time, kept brightness and corrections"""
+
+    def __init__(self) -> None:
+        bins = BINS_PER_DECADE * DECADES
+        self.weight = np.zeros(bins)
+        self.sum_p = np.zeros(bins)
+        self.sum_p2 = np.zeros(bins)
+        self.corrections = np.zeros(bins)
+        self.correction_sum_p = np.zeros(bins)
+        self.deltas = np.zeros(DELTA_BINS)
+        self.events = 0
+        self.seconds = 0.0
+
+    @staticmethod
+    def bin_of(lux):
+        bins = BINS_PER_DECADE * DECADES
+        return np.clip((to_x(lux) * BINS_PER_DECADE).astype(np.int64), 0, bins - 1)
+
+    def add_chunk(self, t, lux, percent, valid, correction, lux_event):
+        """Accumulates one chunk of event rows.
+
+        Row i describes the state after event i at time t[i], it holds
+        until the next row. The last row of a chunk is passed again as the
+        first row of the next one.
+        """
+        n = len(t)
+        self.events += n - 1
+        if n < 2:
+            return
+
+        bins = BINS_PER_DECADE * DECADES
+        dwell = np.minimum(np.diff(t), MAX_DWELL)
+        held = valid[:-1] & (dwell > 0)
+        b = self.bin_of(lux[:-1][held])
+        w = dwell[held]
+        p = percent[:-1][held]
+        self.weight += np.bincount(b, w, bins)
+        self.sum_p += np.bincount(b, w * p, bins)
+        self.sum_p2 += np.bincount(b, w * p * p, bins)
+        self.seconds += float(w.sum())
+
+        # corrections happen at row i itself, not over the following interval
+        fixed = correction[1:] & valid[1:]
+        b = self.bin_of(lux[1:][fixed])
+        p = percent[1:][fixed]
+        self.corrections += np.bincount(b, minlength=bins)
+        self.correction_sum_p += np.bincount(b, p, bins)
+        self.weight += np.bincount(b, minlength=bins) * CORRECTION_WEIGHT
+        self.sum_p += np.bincount(b, p * CORRECTION_WEIGHT, bins)
+        self.sum_p2 += np.bincount(b, p * p * CORRECTION_WEIGHT, bins)
+
+        x = to_x(lux[lux_event])
+        if len(x) > 1:
+            d = (np.abs(np.diff(x)) / DELTA_STEP).astype(np.int64)
+            self.deltas += np.bincount(
+                np.minimum(d, DELTA_BINS - 1), minlength=DELTA_BINS
+            )
+
+    def overlap(self) -> float:
+        """Half width of the hysteresis band in decades"""
+        total = self.deltas.sum()
+        if not total:
+            return MIN_OVERLAP
+        i = int(np.searchsorted(np.cumsum(self.deltas), FLUCTUATION_QUANTILE * total))
+        return min(max((i + 1) * DELTA_STEP, MIN_OVERLAP), MAX_OVERLAP)
+
+
+def read_events(path: str, data: CalibrationData, chunk_size: int = 65536):
+    """Streams one trace into `data`, `chunk_size` rows at a time"""
+    t = np.zeros(chunk_size + 1)
+    lux = np.zeros(chunk_size + 1)
+    percent = np.zeros(chunk_size + 1)
+    valid = np.zeros(chunk_size + 1, dtype=bool)
+    correction = np.zeros(chunk_size + 1, dtype=bool)
+    lux_event = np.zeros(chunk_size + 1, dtype=bool)
+
+    level = None
+    brightness = max_brightness = 0
+    dimmed = manual = False
+    n = 0
+
+    for ts, kind, values in read_trace(path):
+        fixed = False
+        if kind == "lux":
+            level = values[0]
+        elif kind == "display":
+            max_brightness, brightness = values
+            dimmed = False
+        elif kind == "anim_stop":
+            brightness = values[0]
+        elif kind == "brightness":
+            # same heuristics as DisplayController for PowerDevil dimming
+            ratio = round(values[0] / brightness, 2) if brightness else 0
+            if ratio == 0.3:
+                dimmed = True
+            elif ratio == 3.33:
+                dimmed = False
+            manual = ratio not in (0.3, 3.33)
+            brightness = values[0]
+        elif kind == "bias":
+            fixed = manual and values[0] != 0
+            manual = False
+        elif kind != "start":
+            continue
+
+        t[n] = ts
+        lux[n] = level or 0
+        percent[n] = brightness / max_brightness * 100 if max_brightness else 0
+        valid[n] = bool(max_brightness) and level is not None and not dimmed
+        correction[n] = fixed
+        lux_event[n] = kind == "lux"
+        n += 1
+
+        if n == chunk_size + 1:
+            data.add_chunk(t, lux, percent, valid, correction, lux_event)
+            for column in (t, lux, percent, valid, correction, lux_event):
+                column[0] = column[n - 1]
+            n = 1
+
+    data.add_chunk(
+        t[:n], lux[:n], percent[:n], valid[:n], correction[:n], lux_event[:n]
+    )
+
+
+def segment(data: CalibrationData, count: int) -> list:
+    """Splits the bins into at most `count` contiguous segments minimizing
+    the weighted squared brightness error, returns (start, end) bin pairs"""
+    used = np.nonzero(data.weight)[0]
+    if not len(used):
+        raise ValueError("traces contain no light level with a display attached")
+    lo, hi = int(used[0]), int(used[-1]) + 1
+    count = min(count, len(used))
+
+    w = np.concatenate([[0], np.cumsum(data.weight[lo:hi])])
+    s = np.concatenate([[0], np.cumsum(data.sum_p[lo:hi])])
+    s2 = np.concatenate([[0], np.cumsum(data.sum_p2[lo:hi])])
+    n = hi - lo
+
+    # cost[i, j] of one segment over bins i..j-1, infinite when empty
+    i = np.arange(n + 1)[:, None]
+    j = np.arange(n + 1)[None, :]
+    sw = w[j] - w[i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost = (s2[j] - s2[i]) - (s[j] - s[i]) ** 2 / sw
+    cost[(j <= i) | (sw <= 0)] = np.inf
+
+    best = cost[0].copy()
+    back = np.zeros((count, n + 1), dtype=np.int64)
+    for k in range(1, count):
+        total = best[:, None] + cost
+        back[k] = np.argmin(total, axis=0)
+        best = total[back[k], np.arange(n + 1)]
+
+    bounds = []
+    end = n
+    for k in range(count - 1, -1, -1):
+        start = int(back[k][end]) if k else 0
+        bounds.append((lo + start, lo + end))
+        end = start
+    return bounds[::-1]
+
+
+def fit_curve(data: CalibrationData, count: int = 5) -> BrightnessCurve:
+    segments = segment(data, count)
+    percents = []
+    for start, end in segments:
+        weight = data.weight[start:end].sum()
+        percents.append(float(data.sum_p[start:end].sum() / weight))
+    # brightness never goes down as light goes up
+    percents = np.clip(np.maximum.accumulate(percents), 0, 100).tolist()
+
+    edges = [start / BINS_PER_DECADE for start, _ in segments[1:]]
+    widths = [(end - start) / BINS_PER_DECADE for start, end in segments]
+    band = min(data.overlap(), 0.4 * min(widths))
+
+    buckets = []
+    for k, percent in enumerate(percents):
+        lower = to_lux(edges[k - 1] - band) if k else 0
+        upper = to_lux(edges[k] + band) if k < len(edges) else to_lux(DECADES)
+        buckets.append((significant(lower), significant(upper), round(percent, 1)))
+    return BrightnessCurve(buckets)
+
+
+def correction_error(data: CalibrationData, curve: BrightnessCurve) -> float:
+    """Mean distance in percent between corrected brightness and the curve"""
+    total = data.corrections.sum()
+    if not total:
+        return 0.0
+    compiled = curve.compile(1000)
+    error = 0.0
+    for b in np.nonzero(data.corrections)[0]:
+        lux = to_lux((b + 0.5) / BINS_PER_DECADE)
+        percent = compiled.values[compiled.index(lux, 0)] / 10
+        wanted = data.correction_sum_p[b] / data.corrections[b]
+        error += abs(wanted - percent) * data.corrections[b]
+    return float(error / total)
+
+
+def count_transitions(paths: list, curve: BrightnessCurve) -> int:
+    """Bucket changes the curve makes over the recorded light levels"""
+    compiled = curve.compile(1000)
+    transitions = 0
+    for path in paths:
+        idx = curve.initial_index()
+        for _, kind, values in read_trace(path):
+            if kind == "lux":
+                new_idx = compiled.index(values[0], idx)
+                transitions += new_idx != idx
+                idx = new_idx
+    return transitions
+
+
+def calibrate(
+    paths: list, buckets: int = 5, chunk_size: int = 65536, current=None
+) -> tuple:
+    """Fits a curve to the traces, returns it with a summary comparing it
+    to the `current` curve"""
+    data = CalibrationData()
+    for path in paths:
+        read_events(path, data, chunk_size)
+
+    curve = fit_curve(data, buckets)
+    current = current or BrightnessCurve.from_config(None)
+    summary = {
+        "events": data.events,
+        "hours": round(data.seconds / 3600, 2),
+        "corrections": int(data.corrections.sum()),
+        "overlap_decades": round(data.overlap(), 3),
+        "correction_error_current": round(correction_error(data, current), 1),
+        "correction_error_fitted": round(correction_error(data, curve), 1),
+        "transitions_current": count_transitions(paths, current),
+        "transitions_fitted": count_transitions(paths, curve),
+    }
+    return curve, summary
+
+
+def curve_config(curve: BrightnessCurve) -> dict:
+    """Config section for a curve, infinite bounds are capped so the output
+    stays valid JSON"""
+    top = significant(to_lux(DECADES))
+    return {
+        "curve": {
+            "buckets": [[min(l, top), min(u, top), p] for l, u, p in curve.buckets]
+        }
+    }
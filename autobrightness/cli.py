@@ -1,13 +1,176 @@
 import logging
-from gi.repository import GLib
-from dbus.mainloop.glib import DBusGMainLoop
 import argparse
+import os
+import signal
 import sys
+import time
 
-from autobrightness.services.autobrightness import AutoBrightnessService
+from autobrightness.config import load_config
+
+
+def reload_config(service, path: str | None):
+    try:
+        service.configure(load_config(path))
+        logging.info("Configuration reloaded")
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logging.error(f"Failed to reload configuration: {e}")
+    return True
+
+
+def query_service(backend: str, method: str):
+    """Calls GetStats or GetEvents of the running service, None on failure"""
+    if backend == "asyncio":
+        import asyncio
+        from jeepney import DBusErrorResponse
+        from autobrightness.services.aio import query_stats
+
+        try:
+            return asyncio.run(query_stats(method))
+        except (DBusErrorResponse, OSError) as e:
+            logging.error(f"Failed to query service stats: {e}")
+            return None
+
+    from dbus.exceptions import DBusException
+    from autobrightness.services.stats import StatsServiceDBus
+
+    try:
+        client = StatsServiceDBus(None)
+        return client.query_events() if method == "GetEvents" else client.query()
+    except DBusException as e:
+        logging.error(f"Failed to query service stats: {e}")
+        return None
+
+
+def run_calibrate(args):
+    import json
+
+    try:
+        from autobrightness.calibrate import calibrate, curve_config
+    except ImportError as e:
+        logging.error(f"calibrate requires numpy: {e}")
+        return 1
+
+    from autobrightness.curve import BrightnessCurve
+
+    try:
+        current = BrightnessCurve.from_config(load_config(args.config).get("curve"))
+        curve, summary = calibrate(args.traces, args.buckets, args.chunk_size, current)
+    except (OSError, ValueError) as e:
+        logging.error(f"Calibration failed: {e}")
+        return 1
+
+    # the curve goes to stdout, the summary next to it on stderr
+    for key, value in summary.items():
+        print(f"{key}: {value}", file=sys.stderr)
+
+    text = json.dumps(curve_config(curve), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def setup_service(service, args, started_at: float, profiler):
+    from autobrightness.state import StateWriter, load_state, state_path
+
+    service.started_at = started_at
+    service.configure(load_config(args.config))
+    if args.debounce is not None:
+        service.debounce_interval = args.debounce
+    if args.record:
+        from autobrightness.trace import TraceRecorder
+
+        service.recorder = TraceRecorder(args.record)
+
+    try:
+        service.restore_state(load_state(state_path()))
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+        logging.warning(f"Ignoring saved state: {e}")
+    service.state_writer = StateWriter(
+        state_path(), service.scheduler, service.get_state
+    )
+
+    if args.profile_startup:
+        service.on_first_write_done = lambda: profiler.stop_profile("startup")
+
+
+def finish_service(service, profiler):
+    service.stop()
+    if service.recorder:
+        service.recorder.close()
+    profiler.stop_profile()
+
+
+def run_glib(args, started_at: float, profiler):
+    from gi.repository import GLib
+    from dbus.mainloop.glib import DBusGMainLoop
+    from autobrightness.services.autobrightness import AutoBrightnessService
+    from autobrightness.services.stats import StatsServiceDBus
+
+    logging.info(f"Imports took {(time.monotonic() - started_at) * 1000:.0f} ms")
+    DBusGMainLoop(set_as_default=True)
+
+    service = AutoBrightnessService(displays=args.displays, sensor=args.sensor)
+    setup_service(service, args, started_at, profiler)
+    stats_dbus = StatsServiceDBus(service.get_stats, service.get_events)
+
+    try:
+        loop = GLib.MainLoop()
+        GLib.unix_signal_add(
+            GLib.PRIORITY_DEFAULT, signal.SIGHUP, reload_config, service, args.config
+        )
+        GLib.unix_signal_add(
+            GLib.PRIORITY_DEFAULT, signal.SIGUSR1, profiler.toggle_profile
+        )
+        GLib.unix_signal_add(
+            GLib.PRIORITY_DEFAULT, signal.SIGUSR2, profiler.toggle_memory
+        )
+        service.run()
+        stats_dbus.run()
+        loop.run()
+    finally:
+        stats_dbus.stop()
+        finish_service(service, profiler)
+
+
+def run_asyncio(args, started_at: float, profiler):
+    import asyncio
+    from autobrightness.scheduler import AsyncioScheduler
+    from autobrightness.services import aio
+    from autobrightness.services.autobrightness import AutoBrightnessService
+
+    logging.info(f"Imports took {(time.monotonic() - started_at) * 1000:.0f} ms")
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    service = AutoBrightnessService(
+        AsyncioScheduler(loop),
+        backend="asyncio",
+        displays=args.displays,
+        sensor=args.sensor,
+    )
+    setup_service(service, args, started_at, profiler)
+    stats_dbus = aio.AsyncStatsService(service.get_stats, service.get_events)
+
+    try:
+        loop.add_signal_handler(signal.SIGHUP, reload_config, service, args.config)
+        loop.add_signal_handler(signal.SIGUSR1, profiler.toggle_profile)
+        loop.add_signal_handler(signal.SIGUSR2, profiler.toggle_memory)
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, loop.stop)
+        service.run()
+        stats_dbus.run()
+        loop.run_forever()
+    finally:
+        stats_dbus.stop()
+        finish_service(service, profiler)
+        loop.run_until_complete(aio.shutdown())
+        loop.close()
 
 
 def main():
+    started_at = time.monotonic()
     ch = logging.StreamHandler(sys.stdout)
     logging.root.addHandler(ch)
 
@@ -22,6 +185,83 @@ def main():
         action=argparse.BooleanOptionalAction,
         help="Enable verbose logging",
     )
+    parser.add_argument(
+        "--config",
+        metavar="FILE",
+        help="Config file, defaults to $XDG_CONFIG_HOME/autobrightness/config.json",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print statistics of the running service",
+    )
+    parser.add_argument(
+        "--events",
+        action="store_true",
+        help="Print recent brightness decisions of the running service",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="FILE",
+        help="Append sensor and brightness events to a trace file",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="FILE",
+        help="Replay a recorded trace offline and print a summary",
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Profile from start until the first brightness write",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["dbus", "asyncio"],
+        default="dbus",
+        help="D-Bus backend, asyncio requires jeepney (default: dbus)",
+    )
+    parser.add_argument(
+        "--displays",
+        choices=["powerdevil", "backlight"],
+        default="powerdevil",
+        help="Control displays through PowerDevil, or /sys/class/backlight "
+        "and logind without PowerDevil (default: powerdevil)",
+    )
+    parser.add_argument(
+        "--sensor",
+        choices=["sensor-proxy", "iio"],
+        default="sensor-proxy",
+        help="Read light through iio-sensor-proxy, or from the IIO device "
+        "directly (default: sensor-proxy)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        metavar="SECONDS",
+        help="Delay before a brightness bucket change is applied",
+    )
+
+    commands = parser.add_subparsers(dest="command")
+    calibrate = commands.add_parser(
+        "calibrate",
+        help="Fit a brightness curve to recorded traces, requires numpy",
+    )
+    calibrate.add_argument("traces", nargs="+", metavar="TRACE")
+    calibrate.add_argument(
+        "--buckets", type=int, default=5, help="Number of buckets, default 5"
+    )
+    calibrate.add_argument(
+        "--chunk-size",
+        type=int,
+        default=65536,
+        help="Trace events processed at once, bounds memory use",
+    )
+    calibrate.add_argument(
+        "--output",
+        metavar="FILE",
+        help="Write the curve as a config file instead of printing it",
+    )
 
     args = parser.parse_args()
 
@@ -31,10 +271,6 @@ def main():
         print(default_systemd_cfg)
         return
 
-    DBusGMainLoop(set_as_default=True)
-
-    service = AutoBrightnessService()
-
     if args.verbose:
         root = logging.getLogger()
         hdlr = root.handlers[0]
@@ -46,13 +282,47 @@ def main():
     else:
         logging.root.setLevel(logging.INFO)
 
-    try:
-        loop = GLib.MainLoop()
-        service.run()
-        loop.run()
-    finally:
-        service.stop()
+    if args.command == "calibrate":
+        return run_calibrate(args)
+
+    if args.stats or args.events:
+        from autobrightness.services.common import format_stats
+        from autobrightness.eventlog import format_events
+
+        result = query_service(args.backend, "GetEvents" if args.events else "GetStats")
+        if result is None:
+            return 1
+        print(format_events(result) if args.events else format_stats(result))
+        return
+
+    if args.replay:
+        from autobrightness.scheduler import VirtualScheduler
+        from autobrightness.replay import replay
+        from autobrightness.services.autobrightness import AutoBrightnessService
+
+        service = AutoBrightnessService(scheduler=VirtualScheduler(), backend="replay")
+        service.configure(load_config(args.config))
+        if args.debounce is not None:
+            service.debounce_interval = args.debounce
+
+        for key, value in replay(args.replay, service).items():
+            print(f"{key}: {value}")
+        return
+
+    from autobrightness.profiling import Profiler
+    from autobrightness.state import state_path
+
+    # profiles and dumps are written next to the state snapshot
+    profiler = Profiler(os.path.dirname(state_path()))
+    if args.profile_startup:
+        profiler.start_profile()
+
+    # dbus and GLib are only needed from here on
+    if args.backend == "asyncio":
+        run_asyncio(args, started_at, profiler)
+    else:
+        run_glib(args, started_at, profiler)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,3 +1,6 @@
+import json
+import os
+
 default_systemd_cfg = """
 [Unit]
 Description=Autobrightness - adjusts screen brighness based on ambient light sensor (ALS)
@@ -6,6 +9,7 @@ StartLimitBurst=10
 
 [Service]
 ExecStart=python %h/.local/bin/autobrightnesscli
+ExecReload=kill -HUP $MAINPID
 Restart=on-failure
 RestartSec=5
 TimeoutStopSec=10
@@ -14,3 +18,23 @@ CPUQuota=5%
 [Install]
 WantedBy=default.target
 """
+
+
+def config_path() -> str:
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config_home, "autobrightness", "config.json")
+
+
+def load_config(path: str | None = None) -> dict:
+    """Reads the JSON config file, a missing default config file is empty"""
+    if path is None:
+        path = config_path()
+        if not os.path.exists(path):
+            return {}
+
+    with open(path) as f:
+        cfg = json.load(f)
+
+    if not isinstance(cfg, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    return cfg
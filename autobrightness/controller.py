@@ -0,0 +1,431 @@
+import logging
+
+from autobrightness.curve import CompiledCurve
+from autobrightness import eventlog
+from autobrightness.transition import EchoWindow, Transition, plan_transition
+
+# DDC/CI writes take tens to hundreds of milliseconds, monitor firmware can
+# stall or drop writes when pushed harder
+EXTERNAL_MAX_WRITE_RATE = 5.0
+
+
+def display_settings(cfg: dict) -> dict:
+    """Validated entry of the `displays` config section"""
+    settings = {
+        "enabled": bool(cfg.get("enabled", True)),
+        "offset": float(cfg.get("offset", 0)),
+    }
+    if "max_write_rate" in cfg:
+        rate = cfg["max_write_rate"]
+        settings["max_write_rate"] = float(rate) if rate else None
+    return settings
+
+
+class DisplayController:
+    """Adaptive brightness of one display.
+
+    Bucket selection, user bias, debounce and transitions are kept per
+    display, so displays animate concurrently and a slow external monitor
+    never holds back the internal panel. Light level, curve and transition
+    settings are shared through `service`.
+    """
+
+    def __init__(self, service, display) -> None:
+        self.service = service
+        self.scheduler = service.scheduler
+        self.display = display
+        self.name = display.name
+        self.max_brightness = display.max_brightness
+        self.current_brightness = display.brightness
+
+        # percent of max brightness added to the curve, writes per second
+        self.offset = 0.0
+        self.max_write_rate = None if display.is_internal else EXTERNAL_MAX_WRITE_RATE
+
+        self.user_brightness_bias = 0
+        self.inhibited_by_powerdevil = False
+        self.anim_bright_target = None
+
+        self.compiled_curve: CompiledCurve | None = None
+        self.current_bucket_idx = service.curve.initial_index()
+
+        self.debounce_source: int | None = None
+        self.transition: Transition | None = None
+        self.anim_source: int | None = None
+
+        # values written and not echoed yet, tell own writes from user changes
+        self.echo_window = EchoWindow()
+        self.echoes = 0
+        # misread before tagging: echoes after the animation ended taken for
+        # user changes, user changes during an animation taken for echoes
+        self.late_echoes = 0
+        self.changes_during_animation = 0
+
+        # path and time of the lux signal the pending change started from,
+        # observed once the last frame is echoed
+        self.settle_from: tuple | None = None
+
+        # last computed target, kept for the event log
+        self.target = self.current_brightness
+        self.log_id = service.event_log.display_id(self.name)
+
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def recorder(self):
+        # traces describe a single display, the internal one
+        return self.service.recorder if self.display.is_internal else None
+
+    def configure(self, cfg: dict):
+        """Applies one entry of the `displays` config section, as returned
+        by `display_settings`"""
+        self.offset = cfg.get("offset", 0.0)
+        if "max_write_rate" in cfg:
+            self.max_write_rate = cfg["max_write_rate"]
+        self.compiled_curve = None
+
+    def reset_curve(self):
+        self.compiled_curve = None
+        last = len(self.service.curve.buckets) - 1
+        self.current_bucket_idx = min(self.current_bucket_idx, last)
+
+    def get_state(self) -> dict:
+        return {
+            "label": self.display.label,
+            "max_brightness": self.max_brightness,
+            "bucket": self.current_bucket_idx,
+            "bias": self.user_brightness_bias,
+        }
+
+    def restore_state(self, state: dict, same_curve: bool):
+        """Resumes bias, and the bucket when the curve is unchanged, from a
+        snapshot taken before a restart"""
+        if state["max_brightness"] != self.max_brightness:
+            return
+        self.user_brightness_bias = state["bias"]
+        if same_curve:
+            last = len(self.service.curve.buckets) - 1
+            self.current_bucket_idx = min(max(state["bucket"], 0), last)
+        self.logger.debug(
+            f"{self.name}: restored bucket={self.current_bucket_idx}, "
+            f"bias={self.user_brightness_bias}"
+        )
+
+    def stop(self):
+        self.cancel_debounce()
+        self.stop_animation()
+        self.anim_bright_target = None
+        self.display.disconnect()
+        self.service.event_log.release_id(self.name)
+
+    def get_recommended_brightness(self, bias=0):
+        if not self.max_brightness:
+            return self.current_brightness
+
+        lut = self.compiled_curve
+        if lut is None or lut.max_brightness != self.max_brightness:
+            lut = self.compiled_curve = self.service.curve.compile(self.max_brightness)
+
+        idx = lut.index(self.service.current_light_level, self.current_bucket_idx)
+        if idx != self.current_bucket_idx:
+            self.current_bucket_idx = idx
+            self.service.bucket_changes += 1
+            self.service.state_changed()
+
+        value = lut.values[idx] + round(self.max_brightness * self.offset / 100) + bias
+        return max(min(value, self.max_brightness), 0)
+
+    def log(self, reason: int):
+        self.service.event_log.record(
+            self.scheduler.monotonic(),
+            reason,
+            self.log_id,
+            self.service.current_light_level,
+            self.current_bucket_idx,
+            self.target,
+            self.current_brightness,
+            self.user_brightness_bias,
+        )
+
+    def update_brightness(self, signaled=False, reason=0, fast_since=None):
+        """`fast_since` is the time a large light jump started, its change
+        skips the debounce and uses the fast transition"""
+        target = self.target = self.get_recommended_brightness(
+            bias=self.user_brightness_bias
+        )
+        if reason:
+            self.log(reason)
+
+        fast = fast_since is not None
+        if fast:
+            self.cancel_debounce()
+            self.settle_from = ("fast", fast_since)
+
+        if self.anim_bright_target is not None:
+            # retarget ongoing animation, brightness bucket might be changed
+            if target != self.anim_bright_target:
+                self.animate_brightness(target, fast)
+            return
+
+        if target == self.current_brightness:
+            self.cancel_debounce()
+            self.settle_from = None
+            return
+
+        if fast:
+            if self.inhibited_by_powerdevil:
+                # nothing is written while dimmed, there is no settle to time
+                self.settle_from = None
+            else:
+                self.animate_brightness(target, fast)
+            return
+
+        if signaled:
+            if self.settle_from is None:
+                self.settle_from = ("normal", self.scheduler.monotonic())
+            # debounce frequent bucket changes, every signal restarts the timer
+            if self.debounce_source is not None:
+                self.service.debounces += 1
+                self.logger.debug(f"{self.name}: debounced")
+            self.cancel_debounce()
+            self.debounce_source = self.scheduler.timeout_add(
+                self.service.debounce_interval, self.on_debounce_timeout
+            )
+            return
+
+        self.logger.debug(f"{self.name}: recomm_brightness={target}")
+        if self.inhibited_by_powerdevil:
+            self.settle_from = None
+        else:
+            self.animate_brightness(target)
+
+    def on_debounce_timeout(self):
+        self.debounce_source = None
+        self.update_brightness(signaled=False)
+        return False
+
+    def cancel_debounce(self):
+        if self.debounce_source is not None:
+            self.scheduler.source_remove(self.debounce_source)
+            self.debounce_source = None
+
+    def stop_animation(self):
+        if self.anim_source is not None:
+            self.scheduler.source_remove(self.anim_source)
+            self.anim_source = None
+
+    def animate_brightness(self, target: int, fast=False):
+        self.stop_animation()
+        service = self.service
+        duration = service.transition_duration
+        max_writes = service.transition_max_writes
+        if fast:
+            duration = service.fast_transition_duration
+            max_writes = service.fast_transition_max_writes
+
+        # continue from the last written frame, its echo might not be back yet
+        start = self.current_brightness
+        if self.anim_bright_target is not None and self.transition:
+            if self.transition.last_value is not None:
+                start = self.transition.last_value
+            if not self.transition.done:
+                service.animations_aborted += 1
+
+        if self.max_write_rate:
+            rate_cap = int(duration * self.max_write_rate) + 1
+            max_writes = min(max_writes, rate_cap)
+
+        values = plan_transition(
+            start, target, self.max_brightness, max_writes, service.transition_gamma
+        )
+        if not values:
+            # wait for the echo of frames already written
+            self.anim_bright_target = (
+                target if start != self.current_brightness else None
+            )
+            return
+
+        self.logger.debug(
+            f"{self.name}: {start=}, {target=}, frame_count={len(values)}"
+        )
+        if self.recorder:
+            self.recorder.record("anim_start", start, target)
+        service.animations_started += 1
+        self.anim_bright_target = self.target = target
+        self.log(eventlog.ANIM_START)
+
+        self.transition = Transition(values, duration, self.scheduler.monotonic())
+        self.animation_frame()
+
+    def animation_frame(self):
+        self.anim_source = None
+        transition = self.transition
+        if transition is None:
+            return False
+
+        now = self.scheduler.monotonic()
+        self.service.on_first_write(now)
+
+        try:
+            self.write(transition.next_value(now), now, frame=True)
+        except Exception as e:
+            self.logger.exception(e)
+            # no echo is coming to end the animation
+            self.anim_bright_target = None
+            self.settle_from = None
+            return False
+
+        if transition.done:
+            self.service.frames_dropped += transition.dropped
+            self.logger.debug(
+                f"{self.name}: transition to {transition.target}: "
+                f"planned {transition.duration:.2f}s/{len(transition.values)} writes, "
+                f"actual {transition.finished_at - transition.started_at:.2f}s/"
+                f"{transition.writes} writes"
+            )
+            self.anim_source = self.scheduler.timeout_add(
+                self.echo_window.timeout, self.on_echo_timeout
+            )
+        else:
+            self.anim_source = self.scheduler.timeout_add(
+                transition.delay(now), self.animation_frame
+            )
+        return False
+
+    def on_echo_timeout(self):
+        """Ends an animation whose last frame was not echoed in time, e.g.
+        because the write failed, later changes are not matched against it"""
+        self.anim_source = None
+        if self.anim_bright_target is not None:
+            self.anim_bright_target = None
+            self.settle_from = None
+            self.logger.debug(f"{self.name}: animate_brightness: echo missing")
+        return False
+
+    def settled(self):
+        if self.settle_from is not None:
+            path, started_at = self.settle_from
+            elapsed = self.scheduler.monotonic() - started_at
+            self.service.settle_time[path].observe(elapsed * 1000)
+            self.settle_from = None
+
+    def clear_bias(self):
+        self.user_brightness_bias = 0
+        self.service.state_changed()
+        if self.recorder:
+            self.recorder.record("bias", 0)
+        self.write(self.get_recommended_brightness(), self.scheduler.monotonic())
+        self.logger.debug(f"{self.name}: user_brightness_bias=0")
+
+    def write(self, value: int, now: float, frame: bool = False):
+        # expected before the call, the echo can arrive while it runs
+        self.echo_window.expect(value, now, frame)
+        self.display.set_brightness(value)
+
+    def get_stats(self) -> dict:
+        stats = {
+            "label": self.display.label,
+            "bucket": self.current_bucket_idx,
+            "brightness": self.current_brightness,
+            "bias": self.user_brightness_bias,
+            "offset": self.offset,
+            "set_brightness_calls": self.display.writes_issued,
+            "set_brightness_merged": self.display.writes_merged,
+            "set_brightness_failed": self.display.writes_failed,
+            "set_brightness_latency_ms": self.display.write_latency.as_dict(),
+            "cache_hits": self.display.props.hits,
+            "cache_misses": self.display.props.misses,
+            "echoes": self.echoes,
+            "late_echoes": self.late_echoes,
+            "changes_during_animation": self.changes_during_animation,
+        }
+        if self.display.signals:
+            stats["signals"] = self.display.signals.as_dict()
+
+        if self.transition and self.transition.finished_at is not None:
+            t = self.transition
+            stats["last_transition"] = {
+                "planned_s": round(t.duration, 3),
+                "planned_writes": len(t.values),
+                "actual_s": round(t.finished_at - t.started_at, 3),
+                "actual_writes": t.writes,
+            }
+
+        return stats
+
+    def handle_brightness_change(self, source, value, *args, **kw):
+        b = int(value["Brightness"]) if "Brightness" in value else None
+        if b is None:
+            return
+
+        undimmed = False
+        reason = eventlog.ECHO
+
+        echo = self.echo_window.match(b, self.scheduler.monotonic())
+        if echo is not None:
+            self.echoes += 1
+            if self.anim_bright_target is None:
+                # single writes, e.g. clearing the bias, have no animation
+                if echo[3]:
+                    self.late_echoes += 1
+            elif b == self.anim_bright_target and not self.echo_window:
+                self.stop_animation()
+                self.anim_bright_target = None
+                reason = eventlog.ANIM_END
+                self.settled()
+                if self.recorder:
+                    self.recorder.record("anim_stop", b)
+                self.logger.debug(f"{self.name}: animate_brightness: end")
+
+        else:
+            if self.anim_bright_target is not None:
+                # brightness set by someone else mid-animation, they win
+                self.changes_during_animation += 1
+                self.stop_animation()
+                self.anim_bright_target = None
+                self.settle_from = None
+
+            reason = eventlog.EXTERNAL
+            if self.recorder:
+                self.recorder.record("brightness", b)
+
+            prev_bias = self.user_brightness_bias
+            self.user_brightness_bias = b - self.get_recommended_brightness()
+
+            # heuristics around powerdevil behaviour dimming screen on idle timeout
+            # do not show notifications when dimming takes place
+            # https://github.com/KDE/powerdevil/blob/bfa2cf691acf37b60541cc61ae11e0fad7c0f816/daemon/actions/bundled/dimdisplay.cpp#L74
+            brightness_ratio = (
+                round(b / self.current_brightness, 2) if self.current_brightness else 0
+            )
+
+            if brightness_ratio == 0.3 and self.user_brightness_bias < prev_bias:
+                self.inhibited_by_powerdevil = True
+                reason = eventlog.DIM
+                self.logger.debug(f"{self.name}: inhibited_by_powerdevil=True")
+                self.service.update_sensor_claim()
+
+            elif brightness_ratio == 3.33 and self.user_brightness_bias > prev_bias:
+                self.inhibited_by_powerdevil = False
+                reason = eventlog.UNDIM
+                self.logger.debug(f"{self.name}: inhibited_by_powerdevil=False")
+                self.service.update_sensor_claim()
+                undimmed = True
+
+            elif self.user_brightness_bias != prev_bias:
+                self.service.on_bias_change(self)
+                self.logger.debug(
+                    f"{self.name}: user_brightness_bias={self.user_brightness_bias}"
+                )
+
+            if self.user_brightness_bias != prev_bias:
+                self.service.state_changed()
+                if self.recorder:
+                    self.recorder.record("bias", self.user_brightness_bias)
+
+        self.current_brightness = b
+        self.log(reason)
+
+        if undimmed:
+            # light level might have changed while dimmed
+            self.update_brightness(signaled=True)
@@ -0,0 +1,141 @@
+from bisect import bisect_right
+from hashlib import sha1
+from math import inf, log10
+
+# Optimized 5-level brightness buckets for stable operation
+# Each tuple: (lower_bound, upper_bound, brightness_percent)
+# Wider overlaps reduce frequent brightness changes
+DEFAULT_BUCKETS = [
+    (0, 50, 15),  # Night/Very dim - minimal brightness
+    (25, 200, 30),  # Dim indoor/Evening - low brightness
+    (150, 650, 50),  # Normal indoor/Office - comfortable brightness
+    (450, 2000, 75),  # Bright indoor/Near window - high brightness
+    (900, 10000, 100),  # Outdoor/Very bright - maximum brightness
+]
+
+
+class BrightnessCurve:
+    """Maps lux to brightness percent through overlapping lux buckets.
+
+    The current bucket is kept while lux stays within its bounds, the overlap
+    between neighbouring buckets acts as a hysteresis band.
+    """
+
+    def __init__(self, buckets: list) -> None:
+        buckets = [(float(l), float(u), float(p)) for l, u, p in buckets]
+        if not buckets:
+            raise ValueError("curve must have at least one bucket")
+
+        for i, (lower, upper, percent) in enumerate(buckets):
+            if lower >= upper:
+                raise ValueError(f"bucket {i}: lower bound must be below upper bound")
+            if not 0 <= percent <= 100:
+                raise ValueError(f"bucket {i}: brightness must be within 0-100%")
+            if i and (lower < buckets[i - 1][0] or upper < buckets[i - 1][1]):
+                raise ValueError(f"bucket {i}: bounds must be ascending")
+            if i and lower > buckets[i - 1][1]:
+                raise ValueError(f"bucket {i}: gap after previous bucket")
+
+        self.buckets = buckets
+
+    @classmethod
+    def from_config(cls, cfg: dict | None) -> "BrightnessCurve":
+        """Builds a curve from the `curve` section of the config file.
+
+        Either `{"buckets": [[lower, upper, percent], ...]}` or a piecewise
+        linear curve `{"points": [[lux, percent], ...], "scale": "log",
+        "steps": 12, "hysteresis": 0.25}`.
+        """
+        if not cfg:
+            return cls(DEFAULT_BUCKETS)
+        if "buckets" in cfg:
+            return cls(cfg["buckets"])
+        if "points" in cfg:
+            return cls.from_points(
+                cfg["points"],
+                steps=int(cfg.get("steps", 12)),
+                hysteresis=float(cfg.get("hysteresis", 0.25)),
+                scale=cfg.get("scale", "log"),
+            )
+        raise ValueError("curve needs either 'buckets' or 'points'")
+
+    @classmethod
+    def from_points(
+        cls, points: list, steps: int = 12, hysteresis: float = 0.25, scale="log"
+    ) -> "BrightnessCurve":
+        """Quantizes a piecewise linear lux curve into `steps` buckets.
+
+        Segments are interpolated over log10(lux + 1) when scale is "log" and
+        over lux otherwise. Each bucket is widened by `hysteresis` times its
+        width on both sides.
+        """
+        if scale not in ("log", "linear"):
+            raise ValueError(f"unknown curve scale '{scale}'")
+        if len(points) < 2 or steps < 1:
+            raise ValueError("curve needs at least two points and one step")
+
+        if scale == "log":
+            to_x = lambda lux: log10(lux + 1)
+            to_lux = lambda x: 10**x - 1
+        else:
+            to_x = to_lux = lambda v: v
+
+        xs = [to_x(float(lux)) for lux, _ in points]
+        ys = [float(p) for _, p in points]
+        if any(a >= b for a, b in zip(xs, xs[1:])):
+            raise ValueError("curve points must have ascending lux")
+
+        def interpolate(x):
+            i = min(max(bisect_right(xs, x), 1), len(xs) - 1)
+            x0, x1, y0, y1 = xs[i - 1], xs[i], ys[i - 1], ys[i]
+            return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+        width = (xs[-1] - xs[0]) / steps
+        band = width * hysteresis
+        buckets = []
+        for i in range(steps):
+            x0 = xs[0] + i * width
+            lower = to_lux(x0 - band) if i else 0
+            upper = to_lux(x0 + width + band) if i < steps - 1 else inf
+            percent = min(max(interpolate(x0 + width / 2), 0), 100)
+            buckets.append((max(lower, 0), upper, round(percent, 1)))
+
+        return cls(buckets)
+
+    @property
+    def version(self) -> str:
+        """Short hash of the buckets, changes whenever the curve does"""
+        return sha1(repr(self.buckets).encode()).hexdigest()[:12]
+
+    def initial_index(self) -> int:
+        """Index of the brightest bucket not above 50%"""
+        for i in range(len(self.buckets) - 1, -1, -1):
+            if self.buckets[i][2] <= 50:
+                return i
+        return 0
+
+    def compile(self, max_brightness: int) -> "CompiledCurve":
+        return CompiledCurve(self, max_brightness)
+
+
+class CompiledCurve:
+    """Bucket bounds and brightness values precomputed for one max_brightness"""
+
+    __slots__ = ("max_brightness", "lower_bounds", "upper_bounds", "values", "last")
+
+    def __init__(self, curve: BrightnessCurve, max_brightness: int) -> None:
+        self.max_brightness = max_brightness
+        self.lower_bounds = [l for l, u, p in curve.buckets]
+        self.upper_bounds = [u for l, u, p in curve.buckets]
+        self.values = [round(max_brightness * p / 100) for l, u, p in curve.buckets]
+        self.last = len(curve.buckets) - 1
+
+    def index(self, lux: float, idx: int) -> int:
+        """Bucket for `lux` given the current bucket `idx`, in O(log n)"""
+        if lux >= self.upper_bounds[idx]:
+            # first bucket whose upper bound is above lux
+            return min(bisect_right(self.upper_bounds, lux), self.last)
+        if lux < self.lower_bounds[idx]:
+            # last bucket whose lower bound is not above lux
+            return max(bisect_right(self.lower_bounds, lux) - 1, 0)
+        return idx
@@ -0,0 +1,122 @@
+from array import array
+
+# reason codes
+LUX = 1
+ANIM_START = 2
+ECHO = 3
+ANIM_END = 4
+EXTERNAL = 5
+DIM = 6
+UNDIM = 7
+
+REASONS = {
+    LUX: "lux",
+    ANIM_START: "anim_start",
+    ECHO: "echo",
+    ANIM_END: "anim_end",
+    EXTERNAL: "external",
+    DIM: "dim",
+    UNDIM: "undim",
+}
+
+
+class EventLog:
+    """Last `size` brightness decisions in preallocated ring buffer columns.
+
+    Recording stores plain numbers into fixed arrays, nothing is formatted
+    or allocated per event, so it stays enabled on every machine and can be
+    dumped after the fact.
+    """
+
+    def __init__(self, size: int = 1024) -> None:
+        if size < 1:
+            raise ValueError("event log size must be at least 1")
+        self.size = size
+        self.times = array("d", [0.0]) * size
+        self.reasons = array("b", [0]) * size
+        self.displays = array("H", [0]) * size
+        self.lux = array("q", [0]) * size
+        self.buckets = array("h", [0]) * size
+        self.targets = array("q", [0]) * size
+        self.brightness = array("q", [0]) * size
+        self.bias = array("q", [0]) * size
+        self.pos = 0
+        self.recorded = 0
+        # id by name and name by id, ids of removed displays are reused once
+        # no recorded event refers to them anymore
+        self.ids: dict[str, int] = {}
+        self.names: list = []
+        self.released: set = set()
+
+    def display_id(self, name: str) -> int:
+        display = self.ids.get(name)
+        if display is not None:
+            self.released.discard(display)
+            return display
+
+        display = self._unused_id()
+        self.ids[name] = display
+        self.names[display] = name
+        return display
+
+    def release_id(self, name: str):
+        """The display is gone, its events keep the name until the id is reused"""
+        if name in self.ids:
+            self.released.add(self.ids[name])
+
+    def _unused_id(self) -> int:
+        if self.released:
+            count = min(self.recorded, self.size)
+            used = (
+                set(self.displays) if count == self.size else set(self.displays[:count])
+            )
+            for display in sorted(self.released - used):
+                self.released.discard(display)
+                del self.ids[self.names[display]]
+                return display
+        self.names.append(None)
+        return len(self.names) - 1
+
+    def record(self, t, reason, display, lux, bucket, target, brightness, bias):
+        i = self.pos
+        self.times[i] = t
+        self.reasons[i] = reason
+        self.displays[i] = display
+        self.lux[i] = lux
+        self.buckets[i] = bucket
+        self.targets[i] = target
+        self.brightness[i] = brightness
+        self.bias[i] = bias
+        self.pos = i + 1 if i + 1 < self.size else 0
+        self.recorded += 1
+
+    def events(self, now: float) -> list:
+        """Recorded events, oldest first, with their age in seconds at `now`"""
+        count = min(self.recorded, self.size)
+        start = (self.pos - count) % self.size
+        result = []
+        for k in range(count):
+            i = (start + k) % self.size
+            result.append(
+                {
+                    "age_s": round(now - self.times[i], 3),
+                    "reason": REASONS.get(self.reasons[i], "unknown"),
+                    "display": self.names[self.displays[i]],
+                    "lux": self.lux[i],
+                    "bucket": self.buckets[i],
+                    "target": self.targets[i],
+                    "brightness": self.brightness[i],
+                    "bias": self.bias[i],
+                }
+            )
+        return result
+
+
+def format_events(events: list) -> str:
+    lines = []
+    for e in events:
+        fields = " ".join(
+            f"{k}={e[k]}" for k in ("lux", "bucket", "target", "brightness", "bias")
+        )
+        lines.append(f"-{e['age_s']:.3f}s {e['display']} {e['reason']}: {fields}")
+    return "\n".join(lines)
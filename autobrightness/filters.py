@@ -0,0 +1,249 @@
+from math import exp, log10
+
+
+class EMAFilter:
+    """Exponential moving average with time constant `tau` seconds"""
+
+    def __init__(self, tau: float = 1.0) -> None:
+        self.tau = tau
+        self.settle_time = tau
+        self.value: float | None = None
+        self.last_input = 0.0
+        self.last_time = 0.0
+
+    @property
+    def pending(self) -> bool:
+        return self.value is not None and abs(self.value - self.last_input) >= 0.5
+
+    def process(self, value: float, now: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            alpha = 1 - exp(-(now - self.last_time) / self.tau)
+            self.value += alpha * (value - self.value)
+        self.last_input = value
+        self.last_time = now
+        return self.value
+
+    def reset(self, value: float):
+        self.value = self.last_input = value
+
+
+class MedianFilter:
+    """Median over the last `window` samples held in a fixed ring buffer.
+
+    Single sample spikes, e.g. a hand passing over the sensor, are dropped.
+    """
+
+    def __init__(self, window: int = 3, interval: float = 0.5) -> None:
+        if window < 1:
+            raise ValueError("median window must be at least 1")
+        self.window = window
+        self.settle_time = interval
+        self.samples = [None] * window
+        self.pos = 0
+        self.value: float | None = None
+        self.last_input = 0.0
+
+    @property
+    def pending(self) -> bool:
+        return self.value is not None and self.value != self.last_input
+
+    def process(self, value: float, now: float) -> float:
+        self.samples[self.pos] = value
+        self.pos = (self.pos + 1) % self.window
+        self.last_input = value
+
+        values = sorted(v for v in self.samples if v is not None)
+        self.value = values[len(values) // 2]
+        return self.value
+
+    def reset(self, value: float):
+        self.samples = [value] * self.window
+        self.value = self.last_input = value
+
+
+class LogDeadbandFilter:
+    """Suppresses changes smaller than `ratio` decades of lux"""
+
+    settle_time = 0
+    pending = False
+
+    def __init__(self, ratio: float = 0.05) -> None:
+        self.ratio = ratio
+        self.value: float | None = None
+
+    def process(self, value: float, now: float) -> float | None:
+        if self.value is not None:
+            if abs(log10(value + 1) - log10(self.value + 1)) < self.ratio:
+                return None
+        self.value = value
+        return value
+
+    def reset(self, value: float):
+        self.value = value
+
+
+class JumpDetector:
+    """Spots order-of-magnitude light changes, e.g. a lamp switched on.
+
+    A raw reading at least `ratio` decades away from the applied light
+    level starts a jump. It is confirmed once `samples` readings in a row
+    agree, or when the latest reading is still past `ratio` in the same
+    direction `window` seconds after the first, sensors do not signal a
+    level which stays put. A hand passing over the sensor is back to normal
+    by then and stays on the normal path. `emit(value, started_at)` gets
+    the latest reading and the time of the first one.
+    """
+
+    def __init__(
+        self,
+        scheduler,
+        emit: callable,
+        ratio: float = 1.0,
+        samples: int = 2,
+        window: float = 1.0,
+    ):
+        if samples < 1:
+            raise ValueError("fast path needs at least 1 sample")
+        if ratio <= 0 or window <= 0:
+            raise ValueError("fast path ratio and window must be positive")
+        self.scheduler = scheduler
+        self.emit = emit
+        self.ratio = ratio
+        self.samples = samples
+        self.window = window
+        self.direction = 0
+        self.count = 0
+        self.started_at = 0.0
+        self.value = 0
+        self.confirm_source: int | None = None
+
+    def process(self, value: int, reference: int) -> bool:
+        """Whether `value` confirmed a jump, which was emitted then"""
+        delta = log10(max(value, 0) + 1) - log10(max(reference, 0) + 1)
+        direction = (delta >= self.ratio) - (delta <= -self.ratio)
+        if not direction:
+            self.cancel()
+            return False
+
+        if direction != self.direction:
+            self.cancel()
+            self.direction = direction
+            self.started_at = self.scheduler.monotonic()
+            self.confirm_source = self.scheduler.timeout_add(
+                self.window, self.on_window
+            )
+        self.count += 1
+        self.value = value
+        if self.count < self.samples:
+            return False
+
+        self.confirm()
+        return True
+
+    def on_window(self):
+        # every reading since the first was past the ratio, else cancelled
+        self.confirm_source = None
+        self.confirm()
+        return False
+
+    def confirm(self):
+        value, started_at = self.value, self.started_at
+        self.cancel()
+        self.emit(value, started_at)
+
+    def cancel(self):
+        if self.confirm_source is not None:
+            self.scheduler.source_remove(self.confirm_source)
+            self.confirm_source = None
+        self.direction = self.count = 0
+
+
+FILTERS = {
+    "ema": EMAFilter,
+    "median": MedianFilter,
+    "deadband": LogDeadbandFilter,
+}
+
+DEFAULT_FILTERS = [
+    {"type": "median", "window": 3},
+    {"type": "deadband", "ratio": 0.05},
+]
+
+
+def create_filters(cfg: list | None) -> list:
+    """Builds filter stages from the `filters` config section.
+
+    Each entry is `{"type": "ema" | "median" | "deadband", ...}` with the
+    remaining keys passed to the filter, e.g. `{"type": "ema", "tau": 2}`.
+    """
+    stages = []
+    for entry in DEFAULT_FILTERS if cfg is None else cfg:
+        params = dict(entry)
+        kind = params.pop("type", None)
+        if kind not in FILTERS:
+            raise ValueError(f"unknown lux filter '{kind}'")
+        stages.append(FILTERS[kind](**params))
+    return stages
+
+
+class FilterPipeline:
+    """Runs raw lux values through filter stages before bucket selection.
+
+    Values which a stage suppresses, or which do not change the output, are
+    counted and dropped. While a smoothing stage lags behind the last raw
+    value, the value is fed again after the stage's settle time, so the
+    output converges even when the sensor stops sending signals.
+    """
+
+    def __init__(self, stages: list, scheduler, emit: callable) -> None:
+        self.stages = stages
+        self.scheduler = scheduler
+        self.emit = emit
+        self.raw: int | None = None
+        self.last: int | None = None
+        self.flush_source: int | None = None
+        self.passed = 0
+        self.suppressed = 0
+
+    def push(self, value: int):
+        self.raw = value
+        self.cancel()
+        self.run(signaled=True)
+
+    def reset(self, value: int):
+        self.cancel()
+        self.raw = self.last = value
+        for stage in self.stages:
+            stage.reset(value)
+
+    def cancel(self):
+        if self.flush_source is not None:
+            self.scheduler.source_remove(self.flush_source)
+            self.flush_source = None
+
+    def run(self, signaled=False):
+        now = self.scheduler.monotonic()
+        value = self.raw
+        for stage in self.stages:
+            value = stage.process(value, now)
+            if value is None:
+                break
+
+        if value is None or round(value) == self.last:
+            if signaled:
+                self.suppressed += 1
+        else:
+            self.last = round(value)
+            self.passed += 1
+            self.emit(self.last)
+
+        settle_time = max((s.settle_time for s in self.stages if s.pending), default=0)
+        if settle_time:
+            self.flush_source = self.scheduler.timeout_add(settle_time, self.on_flush)
+
+    def on_flush(self):
+        self.flush_source = None
+        self.run()
+        return False
@@ -0,0 +1,26 @@
+from bisect import bisect_left
+
+# SetBrightness and similar D-Bus call latencies, milliseconds
+LATENCY_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """Fixed-bound histogram, each observation is counted in one bucket"""
+
+    def __init__(self, bounds=LATENCY_BOUNDS_MS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def as_dict(self) -> dict:
+        d = {f"<={b:g}": c for b, c in zip(self.bounds, self.counts)}
+        d[f">{self.bounds[-1]:g}"] = self.counts[-1]
+        d["count"] = self.count
+        d["sum"] = round(self.total, 3)
+        return d
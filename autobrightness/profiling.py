@@ -0,0 +1,75 @@
+import cProfile
+import faulthandler
+import logging
+import os
+import time
+import tracemalloc
+
+
+class Profiler:
+    """cProfile and tracemalloc sessions toggled on the running daemon.
+
+    Nothing is hooked into the interpreter until a session is started, so
+    the daemon runs at full speed while profiling is off. Output files are
+    written to `directory`, named after the process id, the wall time and
+    a sequence number.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.profile: cProfile.Profile | None = None
+        self.dumps = 0
+        self.logger = logging.getLogger(__name__)
+
+    def path(self, kind: str, suffix: str) -> str:
+        self.dumps += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = f"autobrightness-{os.getpid()}-{stamp}-{self.dumps}-{kind}{suffix}"
+        return os.path.join(self.directory, name)
+
+    def start_profile(self):
+        if self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+            self.logger.info("CPU profiling started")
+
+    def stop_profile(self, kind: str = "profile") -> str | None:
+        if self.profile is None:
+            return None
+
+        self.profile.disable()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(kind, ".pstats")
+        self.profile.dump_stats(path)
+        self.profile = None
+        self.logger.info(f"CPU profile written to {path}")
+        return path
+
+    def toggle_profile(self):
+        """SIGUSR1 handler, starts or stops a cProfile session"""
+        if self.profile is None:
+            self.start_profile()
+        else:
+            self.stop_profile()
+        return True
+
+    def toggle_memory(self):
+        """SIGUSR2 handler, dumps thread stacks and starts allocation tracing,
+        or writes a tracemalloc snapshot and stops tracing when it runs"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        path = self.path("stacks", ".txt")
+        with open(path, "w") as f:
+            faulthandler.dump_traceback(file=f, all_threads=True)
+        self.logger.info(f"Thread stacks written to {path}")
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self.logger.info("Allocation tracing started")
+            return True
+
+        path = self.path("memory", ".tracemalloc")
+        tracemalloc.take_snapshot().dump(path)
+        tracemalloc.stop()
+        self.logger.info(f"Allocation snapshot written to {path}")
+        return True
@@ -0,0 +1,187 @@
+import time
+
+from autobrightness.scheduler import VirtualScheduler
+from autobrightness.services.common import ClaimAccounting, NotificationQueue
+from autobrightness.trace import read_trace
+
+
+class FakeDisplay:
+    """Stands in for ScreenBrightnessDBus, echoing writes like PowerDevil does"""
+
+    def __init__(self, max_brightness: int, brightness: int) -> None:
+        self.on_change = None
+        self.name = "replay"
+        self.label = "replay"
+        self.is_internal = True
+        self.max_brightness = max_brightness
+        self.brightness = brightness
+        self.writes = 0
+
+    def connect_brightness_changed_signal(self, fn: callable):
+        self.on_change = fn
+
+    def disconnect(self):
+        self.on_change = None
+
+    def set_brightness(self, value: int):
+        self.writes += 1
+        if value != self.brightness:
+            self.changed(value)
+
+    def external_change(self, value: int):
+        self.changed(value)
+
+    def changed(self, value: int):
+        self.brightness = value
+        if self.on_change:
+            self.on_change("org.kde.ScreenBrightness.Display", {"Brightness": value})
+
+
+class FakeScreens:
+    """Screens client without PowerDevil, displays are attached by `replay`"""
+
+    def __init__(self) -> None:
+        self.on_display_change = None
+
+    def run(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class FakeSensor(ClaimAccounting):
+    def __init__(self) -> None:
+        # light level is unknown until the trace reports one
+        self.available = False
+        self.light_level = 0
+        self.prop_cache = None
+        self.signals = None
+        self.on_sensor_change = None
+        self._init_claims()
+        self.claimed = True
+
+    def connect_props_changed_signal(self, fn: callable):
+        pass
+
+    def run(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def claim(self):
+        self._set_claimed(True)
+
+    def release(self):
+        self._set_claimed(False)
+
+
+class FakeNotifications(NotificationQueue):
+    """Answers Notify calls immediately, like an idle notification daemon"""
+
+    def __init__(self, scheduler) -> None:
+        self._init_queue(scheduler)
+        self.next_id = 0
+
+    @property
+    def available(self):
+        return True
+
+    def run(self):
+        pass
+
+    def stop(self):
+        self._cancel_pending()
+
+    def connect_notif_action_signal(self, fn: callable):
+        pass
+
+    def _send(self, title, body):
+        self.next_id += 1
+        self._on_notify_reply(self.next_id)
+
+    def _close(self, notif_id: int):
+        pass
+
+
+class FakeScreenSaver:
+    def __init__(self) -> None:
+        self.active = False
+        self.on_active_change = None
+
+    def run(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+def create_clients(scheduler) -> tuple:
+    """Screens, sensor, notification and screensaver clients for replay"""
+    return (
+        FakeScreens(),
+        FakeSensor(),
+        FakeNotifications(scheduler),
+        FakeScreenSaver(),
+    )
+
+
+def replay(path: str, service) -> dict:
+    """Drives `service` with a recorded trace on a virtual clock.
+
+    The service must have been constructed with a VirtualScheduler and
+    the replay backend, nothing is sent over D-Bus.
+    Returns counters describing what the service did during the replay.
+    """
+    scheduler: VirtualScheduler = service.scheduler
+
+    display = None
+    writes = 0
+    recorded = {"lux": 0, "brightness": 0, "anim_start": 0}
+    started_at = time.perf_counter()
+
+    for t, kind, values in read_trace(path):
+        scheduler.advance_to(t)
+
+        if kind in recorded:
+            recorded[kind] += 1
+
+        if kind == "display":
+            if display is not None:
+                writes += display.writes
+
+            max_brightness, brightness = values
+            if max_brightness:
+                display = FakeDisplay(max_brightness, brightness)
+            else:
+                display = None
+            service.on_screens_change("replay", display)
+
+        elif kind == "lux":
+            service.sensor_proxy_dbus.available = True
+            service.sensor_proxy_dbus.light_level = values[0]
+            service.handle_sensor_props_change(
+                "net.hadess.SensorProxy", {"LightLevel": values[0]}, []
+            )
+
+        elif kind == "brightness" and display is not None:
+            display.external_change(values[0])
+
+    scheduler.run_until_idle()
+    if display is not None:
+        writes += display.writes
+
+    return {
+        "trace_duration": round(scheduler.monotonic(), 3),
+        "replay_duration": round(time.perf_counter() - started_at, 3),
+        "lux_events": recorded["lux"],
+        "external_changes": recorded["brightness"],
+        "recorded_animations": recorded["anim_start"],
+        "animations": service.animations_started,
+        "brightness_writes": writes,
+        "debounces": service.debounces,
+        "bucket_changes": service.bucket_changes,
+        "notifications": service.notif_dbus.sent,
+        "notifications_coalesced": service.notif_dbus.coalesced,
+    }
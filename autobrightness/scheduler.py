@@ -0,0 +1,175 @@
+from functools import cached_property
+import asyncio
+import heapq
+import select
+import time
+
+
+class GLibScheduler:
+    """Schedules callbacks as timeout sources on the default GLib main context.
+
+    As with GLib, a callback returning True is rescheduled after the same
+    interval, anything else removes the source.
+    """
+
+    @cached_property
+    def glib(self):
+        from gi.repository import GLib
+
+        return GLib
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def timeout_add(self, interval: float, fn: callable, *args) -> int:
+        return self.glib.timeout_add(round(interval * 1000), fn, *args)
+
+    def source_remove(self, source_id: int):
+        self.glib.source_remove(source_id)
+
+    def io_add_watch(self, fd: int, fn: callable, *args) -> int:
+        """Calls fn whenever fd is readable, kept while fn returns True"""
+        return self.glib.io_add_watch(
+            fd, self.glib.PRIORITY_DEFAULT, self.glib.IO_IN, lambda *_: fn(*args)
+        )
+
+
+class AsyncioScheduler:
+    """Schedules callbacks with call_later on an asyncio event loop.
+
+    Same contract as GLibScheduler: a callback returning True runs again
+    after the same interval. Sources are plain integer ids.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        self._loop = loop
+        self.handles: dict[int, asyncio.TimerHandle] = {}
+        self.readers: dict[int, int] = {}
+        self.next_id = 1
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+        return self._loop
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def timeout_add(self, interval: float, fn: callable, *args) -> int:
+        source_id = self.next_id
+        self.next_id += 1
+        self._schedule(source_id, interval, fn, args)
+        return source_id
+
+    def _schedule(self, source_id, interval, fn, args):
+        self.handles[source_id] = self.loop.call_later(
+            interval, self._run, source_id, interval, fn, args
+        )
+
+    def _run(self, source_id, interval, fn, args):
+        if fn(*args) and source_id in self.handles:
+            self._schedule(source_id, interval, fn, args)
+        else:
+            self.handles.pop(source_id, None)
+
+    def source_remove(self, source_id: int):
+        handle = self.handles.pop(source_id, None)
+        if handle is not None:
+            handle.cancel()
+        fd = self.readers.pop(source_id, None)
+        if fd is not None:
+            self.loop.remove_reader(fd)
+
+    def io_add_watch(self, fd: int, fn: callable, *args) -> int:
+        source_id = self.next_id
+        self.next_id += 1
+        self.readers[source_id] = fd
+        self.loop.add_reader(fd, self._run_reader, source_id, fn, args)
+        return source_id
+
+    def _run_reader(self, source_id, fn, args):
+        if not fn(*args) and source_id in self.readers:
+            self.source_remove(source_id)
+
+
+class VirtualScheduler:
+    """Scheduler driven by a virtual clock, used for replay and tests.
+
+    Time only moves when `advance` or `advance_to` is called, so hours of
+    timeouts run in microseconds and results are deterministic. File
+    descriptor watches run only when `poll_io` is called.
+    """
+
+    def __init__(self, start: float = 0.0) -> None:
+        self.now = start
+        self.queue = []
+        # source whose callback runs, removing it drops the reschedule
+        self.running: int | None = None
+        self.readers: dict[int, tuple] = {}
+        self.next_id = 1
+        self.wakeups = 0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def timeout_add(self, interval: float, fn: callable, *args) -> int:
+        source_id = self.next_id
+        self.next_id += 1
+        heapq.heappush(self.queue, (self.now + interval, source_id, interval, fn, args))
+        return source_id
+
+    def source_remove(self, source_id: int):
+        if self.readers.pop(source_id, None) is not None:
+            return
+        if source_id == self.running:
+            self.running = None
+            return
+        # removed from the heap right away, a long replay re-arming timeouts
+        # at every event would otherwise keep all of them until they are due
+        for i, entry in enumerate(self.queue):
+            if entry[1] == source_id:
+                del self.queue[i]
+                heapq.heapify(self.queue)
+                return
+
+    def io_add_watch(self, fd: int, fn: callable, *args) -> int:
+        source_id = self.next_id
+        self.next_id += 1
+        self.readers[source_id] = (fd, fn, args)
+        return source_id
+
+    def poll_io(self, timeout: float = 0.0) -> int:
+        """Runs watches of readable descriptors once, returns how many ran"""
+        if not self.readers:
+            return 0
+        fds = {fd for fd, _, _ in self.readers.values()}
+        ready, _, _ = select.select(fds, [], [], timeout)
+        ran = 0
+        for source_id, (fd, fn, args) in list(self.readers.items()):
+            if fd in ready and source_id in self.readers:
+                ran += 1
+                if not fn(*args):
+                    self.readers.pop(source_id, None)
+        return ran
+
+    def advance_to(self, t: float):
+        while self.queue and self.queue[0][0] <= t:
+            due, source_id, interval, fn, args = heapq.heappop(self.queue)
+            self.now = max(self.now, due)
+            self.wakeups += 1
+            self.running = source_id
+            if fn(*args) and self.running == source_id:
+                heapq.heappush(
+                    self.queue, (self.now + interval, source_id, interval, fn, args)
+                )
+            self.running = None
+
+        self.now = max(self.now, t)
+
+    def advance(self, seconds: float):
+        self.advance_to(self.now + seconds)
+
+    def run_until_idle(self):
+        while self.queue:
+            self.advance_to(self.queue[0][0])
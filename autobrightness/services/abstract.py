@@ -2,7 +2,6 @@ from functools import cached_property
 import logging
 from typing import Union
 import dbus
-import time
 
 
 class DBusService:
@@ -14,13 +13,65 @@ class DBusService:
     def bus(self):
         return self.dbus_class()
 
-    def try_get_object(self, name: str, path: str):
-        while True:
+    def watch_name(self, name: str, on_appeared: callable, on_vanished: callable):
+        """Calls on_appeared/on_vanished as the name gains or loses an owner.
+
+        The initial owner is queried asynchronously, so this never blocks and
+        several services can be waited for in parallel.
+        """
+        last = [None]
+
+        def owner_changed(owner):
+            previous, last[0] = last[0], owner
+            if owner == previous:
+                return
             try:
-                return self.bus.get_object(name, path)
-            except dbus.exceptions.DBusException as e:
-                if e.get_dbus_name() == "org.freedesktop.DBus.Error.ServiceUnknown":
-                    self.logger.info(f"Waiting for {name} to appear")
-                    time.sleep(1)
+                if previous and owner:
+                    # replaced without a gap, the new owner has none of our state
+                    on_vanished()
+                if owner:
+                    self.logger.debug(f"{name} appeared")
+                    on_appeared()
                 else:
-                    raise
+                    self.logger.info(f"Waiting for {name} to appear")
+                    on_vanished()
+            except dbus.exceptions.DBusException as e:
+                self.logger.exception(e)
+
+        return self.bus.watch_name_owner(name, owner_changed)
+
+
+class PropertyCache:
+    """Properties of one D-Bus interface fetched with a single GetAll.
+
+    Kept current by feeding PropertiesChanged signals to `update`, so reads
+    cost no round-trip. Properties missing from GetAll are fetched with Get
+    on first access. `values` of a GetAll done asynchronously skip the call.
+    """
+
+    def __init__(
+        self, props_iface: dbus.Interface, interface: str, values: dict | None = None
+    ) -> None:
+        self.props_iface = props_iface
+        self.interface = interface
+        if values is None:
+            values = props_iface.GetAll(interface)
+        self.values = dict(values)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str):
+        try:
+            value = self.values[name]
+        except KeyError:
+            self.misses += 1
+            value = self.values[name] = self.props_iface.Get(self.interface, name)
+        else:
+            self.hits += 1
+        return value
+
+    def update(self, interface: str, changed: dict, invalidated: list):
+        if interface == self.interface:
+            self.values.update(changed)
+            for name in invalidated:
+                self.values.pop(name, None)
@@ -0,0 +1,836 @@
+"""Asyncio D-Bus backend built on jeepney.
+
+Counterparts of the dbus-python clients with the same attributes and
+callbacks, so AutoBrightnessService runs unchanged on a single asyncio
+event loop. Calls are awaited in short-lived tasks and signals are handed
+to the callbacks from the connection's receiver task, nothing blocks.
+
+Requires jeepney, installed with the `asyncio` extra.
+"""
+
+import asyncio
+import logging
+import weakref
+
+from jeepney import (
+    DBusAddress,
+    DBusErrorResponse,
+    HeaderFields,
+    MatchRule,
+    MessageType,
+    Properties,
+    message_bus,
+    new_error,
+    new_method_call,
+    new_method_return,
+)
+from jeepney.io.asyncio import open_dbus_router
+
+from autobrightness.scheduler import AsyncioScheduler
+from autobrightness.services.backlight import (
+    LOGIND_NAME,
+    LOGIND_SESSION_IFACE,
+    LOGIND_SESSION_PATH,
+)
+from autobrightness.services.common import (
+    SERVICE_UNKNOWN,
+    STATS_NAME,
+    STATS_PATH,
+    UNKNOWN_OBJECT,
+    ClaimAccounting,
+    NotificationQueue,
+    RecoveryTracking,
+    SignalFilter,
+    WritePipeline,
+)
+
+PROPS_IFACE = "org.freedesktop.DBus.Properties"
+
+SENSOR = DBusAddress(
+    "/net/hadess/SensorProxy",
+    bus_name="net.hadess.SensorProxy",
+    interface="net.hadess.SensorProxy",
+)
+SCREENS = DBusAddress(
+    "/org/kde/ScreenBrightness",
+    bus_name="org.kde.Solid.PowerManagement",
+    interface="org.kde.ScreenBrightness",
+)
+DISPLAY_INTERFACE = "org.kde.ScreenBrightness.Display"
+# properties decoded from PropertiesChanged, the rest is dropped undecoded
+SENSOR_PROPERTIES = ("LightLevel", "HasAmbientLight")
+DISPLAY_PROPERTIES = ("Brightness",)
+# read once when the display is added
+DISPLAY_LIMITS = ("MaxBrightness", "IsInternal", "Label")
+NOTIFICATIONS = DBusAddress(
+    "/org/freedesktop/Notifications",
+    bus_name="org.freedesktop.Notifications",
+    interface="org.freedesktop.Notifications",
+)
+SCREENSAVER = DBusAddress(
+    "/org/freedesktop/ScreenSaver",
+    bus_name="org.freedesktop.ScreenSaver",
+    interface="org.freedesktop.ScreenSaver",
+)
+STATS = DBusAddress(STATS_PATH, bus_name=STATS_NAME, interface=STATS_NAME)
+LOGIND_SESSION = DBusAddress(
+    LOGIND_SESSION_PATH, bus_name=LOGIND_NAME, interface=LOGIND_SESSION_IFACE
+)
+
+# one connection per bus shared by all clients, and the calls in flight
+_routers: dict = {}
+_tasks: set = set()
+
+
+async def get_router(bus: str):
+    if bus not in _routers:
+        ctx = open_dbus_router(bus)
+        _routers[bus] = (ctx, asyncio.ensure_future(ctx.__aenter__()))
+    return await _routers[bus][1]
+
+
+async def shutdown(timeout: float = 1.0):
+    """Waits for calls still in flight, e.g. ReleaseLight, then closes the
+    connections"""
+    if _tasks:
+        await asyncio.wait(list(_tasks), timeout=timeout)
+    for ctx, connecting in _routers.values():
+        if connecting.done() and not connecting.cancelled():
+            if connecting.exception() is None:
+                await ctx.__aexit__(None, None, None)
+        else:
+            connecting.cancel()
+    _routers.clear()
+
+
+def unwrap(props: dict) -> dict:
+    """Strips the signatures from a{sv} values"""
+    return {name: value for name, (_, value) in props.items()}
+
+
+def to_variant(value) -> tuple:
+    if isinstance(value, bool):
+        return ("b", value)
+    if isinstance(value, int):
+        return ("x", value)
+    if isinstance(value, float):
+        return ("d", value)
+    if isinstance(value, dict):
+        return ("a{sv}", {str(k): to_variant(v) for k, v in value.items()})
+    return ("s", str(value))
+
+
+def from_variant(value):
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], str):
+        return from_variant(value[1])
+    if isinstance(value, dict):
+        return {k: from_variant(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [from_variant(v) for v in value]
+    return value
+
+
+class Dispatch:
+    """Stands in for the queue of a jeepney filter and hands every matching
+    message to `fn` right away"""
+
+    def __init__(self, fn: callable, logger: logging.Logger) -> None:
+        self.fn = fn
+        self.logger = logger
+
+    def put_nowait(self, msg):
+        try:
+            self.fn(msg)
+        except Exception as e:
+            self.logger.exception(e)
+
+
+class AsyncDBusService:
+    def __init__(self, bus: str) -> None:
+        self.bus = bus
+        self.router = None
+        self.filters: list = []
+        self.owner: str | None = None
+        self.logger = logging.getLogger(__name__)
+
+    async def connect(self):
+        if self.router is None:
+            self.router = await get_router(self.bus)
+        return self.router
+
+    def spawn(self, coro) -> asyncio.Future:
+        task = asyncio.ensure_future(coro)
+        _tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+        return task
+
+    def _on_task_done(self, task: asyncio.Future):
+        _tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        e = task.exception()
+        if isinstance(e, DBusErrorResponse):
+            self.logger.warning(f"D-Bus call failed: {e}")
+        else:
+            self.logger.error(e, exc_info=e)
+
+    async def call(self, msg) -> tuple:
+        reply = await self.router.send_and_get_reply(msg)
+        if reply.header.message_type == MessageType.error:
+            raise DBusErrorResponse(reply)
+        return reply.body
+
+    def subscribe(self, fn: callable, sender=None, arg0: str | None = None, **match):
+        """Calls fn(message) for every signal matching `match`.
+
+        The match rule sent to the bus includes the sender, messages carry
+        the unique name of the sender so the local filter leaves it out.
+        Returns the filter and the task adding the match rule.
+        """
+        rule = MatchRule(type="signal", **match)
+        bus_rule = MatchRule(type="signal", sender=sender, **match)
+        if arg0 is not None:
+            rule.add_arg_condition(0, arg0)
+            bus_rule.add_arg_condition(0, arg0)
+
+        handle = self.router.filter(rule, queue=Dispatch(fn, self.logger))
+        handle.bus_rule = bus_rule
+        self.filters.append(handle)
+        return handle, self.spawn(self.call(message_bus.AddMatch(handle.bus_rule)))
+
+    def unsubscribe(self, handle):
+        handle.close()
+        self.filters.remove(handle)
+        self.spawn(self.call(message_bus.RemoveMatch(handle.bus_rule)))
+
+    def unsubscribe_all(self):
+        for handle in self.filters:
+            handle.close()
+        self.filters = []
+
+    async def watch_name(self, name: str, on_appeared, on_vanished: callable):
+        """Awaits on_appeared() or calls on_vanished() as the name gains or
+        loses an owner, starting with the current owner"""
+
+        def owner_changed(msg):
+            _, old, new = msg.body
+            self.spawn(self._owner_changed(name, new, on_appeared, on_vanished))
+
+        _, added = self.subscribe(
+            owner_changed,
+            sender="org.freedesktop.DBus",
+            interface="org.freedesktop.DBus",
+            member="NameOwnerChanged",
+            path="/org/freedesktop/DBus",
+            arg0=name,
+        )
+        await added
+
+        try:
+            (owner,) = await self.call(message_bus.GetNameOwner(name))
+        except DBusErrorResponse:
+            owner = ""
+        await self._owner_changed(name, owner, on_appeared, on_vanished)
+
+    async def _owner_changed(self, name, owner, on_appeared, on_vanished):
+        if owner == self.owner:
+            return
+        previous, self.owner = self.owner, owner
+
+        try:
+            if previous and owner:
+                # replaced without a gap, the new owner has none of our state
+                on_vanished()
+            if owner:
+                self.logger.debug(f"{name} appeared")
+                await on_appeared()
+            else:
+                self.logger.info(f"Waiting for {name} to appear")
+                on_vanished()
+        except DBusErrorResponse as e:
+            self.logger.exception(e)
+
+
+class AsyncPropertyCache:
+    """Properties of one D-Bus interface fetched with a single GetAll.
+
+    Kept current by feeding PropertiesChanged signals to `update`. Reads
+    cannot wait for a reply, so `names` missing from GetAll are fetched
+    with Get before the cache is returned, and a value invalidated by a
+    signal is kept until Get in the background has replaced it. Any other
+    miss starts such a Get and reads None meanwhile.
+    """
+
+    def __init__(self, service: AsyncDBusService, address: DBusAddress, values):
+        self.service = service
+        self.address = address
+        self.interface = address.interface
+        self.values = unwrap(values)
+        self.fetching = set()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    async def fetch(
+        cls, service: AsyncDBusService, address: DBusAddress, names: tuple = ()
+    ):
+        (values,) = await service.call(Properties(address).get_all())
+        cache = cls(service, address, values)
+        for name in names:
+            if name not in cache.values:
+                cache.misses += 1
+                await cache._get(name)
+        return cache
+
+    def get(self, name: str):
+        try:
+            value = self.values[name]
+        except KeyError:
+            self.misses += 1
+            self._refetch(name)
+            return None
+        self.hits += 1
+        return value
+
+    def update(self, interface: str, changed: dict, invalidated: list):
+        if interface == self.interface:
+            self.values.update(changed)
+            for name in invalidated:
+                if name not in changed:
+                    self._refetch(name)
+
+    def _refetch(self, name: str):
+        if name not in self.fetching:
+            self.fetching.add(name)
+            self.service.spawn(self._get(name))
+
+    async def _get(self, name: str):
+        try:
+            ((_, value),) = await self.service.call(Properties(self.address).get(name))
+            self.values[name] = value
+        finally:
+            self.fetching.discard(name)
+
+
+def props_changed(msg, signals: SignalFilter) -> tuple | None:
+    """PropertiesChanged body with only the followed properties unwrapped"""
+    interface, changed, invalidated = msg.body
+    selected = signals.select(interface, changed, invalidated)
+    if selected is None:
+        return None
+    changed, invalidated = selected
+    return interface, unwrap(changed), invalidated
+
+
+class AsyncSensorProxy(RecoveryTracking, ClaimAccounting, AsyncDBusService):
+    def __init__(self) -> None:
+        super().__init__("SYSTEM")
+        self.attached = False
+        self.prop_cache: AsyncPropertyCache | None = None
+        self.on_sensor_change: callable | None = None
+        self.on_props_changed: callable | None = None
+        self.last_level: int | None = None
+        self.signals = SignalFilter(SENSOR.interface, SENSOR_PROPERTIES)
+        self._init_claims()
+        self._init_recovery()
+
+    def run(self):
+        self.spawn(self._run())
+
+    async def _run(self):
+        await self.connect()
+        if self.on_props_changed:
+            _, added = self.subscribe(
+                self._on_props_changed,
+                sender=SENSOR.bus_name,
+                interface=PROPS_IFACE,
+                member="PropertiesChanged",
+                path=SENSOR.object_path,
+                arg0=SENSOR.interface,
+            )
+            await added
+        await self.watch_name(SENSOR.bus_name, self.on_appeared, self.on_vanished)
+
+    def stop(self):
+        self.unsubscribe_all()
+        if self.attached and self.claimed:
+            self.spawn(self.call(new_method_call(SENSOR, "ReleaseLight")))
+            self._set_claimed(False)
+
+    async def on_appeared(self):
+        self._service_found()
+        owner = self.owner
+        prop_cache = await AsyncPropertyCache.fetch(self, SENSOR, SENSOR_PROPERTIES)
+        if owner != self.owner:
+            # vanished while GetAll was in flight
+            return
+
+        self.prop_cache = prop_cache
+        if not self.has_ambient_light:
+            self.logger.error("Ambient Light Sensor not available")
+            return
+
+        if self.want_claim:
+            await self.call(new_method_call(SENSOR, "ClaimLight"))
+            if owner != self.owner:
+                # vanished while ClaimLight was in flight, the claim died with it
+                return
+            self._set_claimed(True)
+        self.attached = True
+        if self.claimed and not self.want_claim:
+            # released while ClaimLight was in flight
+            self.release()
+
+        if self.last_level is not None and self.light_level != self.last_level:
+            self.count_lost()
+        self.last_level = None
+        self._service_bound()
+        if callable(self.on_sensor_change):
+            self.on_sensor_change(self)
+
+    def on_vanished(self):
+        available = self.attached
+        if self.prop_cache:
+            self.last_level = self.light_level
+        self._service_lost()
+        self._set_claimed(False)
+        self.attached = False
+        self.prop_cache = None
+        if available and callable(self.on_sensor_change):
+            self.on_sensor_change(None)
+
+    def claim(self):
+        """Resumes sensor polling, the call does not block"""
+        self.want_claim = True
+        if self.attached and not self.claimed:
+            self.spawn(self.call(new_method_call(SENSOR, "ClaimLight")))
+            self._set_claimed(True)
+
+    def release(self):
+        """Lets iio-sensor-proxy stop polling the sensor"""
+        self.want_claim = False
+        if self.attached and self.claimed:
+            self.spawn(self.call(new_method_call(SENSOR, "ReleaseLight")))
+            self._set_claimed(False)
+
+    @property
+    def available(self):
+        return self.attached
+
+    @property
+    def has_ambient_light(self):
+        return bool(self.prop_cache.get("HasAmbientLight"))
+
+    @property
+    def light_level(self):
+        return int(self.prop_cache.get("LightLevel"))
+
+    def _on_props_changed(self, msg):
+        selected = props_changed(msg, self.signals)
+        if selected is None:
+            return
+        interface, changed, invalidated = selected
+        if self.prop_cache:
+            self.prop_cache.update(interface, changed, invalidated)
+        sender = msg.header.fields.get(HeaderFields.sender)
+        self.on_props_changed(interface, changed, invalidated, sender=sender)
+
+    def connect_props_changed_signal(self, fn: callable):
+        self.on_props_changed = fn
+
+
+class AsyncScreenBrightness(WritePipeline, AsyncDBusService):
+    def __init__(self, name: str, mngr: "AsyncScreens") -> None:
+        super().__init__("SESSION")
+        self.name = name
+        self.mngr = mngr
+        self.router = mngr.router
+        self.address = DBusAddress(
+            f"{SCREENS.object_path}/{name}",
+            bus_name=SCREENS.bus_name,
+            interface=DISPLAY_INTERFACE,
+        )
+        self.props: AsyncPropertyCache | None = None
+        self.max_brightness = 0
+        self.is_internal = False
+        self.label = name
+        self.signal_match = None
+        self.signals = SignalFilter(DISPLAY_INTERFACE, DISPLAY_PROPERTIES)
+        self._init_writes()
+
+    async def load(self):
+        self.props = await AsyncPropertyCache.fetch(
+            self, self.address, DISPLAY_PROPERTIES + DISPLAY_LIMITS
+        )
+        self.max_brightness = int(self.props.get("MaxBrightness"))
+        self.is_internal = bool(self.props.get("IsInternal"))
+        self.label = str(self.props.get("Label"))
+
+    @property
+    def brightness(self):
+        return int(self.props.get("Brightness"))
+
+    def _send_brightness(self, value: int):
+        self.spawn(self._set_brightness(value))
+
+    async def _set_brightness(self, value: int):
+        msg = new_method_call(self.address, "SetBrightness", "iu", (value, 1))
+        try:
+            await self.call(msg)
+        except DBusErrorResponse as e:
+            self._write_finished(failed=True)
+            if e.name in (UNKNOWN_OBJECT, SERVICE_UNKNOWN) and self.mngr is not None:
+                # this frame and the pending one never reach the screen
+                self.mngr.count_lost(1 + (self.write_pending is not None))
+                self._drop_writes()
+                if e.name == UNKNOWN_OBJECT:
+                    self.mngr.discover()
+            else:
+                self.logger.warning(f"SetBrightness failed: {e}")
+                self._write_next()
+        else:
+            self._write_finished()
+            self._write_next()
+
+    def connect_brightness_changed_signal(self, fn: callable):
+        def on_props_changed(msg):
+            selected = props_changed(msg, self.signals)
+            if selected is None:
+                return
+            interface, changed, invalidated = selected
+            self.props.update(interface, changed, invalidated)
+            fn(interface, changed, invalidated)
+
+        self.signal_match, _ = self.subscribe(
+            on_props_changed,
+            sender=self.address.bus_name,
+            interface=PROPS_IFACE,
+            member="PropertiesChanged",
+            path=self.address.object_path,
+            arg0=DISPLAY_INTERFACE,
+        )
+
+    def disconnect(self):
+        if self.signal_match is not None:
+            self.unsubscribe(self.signal_match)
+            self.signal_match = None
+
+
+class AsyncScreens(RecoveryTracking, AsyncDBusService):
+    def __init__(self) -> None:
+        super().__init__("SESSION")
+        self.displays: dict[str, AsyncScreenBrightness] = {}
+        self.on_display_change: callable | None = None
+        self.present = False
+        self.loading: set = set()
+        self.last_brightness: dict[str, int] = {}
+        self._init_recovery()
+
+    def run(self):
+        self.spawn(self._run())
+
+    async def _run(self):
+        await self.connect()
+        for member, fn in [
+            ("DisplayAdded", self.on_display_added),
+            ("DisplayRemoved", self.on_display_removed),
+        ]:
+            _, added = self.subscribe(
+                lambda msg, fn=fn: fn(*msg.body),
+                sender=SCREENS.bus_name,
+                interface=SCREENS.interface,
+                member=member,
+                path=SCREENS.object_path,
+            )
+            await added
+        await self.watch_name(SCREENS.bus_name, self.on_appeared, self.on_vanished)
+
+    def stop(self):
+        self.unsubscribe_all()
+
+    async def on_appeared(self):
+        self._service_found()
+        self.present = True
+        await self._discover()
+        if self.present and not self.loading:
+            self.last_brightness.clear()
+            self._service_bound()
+
+    def on_vanished(self):
+        self._service_lost()
+        self.present = False
+        self.loading.clear()
+        for name, displ in list(self.displays.items()):
+            self.last_brightness[name] = displ.brightness
+            self.remove_display(name)
+
+    def discover(self):
+        self.spawn(self._discover())
+
+    async def _discover(self):
+        if not self.present:
+            return
+
+        ((_, names),) = await self.call(Properties(SCREENS).get("DisplaysDBusNames"))
+        for name in list(self.displays):
+            if name not in names:
+                self.remove_display(name)
+        for name in names:
+            await self.add_display(name)
+
+    async def add_display(self, name: str):
+        if name in self.displays or name in self.loading:
+            return
+
+        self.loading.add(name)
+        displ = AsyncScreenBrightness(name, weakref.proxy(self))
+        try:
+            await displ.load()
+        except DBusErrorResponse as e:
+            self.loading.discard(name)
+            self.logger.warning(e)
+            return
+
+        if name not in self.loading:
+            # removed or vanished while its properties were fetched
+            return
+        self.loading.discard(name)
+        last = self.last_brightness.pop(name, None)
+        if last is not None and last != displ.brightness:
+            self.count_lost()
+        self.displays[name] = displ
+        self._notify(name, displ)
+
+    def remove_display(self, name: str):
+        self.loading.discard(name)
+        displ = self.displays.pop(name, None)
+        if displ is not None:
+            displ.disconnect()
+            self._notify(name, None)
+
+    def _notify(self, name: str, displ: AsyncScreenBrightness | None):
+        try:
+            if callable(self.on_display_change):
+                self.on_display_change(name, displ)
+        except Exception as e:
+            self.logger.exception(e)
+
+    def on_display_added(self, name: str):
+        if self.present:
+            self.spawn(self.add_display(name))
+
+    def on_display_removed(self, name: str):
+        self.remove_display(name)
+
+
+class AsyncNotifications(NotificationQueue, AsyncDBusService):
+    def __init__(self, scheduler=None) -> None:
+        super().__init__("SESSION")
+        self.present = False
+        self.handlers: list = []
+        self._init_queue(scheduler or AsyncioScheduler())
+
+    def run(self):
+        self.spawn(self._run())
+
+    async def _run(self):
+        await self.connect()
+        for member, fn in self.handlers:
+            self.subscribe(
+                lambda msg, fn=fn: self._validate(fn, *msg.body),
+                sender=NOTIFICATIONS.bus_name,
+                interface=NOTIFICATIONS.interface,
+                member=member,
+                path=NOTIFICATIONS.object_path,
+            )
+        await self.watch_name(
+            NOTIFICATIONS.bus_name, self.on_appeared, self.on_vanished
+        )
+
+    def stop(self):
+        self.unsubscribe_all()
+        if self.notif_id and self.present:
+            self._close(self.notif_id)
+        self._cancel_pending()
+
+    async def on_appeared(self):
+        self.present = True
+
+    def on_vanished(self):
+        self.present = False
+        self.notif_id = 0
+        self.in_flight = False
+
+    @property
+    def available(self):
+        return self.present
+
+    def _validate(self, fn, notif_id, *args):
+        if notif_id == self.notif_id:
+            self.notif_id = 0
+            fn(*args)
+
+    def connect_notif_closed_signal(self, fn):
+        self.handlers.append(("NotificationClosed", fn))
+
+    def connect_notif_action_signal(self, fn):
+        self.handlers.append(("ActionInvoked", fn))
+
+    def _close(self, notif_id: int):
+        msg = new_method_call(NOTIFICATIONS, "CloseNotification", "u", (notif_id,))
+        self.spawn(self.call(msg))
+
+    def _send(self, title, body):
+        self.spawn(self._notify_call(title, body))
+
+    async def _notify_call(self, title, body):
+        msg = new_method_call(
+            NOTIFICATIONS,
+            "Notify",
+            "susssasa{sv}i",
+            (
+                "autobrightness.service",
+                self.notif_id,
+                "",
+                title,
+                body,
+                ["undo", "Undo"],
+                {"urgency": ("y", 1), "resident": ("b", False)},
+                self.notif_timeout * 1000,
+            ),
+        )
+        try:
+            (notif_id,) = await self.call(msg)
+        except DBusErrorResponse as e:
+            self._on_notify_error(e)
+        else:
+            self._on_notify_reply(notif_id)
+
+
+class AsyncScreenSaver(AsyncDBusService):
+    """Follows the session lock through org.freedesktop.ScreenSaver"""
+
+    def __init__(self) -> None:
+        super().__init__("SESSION")
+        self.active = False
+        self.on_active_change: callable | None = None
+
+    def run(self):
+        self.spawn(self._run())
+
+    async def _run(self):
+        await self.connect()
+        self.subscribe(
+            lambda msg: self.on_active_changed(*msg.body),
+            sender=SCREENSAVER.bus_name,
+            interface=SCREENSAVER.interface,
+            member="ActiveChanged",
+            path=SCREENSAVER.object_path,
+        )
+        await self.watch_name(SCREENSAVER.bus_name, self.on_appeared, self.on_vanished)
+
+    def stop(self):
+        self.unsubscribe_all()
+
+    async def on_appeared(self):
+        (active,) = await self.call(new_method_call(SCREENSAVER, "GetActive"))
+        self.on_active_changed(active)
+
+    def on_vanished(self):
+        self.on_active_changed(False)
+
+    def on_active_changed(self, active, *args):
+        active = bool(active)
+        if active != self.active:
+            self.active = active
+            self.logger.debug(f"screensaver active={active}")
+            if callable(self.on_active_change):
+                self.on_active_change(active)
+
+
+class AsyncLogindSession(AsyncDBusService):
+    """Sets backlight brightness through the logind session of the user"""
+
+    def __init__(self) -> None:
+        super().__init__("SYSTEM")
+
+    def set_brightness(
+        self,
+        subsystem: str,
+        name: str,
+        value: int,
+        reply_handler: callable,
+        error_handler: callable,
+    ):
+        self.spawn(
+            self._set_brightness(subsystem, name, value, reply_handler, error_handler)
+        )
+
+    async def _set_brightness(
+        self, subsystem, name, value, reply_handler, error_handler
+    ):
+        await self.connect()
+        msg = new_method_call(
+            LOGIND_SESSION, "SetBrightness", "ssu", (subsystem, name, value)
+        )
+        try:
+            await self.call(msg)
+        except DBusErrorResponse as e:
+            error_handler(e)
+        else:
+            reply_handler()
+
+
+class AsyncStatsService(AsyncDBusService):
+    """Exports the daemon's counters on the session bus"""
+
+    def __init__(self, get_stats: callable, get_events: callable = list) -> None:
+        super().__init__("SESSION")
+        self.get_stats = get_stats
+        self.get_events = get_events
+        self.handle = None
+
+    def run(self):
+        self.spawn(self._run())
+
+    async def _run(self):
+        await self.connect()
+        self.handle = self.router.filter(
+            MatchRule(type="method_call", path=STATS_PATH),
+            queue=Dispatch(self._on_call, self.logger),
+        )
+        # DBUS_NAME_FLAG_DO_NOT_QUEUE, 1 is DBUS_REQUEST_NAME_REPLY_PRIMARY_OWNER
+        (result,) = await self.call(message_bus.RequestName(STATS_NAME, 4))
+        if result != 1:
+            self.logger.warning(f"{STATS_NAME} is already taken, stats not exported")
+            self.stop()
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+    def _on_call(self, msg):
+        member = msg.header.fields.get(HeaderFields.member)
+        if member == "GetStats":
+            reply = new_method_return(msg, "a{sv}", (to_variant(self.get_stats())[1],))
+        elif member == "GetEvents":
+            events = [to_variant(e)[1] for e in self.get_events()]
+            reply = new_method_return(msg, "aa{sv}", (events,))
+        else:
+            reply = new_error(
+                msg,
+                "org.freedesktop.DBus.Error.UnknownMethod",
+                "s",
+                (f"No such method {member}",),
+            )
+        self.spawn(self.router.send(reply))
+
+
+async def query_stats(method: str):
+    """Calls GetStats or GetEvents of the running service"""
+    async with open_dbus_router("SESSION") as router:
+        reply = await router.send_and_get_reply(new_method_call(STATS, method))
+    if reply.header.message_type == MessageType.error:
+        raise DBusErrorResponse(reply)
+    return from_variant(reply.body[0])
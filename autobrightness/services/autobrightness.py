@@ -1,260 +1,532 @@
-from autobrightness.services.screens import ScreensDbus, ScreenBrightnessDBus
-from autobrightness.services.illuminance import SensorProxyDBus
-from autobrightness.services.notifications import NotificationsDBus
+from autobrightness.scheduler import AsyncioScheduler, GLibScheduler
+from autobrightness.curve import BrightnessCurve, DEFAULT_BUCKETS
+from autobrightness.controller import DisplayController, display_settings
+from autobrightness.eventlog import LUX, EventLog
+from autobrightness.filters import FilterPipeline, JumpDetector, create_filters
+from autobrightness.metrics import Histogram
+from autobrightness.services.common import RecoveryTracking
 
 import logging
-import time
-import dbus
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from autobrightness.services.screens import ScreenBrightnessDBus
+    from autobrightness.services.illuminance import SensorProxyDBus
+
+BACKENDS = ("dbus", "asyncio", "replay")
+DISPLAY_BACKENDS = ("powerdevil", "backlight")
+SENSOR_BACKENDS = ("sensor-proxy", "iio")
+
+TRANSITION_DURATION = 1.0
+TRANSITION_MAX_WRITES = 20
+TRANSITION_GAMMA = 2.2
+
+# order-of-magnitude light changes skip the debounce and transition quickly
+FAST_TRANSITION_DURATION = 0.25
+FAST_TRANSITION_MAX_WRITES = 5
+
+# from the lux signal starting a change to the echo of its last frame, ms
+SETTLE_BOUNDS_MS = (100, 250, 500, 1000, 2000, 3000, 5000, 10000)
+
+
+def create_clients(
+    backend: str,
+    scheduler,
+    displays: str = "powerdevil",
+    sensor: str = "sensor-proxy",
+) -> tuple:
+    """Screens, sensor, notification and screensaver clients of a backend.
+
+    Imported on demand, the asyncio backend does not need dbus-python and
+    the dbus backend does not need jeepney. With `displays="backlight"` the
+    screens come from /sys/class/backlight and are written through logind
+    instead of PowerDevil, with `sensor="iio"` light is read from the IIO
+    device instead of iio-sensor-proxy. The replay backend has no D-Bus
+    clients at all, displays and light come from a recorded trace.
+    """
+    if displays not in DISPLAY_BACKENDS:
+        raise ValueError(
+            f"unknown display backend {displays!r}, expected one of {DISPLAY_BACKENDS}"
+        )
+    if sensor not in SENSOR_BACKENDS:
+        raise ValueError(
+            f"unknown sensor backend {sensor!r}, expected one of {SENSOR_BACKENDS}"
+        )
+    if backend == "replay":
+        from autobrightness import replay
+
+        return replay.create_clients(scheduler)
+
+    if displays == "backlight":
+        from autobrightness.services.backlight import BacklightScreens
+    if sensor == "iio":
+        from autobrightness.services.iio import IIOLightSensor
+
+    if backend == "asyncio":
+        from autobrightness.services import aio
+
+        if displays == "backlight":
+            screens = BacklightScreens(scheduler, aio.AsyncLogindSession())
+        else:
+            screens = aio.AsyncScreens()
+
+        return (
+            screens,
+            IIOLightSensor(scheduler) if sensor == "iio" else aio.AsyncSensorProxy(),
+            aio.AsyncNotifications(scheduler),
+            aio.AsyncScreenSaver(),
+        )
+    if backend != "dbus":
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
 
-from math import ceil, copysign as cpsign
-from threading import Thread, Event
+    from autobrightness.services.screens import ScreensDbus
+    from autobrightness.services.illuminance import SensorProxyDBus
+    from autobrightness.services.notifications import NotificationsDBus
+    from autobrightness.services.screensaver import ScreenSaverDBus
+
+    if displays == "backlight":
+        from autobrightness.services.logind import LogindSessionDBus
+
+        screens = BacklightScreens(scheduler, LogindSessionDBus())
+    else:
+        screens = ScreensDbus()
+
+    return (
+        screens,
+        IIOLightSensor(scheduler) if sensor == "iio" else SensorProxyDBus(),
+        NotificationsDBus(scheduler),
+        ScreenSaverDBus(),
+    )
 
 
 class AutoBrightnessService:
-    def __init__(self) -> None:
-        self.display: ScreenBrightnessDBus | None = None
-        self.max_brightness = 0
-        self.current_brightness = 0
+    def __init__(
+        self,
+        scheduler=None,
+        backend: str = "dbus",
+        displays: str = "powerdevil",
+        sensor: str = "sensor-proxy",
+    ) -> None:
+        # one controller per display, keyed by PowerDevil or backlight device name
+        self.controllers: dict[str, DisplayController] = {}
+        self.display_configs: dict = {}
         self.current_light_level = 0
+        self.bias_controller: DisplayController | None = None
 
-        self.user_brightness_bias = 0
-        self.inhibited_by_powerdevil = False
-        self.anim_bright_target = None
-        self.anim_step = 1
+        # the sensor is released while it cannot affect any display
+        self.power_save = True
+        self.sensor_active = True
+        self.wake_pending = False
 
         self.logger = logging.getLogger(__name__)
 
-        self.light_event = Event()
-        self.stop_event = Event()
-        self.anim_abort_event = Event()
-        self.anim_thread = Thread(target=self.animate_brightness)
-
-        self.screens_dbus = ScreensDbus()
-        self.sensor_proxy_dbus = SensorProxyDBus()
-        self.notif_dbus = NotificationsDBus()
-
-        # Optimized 5-level brightness buckets for stable operation
-        # Each tuple: (lower_bound, upper_bound, brightness_percent)
-        # Wider overlaps reduce frequent brightness changes
-        self.brightness_buckets = [
-            (0, 50, 15),  # Night/Very dim - minimal brightness
-            (25, 200, 30),  # Dim indoor/Evening - low brightness
-            (150, 650, 50),  # Normal indoor/Office - comfortable brightness
-            (450, 2000, 75),  # Bright indoor/Near window - high brightness
-            (900, 10000, 100),  # Outdoor/Very bright - maximum brightness
-        ]
-
-        # Start with brightness close to 50%
-        i = len(self.brightness_buckets) - 1
-        while i >= 0:
-            l, u, val = self.brightness_buckets[i]
-            if val <= 50:
-                self.current_bucket_idx = i
-                break
-            i -= 1
+        # All work runs as timeout sources on the main loop, nothing is
+        # scheduled while light level is stable
+        if scheduler is None:
+            scheduler = AsyncioScheduler() if backend == "asyncio" else GLibScheduler()
+        self.scheduler = scheduler
+        self.started_at = self.scheduler.monotonic()
+        self.first_write_at: float | None = None
+        self.on_first_write_done: callable | None = None
+        self.debounce_interval = 2.0
+
+        # raw sensor values are smoothed before they reach bucket selection
+        self.lux_filter = FilterPipeline(
+            create_filters(None), self.scheduler, self.report_light_level
+        )
+        self.filters_config: list | None = None
+
+        # Transitions are planned against a time and write budget
+        self.transition_duration = TRANSITION_DURATION
+        self.transition_max_writes = TRANSITION_MAX_WRITES
+        self.transition_gamma = TRANSITION_GAMMA
+        self.frames_dropped = 0
+
+        # large jumps bypass debounce and filters, None disables the fast path
+        self.jump_detector: JumpDetector | None = JumpDetector(
+            self.scheduler, self.apply_light_jump
+        )
+        self.fast_transition_duration = FAST_TRANSITION_DURATION
+        self.fast_transition_max_writes = FAST_TRANSITION_MAX_WRITES
+        self.fast_paths = 0
+        self.settle_time = {
+            "fast": Histogram(SETTLE_BOUNDS_MS),
+            "normal": Histogram(SETTLE_BOUNDS_MS),
+        }
+
+        # snapshot for warm starts, saved at a bounded rate by state_writer
+        self.state_writer = None
+        self.restored_state: dict = {}
+        # name -> (curve version, state) of displays gone at runtime, e.g.
+        # while PowerDevil restarts, resumed when they come back
+        self.detached: dict = {}
+
+        self.lux_signals = 0
+        self.debounces = 0
+        self.bucket_changes = 0
+        self.animations_started = 0
+        self.animations_aborted = 0
+        self.recorder = None
+        self.event_log = EventLog()
+
+        self.backend = backend
+        (
+            self.screens_dbus,
+            self.sensor_proxy_dbus,
+            self.notif_dbus,
+            self.screensaver_dbus,
+        ) = create_clients(backend, self.scheduler, displays, sensor)
+
+        self.curve = BrightnessCurve(DEFAULT_BUCKETS)
 
     def run(self):
-        self.sensor_proxy_dbus.run()
+        # services are attached independently as soon as each one appears
+        self.sensor_proxy_dbus.on_sensor_change = self.on_sensor_change
         self.sensor_proxy_dbus.connect_props_changed_signal(
             self.handle_sensor_props_change
         )
+        self.sensor_proxy_dbus.run()
 
-        self.screens_dbus.on_internal_display_change = self.on_screens_change
+        self.screens_dbus.on_display_change = self.on_screens_change
         self.screens_dbus.run()
 
-        self.notif_dbus.run()
         self.notif_dbus.connect_notif_action_signal(self.handle_brightness_bias_clear)
+        self.notif_dbus.run()
 
-        self.anim_thread.start()
+        self.screensaver_dbus.on_active_change = self.on_screensaver_change
+        self.screensaver_dbus.run()
 
     def stop(self):
+        self.lux_filter.cancel()
+        if self.jump_detector:
+            self.jump_detector.cancel()
+        for controller in self.controllers.values():
+            controller.cancel_debounce()
+            controller.stop_animation()
+
         self.sensor_proxy_dbus.stop()
+        self.screens_dbus.stop()
         self.notif_dbus.stop()
+        self.screensaver_dbus.stop()
 
-        self.stop_event.set()
-        self.anim_abort_event.set()
-        self.light_event.set()
+        if self.state_writer:
+            self.state_writer.flush()
 
-        if self.anim_thread.is_alive():
-            self.anim_thread.join()
+    def on_sensor_change(self, sensor: "SensorProxyDBus | None"):
+        if sensor:
+            self.logger.debug("Ambient light sensor is available")
+            self.apply_light_level(sensor.light_level)
+        else:
+            self.lux_filter.cancel()
+            if self.jump_detector:
+                self.jump_detector.cancel()
+            for controller in self.controllers.values():
+                controller.cancel_debounce()
+            self.logger.debug("Ambient light sensor is gone")
+
+    def on_screens_change(self, name: str, display: "ScreenBrightnessDBus | None"):
+        controller = self.controllers.pop(name, None)
+        if controller:
+            self.detached[name] = (self.curve.version, controller.get_state())
+            controller.stop()
+            if self.bias_controller is controller:
+                self.bias_controller = None
+            if controller.recorder:
+                controller.recorder.record("display", 0, 0)
+            self.logger.debug(f"Display '{controller.display.label}' is disabled")
 
-    def on_screens_change(self, display: ScreenBrightnessDBus):
         if display:
-            self.display = display
-            self.max_brightness = self.display.max_brightness
-            self.current_brightness = self.display.brightness
-            self.anim_step = self.max_brightness * 0.005
-            self.display.connect_brightness_changed_signal(
-                self.handle_brightness_change
+            self.add_controller(name, display)
+        self.update_sensor_claim()
+
+    def add_controller(self, name: str, display: "ScreenBrightnessDBus"):
+        cfg = self.display_config(display)
+        if not cfg.get("enabled", True):
+            self.logger.debug(f"Display '{display.label}' is disabled in config")
+            return
+
+        controller = self.controllers[name] = DisplayController(self, display)
+        controller.configure(cfg)
+        if name in self.detached:
+            version, state = self.detached.pop(name)
+            controller.restore_state(state, version == self.curve.version)
+        elif name in self.restored_state.get("displays", {}):
+            controller.restore_state(
+                self.restored_state["displays"][name],
+                self.restored_state.get("curve") == self.curve.version,
             )
-            self.report_light_level(self.sensor_proxy_dbus.light_level)
-            self.logger.debug(
-                f"Display '{self.display.label}' is enabled, max_brightness={self.max_brightness}"
+        display.connect_brightness_changed_signal(controller.handle_brightness_change)
+        if controller.recorder:
+            controller.recorder.record(
+                "display", controller.max_brightness, controller.current_brightness
             )
+        self.logger.debug(
+            f"Display '{display.label}' is enabled, max_brightness={display.max_brightness}"
+        )
+        if not self.sensor_proxy_dbus.available:
+            return
+        if len(self.controllers) == 1:
+            # light level is not followed without displays, fetch it again
+            self.apply_light_level(self.sensor_proxy_dbus.light_level)
         else:
-            self.display = None
-            self.max_brightness = 0
-            self.current_brightness = 0
-            self.anim_step = 1
-
-            if self.anim_bright_target is not None:
-                self.anim_abort_event.set()
-            self.light_event.set()
-            self.logger.debug("Built-in display is disabled")
-
-    def get_recommended_brightness(self, bias=0):
-        if not self.max_brightness:
-            return self.current_brightness
-
-        lux = self.current_light_level
-        idx = self.current_bucket_idx
-
-        # Move up if lux >= upper_bound of current bucket
-        while (
-            idx < len(self.brightness_buckets) - 1
-            and lux >= self.brightness_buckets[idx][1]
-        ):
-            idx += 1
-        # Move down if lux < lower_bound of current bucket
-        while idx > 0 and lux < self.brightness_buckets[idx][0]:
-            idx -= 1
-
-        self.current_bucket_idx = idx
-        percent = self.brightness_buckets[idx][2]
-        value = round(self.max_brightness * percent / 100)
-        value = max(min(value + bias, self.max_brightness), 0)
-        return value
-
-    def report_light_level(self, value: int):
-        self.current_light_level = value
-
-        if self.anim_bright_target is not None:
-            # abort any ongoing brigtness animation
-            # as target brightness bucket might be changed
-            self.anim_abort_event.set()
-
-        self.light_event.set()
-        self.logger.debug(f"light_level={value}")
-
-    def wait_recommended_brightness(self):
-        while not self.stop_event.is_set():
-            signaled = self.light_event.wait(60)
-            self.light_event.clear()
-
-            if not self.display:
-                continue
-
-            recomm_brightness = self.current_brightness
-            bucket_changed = True
-
-            # debounce frequent bucket changes
-            while bucket_changed:
-                recomm_brightness = self.get_recommended_brightness(
-                    bias=self.user_brightness_bias
-                )
-                bucket_changed = recomm_brightness != self.current_brightness
-
-                if signaled and bucket_changed and self.anim_bright_target is None:
-                    if self.light_event.wait(2.0):
-                        self.light_event.clear()
-                        self.logger.debug(f"debounced")
-                        continue
-
-                break
-
-            self.logger.debug(f"{recomm_brightness=}, {signaled=}, {bucket_changed=}")
-
-            if self.anim_bright_target is not None:
-                # resume interrupted brightness animation
-                return recomm_brightness
-
-            if bucket_changed and not self.inhibited_by_powerdevil:
-                return recomm_brightness
-
-        return self.current_brightness
-
-    def animate_brightness(self):
-        while not self.stop_event.is_set():
-            try:
-                target = self.wait_recommended_brightness()
-
-                start = self.current_brightness
-                delta = target - start
-                frame_count = ceil(abs(delta) / self.anim_step)
-                if frame_count < 1:
-                    continue
-
-                self.anim_bright_target = target
-
-                self.logger.debug(f"{start=}, {target=}, {frame_count=}")
-                self.anim_abort_event.clear()
-
-                for i in range(1, frame_count + 1):
-                    if self.anim_abort_event.is_set() or self.stop_event.is_set():
-                        self.logger.debug(f"aborted animation")
-                        break
-
-                    b = start + round(i * cpsign(self.anim_step, delta))
-
-                    if (delta > 0 and b >= target) or (delta < 0 and b <= target):
-                        self.display.set_brightness(target)
-                        break
-                    else:
-                        self.display.set_brightness(b)
-                        time.sleep(0.05)  # 20 fps
+            # first brightness for this display, skip debounce
+            controller.update_brightness(signaled=False)
+
+    def state_changed(self):
+        if self.state_writer:
+            self.state_writer.mark_dirty()
+
+    def get_state(self) -> dict:
+        displays = dict(self.restored_state.get("displays", {}))
+        for name, (_, state) in self.detached.items():
+            displays[name] = state
+        for name, controller in self.controllers.items():
+            displays[name] = controller.get_state()
+        return {
+            "curve": self.curve.version,
+            "light_level": self.current_light_level,
+            "displays": displays,
+        }
+
+    def restore_state(self, state: dict | None):
+        """Applies a snapshot saved by a previous run, before displays attach"""
+        if not state:
+            return
+        displays = {
+            str(name): {
+                "label": str(d.get("label", "")),
+                "max_brightness": int(d["max_brightness"]),
+                "bucket": int(d["bucket"]),
+                "bias": int(d["bias"]),
+            }
+            for name, d in state.get("displays", {}).items()
+        }
+        self.current_light_level = int(state.get("light_level", 0))
+        self.restored_state = {"curve": state.get("curve"), "displays": displays}
+        self.logger.debug(
+            f"restored state of {len(state.get('displays', {}))} displays"
+        )
 
-            except dbus.exceptions.DBusException as e:
-                self.logger.exception(e)
-                time.sleep(1.0)
+    def on_screensaver_change(self, active: bool):
+        self.logger.debug(f"session locked={active}")
+        self.update_sensor_claim()
+
+    @property
+    def sensor_needed(self) -> bool:
+        """Whether the internal display is present, lit and unlocked"""
+        if not self.power_save:
+            return True
+        if self.screensaver_dbus.active:
+            return False
+        return any(
+            c.display.is_internal and not c.inhibited_by_powerdevil
+            for c in self.controllers.values()
+        )
 
-    def handle_brightness_bias_clear(self, action, *args):
-        if action == "undo":
-            self.user_brightness_bias = 0
-            if self.display:
-                target = self.get_recommended_brightness()
-                self.display.set_brightness(target)
-            self.logger.debug(f"user_brightness_bias={self.user_brightness_bias}")
-
-    def handle_brightness_change(self, source, value, *args, **kw):
-        b = int(value["Brightness"]) if "Brightness" in value else None
-        if b is None:
+    def update_sensor_claim(self):
+        needed = self.sensor_needed
+        if needed == self.sensor_active:
             return
 
-        if self.anim_bright_target is None:
-            prev_bias = self.user_brightness_bias
-            self.user_brightness_bias = b - self.get_recommended_brightness()
-
-            # heuristics around powerdevil behaviour dimming screen on idle timeout
-            # do not show notifications when dimming takes place
-            # https://github.com/KDE/powerdevil/blob/bfa2cf691acf37b60541cc61ae11e0fad7c0f816/daemon/actions/bundled/dimdisplay.cpp#L74
-            brightness_ratio = (
-                round(b / self.current_brightness, 2) if self.current_brightness else 0
+        self.sensor_active = needed
+        if needed:
+            # first reading after wake is applied without debounce
+            self.wake_pending = True
+            self.sensor_proxy_dbus.claim()
+            self.logger.debug("Ambient light sensor claimed")
+        else:
+            self.wake_pending = False
+            self.sensor_proxy_dbus.release()
+            self.lux_filter.cancel()
+            for controller in self.controllers.values():
+                controller.cancel_debounce()
+            self.logger.debug("Ambient light sensor released")
+
+    def display_config(self, display: "ScreenBrightnessDBus") -> dict:
+        """Entry of the `displays` config section for a display name or label"""
+        cfgs = self.display_configs
+        return cfgs.get(display.name) or cfgs.get(display.label) or {}
+
+    def configure(self, cfg: dict):
+        """Applies the config file, every section is built and validated
+        first so that an invalid file leaves the service unchanged"""
+        transition = cfg.get("transition", {})
+        duration = float(transition.get("duration", TRANSITION_DURATION))
+        max_writes = int(transition.get("max_writes", TRANSITION_MAX_WRITES))
+        gamma = float(transition.get("gamma", TRANSITION_GAMMA))
+
+        fast = cfg.get("fast_path", {})
+        jump = {
+            key: convert(fast[key])
+            for key, convert in (("ratio", float), ("samples", int), ("window", float))
+            if key in fast
+        }
+        jump_detector = None
+        if fast.get("enabled", True):
+            jump_detector = JumpDetector(self.scheduler, self.apply_light_jump, **jump)
+        fast_duration = float(fast.get("duration", FAST_TRANSITION_DURATION))
+        fast_max_writes = int(fast.get("max_writes", FAST_TRANSITION_MAX_WRITES))
+
+        filters_config = cfg.get("filters")
+        filters = create_filters(filters_config)
+        display_configs = {
+            name: display_settings(entry)
+            for name, entry in cfg.get("displays", {}).items()
+        }
+        curve = BrightnessCurve.from_config(cfg.get("curve"))
+        power_save = bool(cfg.get("power_save", True))
+
+        self.transition_duration = duration
+        self.transition_max_writes = max_writes
+        self.transition_gamma = gamma
+        if self.jump_detector:
+            self.jump_detector.cancel()
+        self.jump_detector = jump_detector
+        self.fast_transition_duration = fast_duration
+        self.fast_transition_max_writes = fast_max_writes
+
+        if filters_config != self.filters_config:
+            # a reload with the same filters keeps their history
+            lux_filter = FilterPipeline(
+                filters, self.scheduler, self.report_light_level
             )
+            lux_filter.passed = self.lux_filter.passed
+            lux_filter.suppressed = self.lux_filter.suppressed
+            if self.lux_filter.last is not None:
+                lux_filter.reset(self.current_light_level)
+            self.lux_filter.cancel()
+            self.lux_filter = lux_filter
+            self.filters_config = filters_config
+
+        self.display_configs = display_configs
+        for controller in self.controllers.values():
+            controller.configure(self.display_config(controller.display))
+
+        self.set_curve(curve)
+        if power_save != self.power_save:
+            # switched while the screen is locked or dimmed
+            self.power_save = power_save
+            self.update_sensor_claim()
+
+    def set_curve(self, curve: BrightnessCurve):
+        self.curve = curve
+        self.logger.debug(f"brightness curve with {len(curve.buckets)} buckets")
+        for controller in self.controllers.values():
+            controller.reset_curve()
+        self.update_brightness()
 
-            if brightness_ratio == 0.3 and self.user_brightness_bias < prev_bias:
-                self.inhibited_by_powerdevil = True
-                self.logger.debug(f"inhibited_by_powerdevil=True")
-
-            elif brightness_ratio == 3.33 and self.user_brightness_bias > prev_bias:
-                self.inhibited_by_powerdevil = False
-                self.logger.debug(f"inhibited_by_powerdevil=False")
+    def report_light_level(self, value: int):
+        self.current_light_level = value
+        self.logger.debug(f"light_level={value}")
+        self.state_changed()
+        self.update_brightness(signaled=True, reason=LUX)
 
-            elif self.user_brightness_bias != prev_bias:
-                p = self.user_brightness_bias / self.max_brightness
-                self.notif_dbus.notify(
-                    "Brightness set manually",
-                    f"Adaptive brightness curve is offset by {p:+.0%}",
-                )
-                self.logger.debug(f"user_brightness_bias={self.user_brightness_bias}")
+    def apply_light_level(self, value: int):
+        # sensor and display just became available, skip debounce
+        self.lux_filter.reset(value)
+        self.current_light_level = value
+        if self.recorder:
+            self.recorder.record("lux", value)
+        self.update_brightness(signaled=False, reason=LUX)
+
+    def apply_light_jump(self, value: int, started_at: float):
+        """Applies a confirmed large light change without debounce, the
+        filters restart from the new level"""
+        self.fast_paths += 1
+        self.lux_filter.reset(value)
+        self.current_light_level = value
+        self.logger.debug(f"light_level={value}, fast path")
+        self.state_changed()
+        for controller in self.controllers.values():
+            controller.update_brightness(reason=LUX, fast_since=started_at)
+
+    def update_brightness(self, signaled=False, reason=0):
+        for controller in self.controllers.values():
+            controller.update_brightness(signaled, reason)
+
+    def on_first_write(self, now: float):
+        if self.first_write_at is None:
+            self.first_write_at = now
+            self.logger.info(
+                f"First brightness write {(now - self.started_at) * 1000:.0f} ms after start"
+            )
+            if self.on_first_write_done:
+                self.on_first_write_done()
+
+    def on_bias_change(self, controller: DisplayController):
+        self.bias_controller = controller
+        p = controller.user_brightness_bias / controller.max_brightness
+        title = "Brightness set manually"
+        if len(self.controllers) > 1:
+            title += f" on {controller.display.label}"
+        self.notif_dbus.notify(
+            title, f"Adaptive brightness curve is offset by {p:+.0%}"
+        )
 
-        elif b == self.anim_bright_target:
-            self.anim_bright_target = None
-            self.logger.debug("animate_brightness: end")
+    def get_stats(self) -> dict:
+        stats = {
+            "lux_signals": self.lux_signals,
+            "light_level": self.current_light_level,
+            "lux_filter_passed": self.lux_filter.passed,
+            "lux_filter_suppressed": self.lux_filter.suppressed,
+            "debounces": self.debounces,
+            "bucket_changes": self.bucket_changes,
+            "animations_started": self.animations_started,
+            "animations_aborted": self.animations_aborted,
+            "frames_dropped": self.frames_dropped,
+            "fast_paths": self.fast_paths,
+            "settle_ms": {
+                path: hist.as_dict() for path, hist in self.settle_time.items()
+            },
+            "notifications_sent": self.notif_dbus.sent,
+            "notifications_coalesced": self.notif_dbus.coalesced,
+            "events_recorded": self.event_log.recorded,
+            "displays": {
+                name: controller.get_stats()
+                for name, controller in self.controllers.items()
+            },
+        }
+
+        sensor = self.sensor_proxy_dbus
+        if sensor.prop_cache:
+            stats["sensor_cache_hits"] = sensor.prop_cache.hits
+            stats["sensor_cache_misses"] = sensor.prop_cache.misses
+        if sensor.signals:
+            stats["sensor_signals"] = sensor.signals.as_dict()
+
+        claimed, released = sensor.claim_times()
+        stats["sensor_claimed"] = sensor.claimed
+        stats["sensor_claims"] = sensor.claims
+        stats["sensor_releases"] = sensor.releases
+        stats["sensor_claimed_s"] = round(claimed, 1)
+        stats["sensor_released_s"] = round(released, 1)
+
+        for key, client in [("sensor", sensor), ("screens", self.screens_dbus)]:
+            if isinstance(client, RecoveryTracking):
+                stats[f"{key}_recovery"] = client.recovery_stats()
+
+        return stats
+
+    def get_events(self) -> list:
+        return self.event_log.events(self.scheduler.monotonic())
 
-        self.current_brightness = b
+    def handle_brightness_bias_clear(self, action, *args):
+        if action == "undo" and self.bias_controller:
+            self.bias_controller.clear_bias()
 
     def handle_sensor_props_change(self, source, changedProps, invalidatedProps, **kw):
-        if source == "net.hadess.SensorProxy" and self.display:
+        if source == "net.hadess.SensorProxy" and self.controllers:
             if "LightLevel" in changedProps:
+                self.lux_signals += 1
                 val = int(changedProps["LightLevel"])
-                self.report_light_level(val)
+                if self.wake_pending:
+                    self.wake_pending = False
+                    self.apply_light_level(val)
+                    return
+                if self.recorder:
+                    self.recorder.record("lux", val)
+                if self.jump_detector and self.jump_detector.process(
+                    val, self.current_light_level
+                ):
+                    return
+                self.lux_filter.push(val)
@@ -0,0 +1,254 @@
+"""Displays driven through the kernel backlight class instead of PowerDevil.
+
+Brightness is read from /sys/class/backlight/<device>/brightness, changes
+made by anyone else are picked up with inotify, and writes go through
+logind's Session.SetBrightness, which lets the session owner set the
+backlight without root. Nothing here talks to D-Bus, the logind session
+client of the selected backend is passed in.
+"""
+
+import logging
+import os
+
+from autobrightness.inotify import IN_IGNORED, IN_MODIFY, Inotify
+from autobrightness.services.common import WritePipeline
+
+SYSFS_BACKLIGHT = "/sys/class/backlight"
+SUBSYSTEM = "backlight"
+
+LOGIND_NAME = "org.freedesktop.login1"
+LOGIND_SESSION_IFACE = "org.freedesktop.login1.Session"
+# the caller's session, or the user's display session for processes outside
+# of one, such as a systemd user service
+LOGIND_SESSION_PATH = "/org/freedesktop/login1/session/auto"
+
+# the kernel notifies actual_brightness on every change, brightness itself
+# only changes on writes, fake trees in tests only have the latter
+WATCHED = ("brightness", "actual_brightness")
+
+# preferred control when one panel is exposed by several drivers,
+# the same order systemd-backlight and PowerDevil use
+TYPE_PRIORITY = {"firmware": 0, "platform": 1, "raw": 2}
+
+
+def read_attr(path: str, name: str) -> str:
+    with open(os.path.join(path, name)) as f:
+        return f.read().strip()
+
+
+def is_external(name: str) -> bool:
+    # monitors controlled over DDC/CI by the ddcci-backlight driver
+    return name.startswith("ddcci")
+
+
+def select_devices(root: str) -> list:
+    """Backlight devices worth controlling, one control per internal panel"""
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return []
+
+    internal = {}
+    external = []
+    for name in names:
+        path = os.path.join(root, name)
+        if is_external(name):
+            external.append(name)
+            continue
+        try:
+            kind = read_attr(path, "type")
+        except OSError:
+            kind = "raw"
+        internal[name] = TYPE_PRIORITY.get(kind, len(TYPE_PRIORITY))
+
+    best = min(internal.values(), default=None)
+    return [name for name, p in internal.items() if p == best] + external
+
+
+class AttributeCache:
+    """Integer sysfs attributes of one device, read once and re-read when
+    inotify reports a change"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.values: dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str) -> int:
+        try:
+            value = self.values[name]
+        except KeyError:
+            self.misses += 1
+            value = self.values[name] = int(read_attr(self.path, name))
+        else:
+            self.hits += 1
+        return value
+
+    def refresh(self, name: str) -> bool:
+        """Re-reads an attribute, True when its value changed"""
+        old = self.values.get(name)
+        self.misses += 1
+        self.values[name] = int(read_attr(self.path, name))
+        return self.values[name] != old
+
+
+class BacklightDisplay(WritePipeline):
+    def __init__(self, path: str, session, mngr: "BacklightScreens | None" = None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.session = session
+        self.mngr = mngr
+        self.logger = logging.getLogger(__name__)
+
+        self.props = AttributeCache(path)
+        self.max_brightness = self.props.get("max_brightness")
+        self.is_internal = not is_external(self.name)
+        self.label = self.name
+        self.props.get("brightness")
+        self.on_change: callable | None = None
+        # changes come from inotify, there are no signals to filter
+        self.signals = None
+        self._init_writes()
+
+    @property
+    def brightness(self):
+        return self.props.get("brightness")
+
+    def _send_brightness(self, value: int):
+        self.session.set_brightness(
+            SUBSYSTEM,
+            self.name,
+            value,
+            reply_handler=self._on_write_reply,
+            error_handler=self._on_write_error,
+        )
+
+    def _on_write_reply(self, *args):
+        self._write_finished()
+        self._write_next()
+
+    def _on_write_error(self, e: Exception):
+        self._write_finished(failed=True)
+
+        if not os.path.isdir(self.path) and self.mngr is not None:
+            self._drop_writes()
+            self.mngr.discover()
+        else:
+            self.logger.warning(f"SetBrightness failed: {e}")
+            self._write_next()
+
+    def on_modified(self):
+        """Reports the new brightness after inotify saw an attribute change"""
+        try:
+            changed = self.props.refresh("brightness")
+        except (OSError, ValueError) as e:
+            self.logger.debug(f"{self.name}: brightness unreadable: {e}")
+            return
+        if changed and callable(self.on_change):
+            value = self.props.values["brightness"]
+            self.on_change(SUBSYSTEM, {"Brightness": value}, [])
+
+    def connect_brightness_changed_signal(self, fn: callable):
+        self.on_change = fn
+
+    def disconnect(self):
+        self.on_change = None
+
+
+class BacklightScreens:
+    """Drop-in for ScreensDbus over /sys/class/backlight.
+
+    Devices are discovered on `run` and again when a watched device goes
+    away. `session` provides `set_brightness(subsystem, name, value,
+    reply_handler, error_handler)`, see LogindSessionDBus.
+    """
+
+    def __init__(self, scheduler, session, root: str = SYSFS_BACKLIGHT) -> None:
+        self.scheduler = scheduler
+        self.session = session
+        self.root = root
+        self.logger = logging.getLogger(__name__)
+
+        self.displays: dict[str, BacklightDisplay] = {}
+        self.on_display_change: callable | None = None
+        self.inotify: Inotify | None = None
+        self.source: int | None = None
+        self.watches: dict[int, BacklightDisplay] = {}
+        self.inotify_events = 0
+
+    def run(self):
+        try:
+            self.inotify = Inotify()
+        except OSError as e:
+            self.logger.warning(f"Brightness changes are not followed: {e}")
+        else:
+            self.source = self.scheduler.io_add_watch(self.inotify.fd, self.on_events)
+        self.discover()
+
+    def stop(self):
+        for name in list(self.displays):
+            self.remove_display(name)
+        if self.source is not None:
+            self.scheduler.source_remove(self.source)
+            self.source = None
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def discover(self):
+        names = select_devices(self.root)
+        for name in list(self.displays):
+            if name not in names:
+                self.remove_display(name)
+        for name in names:
+            if name not in self.displays:
+                self.add_display(name)
+
+    def add_display(self, name: str):
+        path = os.path.join(self.root, name)
+        try:
+            displ = BacklightDisplay(path, self.session, self)
+            if self.inotify is not None:
+                self.watches[self.inotify.add_watch(path, IN_MODIFY)] = displ
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Backlight {name} unusable: {e}")
+            return
+        self.displays[name] = displ
+        self._notify(name, displ)
+
+    def remove_display(self, name: str):
+        displ = self.displays.pop(name, None)
+        if displ is None:
+            return
+        for wd, watched in list(self.watches.items()):
+            if watched is displ:
+                del self.watches[wd]
+                self.inotify.rm_watch(wd)
+        displ.disconnect()
+        self._notify(name, None)
+
+    def _notify(self, name: str, displ: BacklightDisplay | None):
+        try:
+            if callable(self.on_display_change):
+                self.on_display_change(name, displ)
+        except Exception as e:
+            self.logger.exception(e)
+
+    def on_events(self):
+        vanished = False
+        for wd, mask, name in self.inotify.read_events():
+            self.inotify_events += 1
+            displ = self.watches.get(wd)
+            if displ is None:
+                continue
+            if mask & IN_IGNORED:
+                # the device directory is gone, e.g. a DDC/CI monitor unplugged
+                del self.watches[wd]
+                vanished = True
+            elif name in WATCHED:
+                displ.on_modified()
+
+        if vanished:
+            self.discover()
+        return True
@@ -0,0 +1,288 @@
+"""Client logic shared by the dbus-python and the asyncio backends.
+
+Nothing here talks to D-Bus, the backend classes send the actual calls and
+report back, so counters and coalescing behave the same on either backend.
+"""
+
+import time
+
+from autobrightness.metrics import Histogram
+
+STATS_NAME = "org.autobrightness.Service"
+STATS_PATH = "/org/autobrightness/Service"
+
+UNKNOWN_OBJECT = "org.freedesktop.DBus.Error.UnknownObject"
+# the service exited, NameOwnerChanged follows and triggers the rebind
+SERVICE_UNKNOWN = "org.freedesktop.DBus.Error.ServiceUnknown"
+
+# from losing a service to having rebound to its new instance, milliseconds
+RECOVERY_BOUNDS_MS = (100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class ClaimAccounting:
+    """Tracks whether the light sensor is claimed and for how long.
+
+    iio-sensor-proxy polls the sensor only while it is claimed. Subclasses
+    call `_init_claims` and provide an `available` property.
+    """
+
+    def _init_claims(self):
+        self.want_claim = True
+        self.claimed = False
+        self.claims = 0
+        self.releases = 0
+        self.claimed_time = 0.0
+        self.released_time = 0.0
+        self.state_since = time.monotonic()
+
+    def _set_claimed(self, claimed: bool):
+        now = time.monotonic()
+        if self.claimed:
+            self.claimed_time += now - self.state_since
+        elif self.available:
+            self.released_time += now - self.state_since
+        self.state_since = now
+
+        if claimed != self.claimed:
+            self.claimed = claimed
+            if claimed:
+                self.claims += 1
+            else:
+                self.releases += 1
+
+    def claim_times(self) -> tuple:
+        """Seconds the sensor was claimed and released while available"""
+        self._set_claimed(self.claimed)
+        return self.claimed_time, self.released_time
+
+
+class RecoveryTracking:
+    """Measures how long a remote service was gone and what was lost.
+
+    Subclasses call `_init_recovery`, then `_service_lost` when its name
+    loses the owner, `_service_found` when a new owner appears and
+    `_service_bound` once properties, claims and displays are restored.
+    Writes that failed or brightness changes missed meanwhile are counted
+    with `count_lost`. Absence at startup is not an outage.
+    """
+
+    def _init_recovery(self):
+        self.outages = 0
+        self.events_lost = 0
+        self.bound = False
+        self.lost_at: float | None = None
+        self.found_at: float | None = None
+        self.downtime = 0.0
+        self.recovery_time = Histogram(RECOVERY_BOUNDS_MS)
+        self.rebind_time = Histogram()
+
+    def _service_lost(self):
+        if self.bound and self.lost_at is None:
+            self.outages += 1
+            self.lost_at = time.monotonic()
+        self.bound = False
+
+    def _service_found(self):
+        self.found_at = time.monotonic()
+
+    def _service_bound(self):
+        now = time.monotonic()
+        if self.lost_at is not None:
+            self.downtime += now - self.lost_at
+            self.recovery_time.observe((now - self.lost_at) * 1000)
+            self.rebind_time.observe((now - (self.found_at or now)) * 1000)
+            self.lost_at = None
+        self.bound = True
+
+    def count_lost(self, count: int = 1):
+        self.events_lost += count
+
+    def recovery_stats(self) -> dict:
+        downtime = self.downtime
+        if self.lost_at is not None:
+            downtime += time.monotonic() - self.lost_at
+        return {
+            "outages": self.outages,
+            "downtime_s": round(downtime, 1),
+            "events_lost": self.events_lost,
+            # vanished to rebound, and the part spent rebinding after reappearing
+            "recovery_ms": self.recovery_time.as_dict(),
+            "rebind_ms": self.rebind_time.as_dict(),
+        }
+
+
+class SignalFilter:
+    """Picks the properties a client follows out of PropertiesChanged.
+
+    Match rules only deliver signals of `interface` (arg0), but services put
+    unrelated properties on the same interface, e.g. iio-sensor-proxy
+    reports accelerometer and proximity next to the light level. Signals
+    carrying none of `names` are dropped before anything is decoded.
+    """
+
+    def __init__(self, interface: str, names: tuple) -> None:
+        self.interface = interface
+        self.names = names
+        self.received = 0
+        self.acted_on = 0
+
+    def select(self, interface: str, changed: dict, invalidated: list):
+        """(changed, invalidated) restricted to `names`, None to drop"""
+        self.received += 1
+        if interface != self.interface:
+            return None
+        picked = {name: changed[name] for name in self.names if name in changed}
+        dropped = [name for name in invalidated if name in self.names]
+        if not picked and not dropped:
+            return None
+        self.acted_on += 1
+        return picked, dropped
+
+    def as_dict(self) -> dict:
+        return {"received": self.received, "acted_on": self.acted_on}
+
+
+class WritePipeline:
+    """At most one SetBrightness call is in flight, newer frames replace
+    the pending value instead of queueing behind a slow write.
+
+    Subclasses send the call in `_send_brightness` and report completion
+    with `_write_finished`, followed by `_write_next`.
+    """
+
+    def _init_writes(self):
+        self.write_in_flight = False
+        self.write_pending: int | None = None
+        self.writes_issued = 0
+        self.writes_merged = 0
+        self.writes_failed = 0
+        self.write_started_at = 0.0
+        self.write_latency = Histogram()
+
+    def set_brightness(self, value: int):
+        if self.write_in_flight:
+            if self.write_pending is not None:
+                self.writes_merged += 1
+            self.write_pending = value
+            return
+
+        self.write_in_flight = True
+
+        self._write(value)
+
+    def _write(self, value: int):
+        self.writes_issued += 1
+        self.write_started_at = time.monotonic()
+        self._send_brightness(value)
+
+    def _write_next(self):
+        value = self.write_pending
+        self.write_pending = None
+        self.write_in_flight = value is not None
+
+        if value is not None:
+            self._write(value)
+
+    def _write_finished(self, failed: bool = False):
+        self.write_latency.observe((time.monotonic() - self.write_started_at) * 1000)
+        if failed:
+            self.writes_failed += 1
+
+    def _drop_writes(self):
+        self.write_pending = None
+        self.write_in_flight = False
+
+
+class NotificationQueue:
+    """Notifications are delayed by `delay` seconds, updates in between
+    replace the pending one, at most one Notify call is in flight.
+
+    Subclasses call `_init_queue`, provide an `available` property and
+    implement `_send` and `_close`, reporting back with `_on_notify_reply`
+    or `_on_notify_error`.
+    """
+
+    def _init_queue(self, scheduler):
+        self.scheduler = scheduler
+        self.notif_id: int = 0
+        self.notif_timeout: int = 5
+        self.notif_shown_at: float = 0
+
+        self.delay = 1.0
+        self.pending: tuple | None = None
+        self.source: int | None = None
+        self.in_flight = False
+        self.requested = 0
+        self.coalesced = 0
+        self.sent = 0
+
+    def notify(self, title, body):
+        self.requested += 1
+        if self.pending is not None:
+            self.coalesced += 1
+        self.pending = (title, body)
+
+        # a burst of updates, e.g. while a slider is dragged, shows only the last
+        if self.source is not None:
+            self.scheduler.source_remove(self.source)
+        self.source = self.scheduler.timeout_add(self.delay, self._on_timeout)
+
+    def _cancel_pending(self):
+        if self.source is not None:
+            self.scheduler.source_remove(self.source)
+            self.source = None
+        self.pending = None
+
+    def _on_timeout(self):
+        self.source = None
+        self._notify()
+        return False
+
+    def _notify(self):
+        if self.in_flight or self.pending is None:
+            return
+
+        if not self.available:
+            self.pending = None
+            return
+
+        title, body = self.pending
+        self.pending = None
+
+        now = self.scheduler.monotonic()
+        if self.notif_id and now > self.notif_shown_at + self.notif_timeout:
+            self._close(self.notif_id)
+
+        self.in_flight = True
+        self._send(title, body)
+
+    def _on_notify_reply(self, notif_id):
+        self.in_flight = False
+        self.notif_id = int(notif_id)
+        self.notif_shown_at = self.scheduler.monotonic()
+        self.sent += 1
+        self._notify_next()
+
+    def _on_notify_error(self, e: Exception):
+        self.in_flight = False
+        self._on_error(e)
+        self._notify_next()
+
+    def _on_error(self, e: Exception):
+        self.logger.warning(f"Notification failed: {e}")
+
+    def _notify_next(self):
+        # updates which arrived while Notify was in flight, unless still delayed
+        if self.source is None:
+            self._notify()
+
+
+def format_stats(stats: dict, indent="") -> str:
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            lines.append(f"{indent}{key}:")
+            lines.append(format_stats(value, indent + "  "))
+        else:
+            lines.append(f"{indent}{key}: {value}")
+    return "\n".join(lines)
@@ -0,0 +1,319 @@
+"""Ambient light read straight from the kernel IIO subsystem.
+
+An alternative to iio-sensor-proxy for systems without it. The sensor is
+found under /sys/bus/iio/devices and values are converted to lux with the
+channel's scale and offset. When the device has a buffer and a trigger,
+samples are read from its character device as the driver pushes them,
+otherwise the raw attribute is polled at an interval that grows while
+light is stable. Nothing here talks to D-Bus.
+"""
+
+import errno
+import logging
+import os
+import re
+
+from autobrightness.services.common import ClaimAccounting
+
+IIO_DEVICES = "/sys/bus/iio/devices"
+DEV = "/dev"
+
+# changes are reported in the shape of iio-sensor-proxy's PropertiesChanged,
+# so the service handles both sensors alike
+SENSOR_INTERFACE = "net.hadess.SensorProxy"
+
+# looked up in this order, as iio-sensor-proxy does, processed values first
+CHANNELS = (
+    "in_illuminance_input",
+    "in_illuminance_raw",
+    "in_illuminance0_input",
+    "in_illuminance0_raw",
+    "in_intensity_both_raw",
+)
+
+POLL_MIN_INTERVAL = 0.2
+POLL_MAX_INTERVAL = 2.0
+# changes smaller than this fraction keep the poll interval growing
+POLL_SIGNIFICANT_CHANGE = 0.05
+
+SCAN_TYPE = re.compile(r"(be|le):([su])(\d+)/(\d+)(?:X\d+)?>>(\d+)")
+
+
+def read_attr(path: str, name: str) -> str:
+    with open(os.path.join(path, name)) as f:
+        return f.read().strip()
+
+
+def write_attr(path: str, name: str, value):
+    with open(os.path.join(path, name), "w") as f:
+        f.write(f"{value}\n")
+
+
+def find_sensor(root: str) -> tuple | None:
+    """(device path, channel) of the first ambient light sensor"""
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        return None
+
+    for name in names:
+        if not name.startswith("iio:device"):
+            continue
+        path = os.path.join(root, name)
+        for channel in CHANNELS:
+            if os.path.exists(os.path.join(path, channel)):
+                return path, channel
+    return None
+
+
+class ScanType:
+    """Sample layout of a buffered channel, e.g. `le:u16/16>>0`"""
+
+    def __init__(self, text: str) -> None:
+        m = SCAN_TYPE.fullmatch(text.strip())
+        if not m:
+            raise ValueError(f"unsupported scan type {text!r}")
+        self.byteorder = "big" if m[1] == "be" else "little"
+        self.signed = m[2] == "s"
+        self.bits = int(m[3])
+        self.size = int(m[4]) // 8
+        self.shift = int(m[5])
+
+    def decode(self, data: bytes) -> int:
+        value = int.from_bytes(data, self.byteorder) >> self.shift
+        value &= (1 << self.bits) - 1
+        if self.signed and value >> (self.bits - 1):
+            value -= 1 << self.bits
+        return value
+
+
+class IIOLightSensor(ClaimAccounting):
+    """Drop-in for SensorProxyDBus reading the IIO device itself.
+
+    Capture runs only while claimed, like iio-sensor-proxy polls only
+    while a client holds a claim.
+    """
+
+    def __init__(self, scheduler, root: str = IIO_DEVICES, dev_root: str = DEV):
+        self.scheduler = scheduler
+        self.root = root
+        self.dev_root = dev_root
+        self.logger = logging.getLogger(__name__)
+
+        self.path: str | None = None
+        self.channel: str | None = None
+        self.prefix: str | None = None
+        self.scale = 1.0
+        self.offset = 0.0
+        self.level: float | None = None
+        self.prop_cache = None
+        self.signals = None
+        self.on_sensor_change: callable | None = None
+        self.on_props_changed: callable | None = None
+
+        self.mode: str | None = None
+        self.fd: int | None = None
+        self.source: int | None = None
+        self.scan: ScanType | None = None
+        self.partial = b""
+        self.poll_interval = POLL_MIN_INTERVAL
+        self.samples = 0
+        self._init_claims()
+
+    def run(self):
+        found = find_sensor(self.root)
+        if found is None:
+            self.logger.error("Ambient Light Sensor not available")
+            return
+
+        self.path, self.channel = found
+        self.prefix = self.channel.rsplit("_", 1)[0]
+        if self.channel.endswith("_raw"):
+            self.scale = self._read_float(f"{self.prefix}_scale", 1.0)
+            self.offset = self._read_float(f"{self.prefix}_offset", 0.0)
+        try:
+            self.level = self.read_lux()
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Ambient Light Sensor not readable: {e}")
+            self.path = None
+            return
+        self.logger.debug(f"Ambient light sensor {self.path}/{self.channel}")
+
+        if self.want_claim:
+            self._start()
+            self._set_claimed(True)
+        if callable(self.on_sensor_change):
+            self.on_sensor_change(self)
+
+    def stop(self):
+        if self.claimed:
+            self._stop()
+            self._set_claimed(False)
+
+    def claim(self):
+        self.want_claim = True
+        if self.available and not self.claimed:
+            self._start()
+            self._set_claimed(True)
+
+    def release(self):
+        self.want_claim = False
+        if self.available and self.claimed:
+            self._stop()
+            self._set_claimed(False)
+
+    @property
+    def available(self):
+        return self.path is not None
+
+    @property
+    def has_ambient_light(self):
+        return self.available
+
+    @property
+    def light_level(self):
+        if self.level is None:
+            self.level = self.read_lux()
+        return int(self.level)
+
+    def connect_props_changed_signal(self, fn: callable):
+        self.on_props_changed = fn
+
+    def _read_float(self, name: str, default: float) -> float:
+        try:
+            return float(read_attr(self.path, name))
+        except (OSError, ValueError):
+            return default
+
+    def to_lux(self, raw: float) -> float:
+        return (raw + self.offset) * self.scale
+
+    def read_lux(self) -> float:
+        raw = float(read_attr(self.path, self.channel))
+        return raw if self.channel.endswith("_input") else self.to_lux(raw)
+
+    def _update(self, lux: float):
+        self.samples += 1
+        lux = round(lux, 2)
+        if lux == self.level:
+            return
+        self.level = lux
+        if callable(self.on_props_changed):
+            self.on_props_changed(SENSOR_INTERFACE, {"LightLevel": lux}, [])
+
+    def _start(self):
+        try:
+            self._start_buffer()
+        except (OSError, ValueError) as e:
+            self._stop()
+            self.logger.debug(f"Buffered capture unavailable, polling: {e}")
+            self._start_polling()
+
+    def _stop(self):
+        if self.source is not None:
+            self.scheduler.source_remove(self.source)
+            self.source = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.mode == "buffer":
+            try:
+                write_attr(self.path, "buffer/enable", 0)
+            except OSError as e:
+                self.logger.debug(f"Disabling the buffer failed: {e}")
+        self.mode = None
+        self.partial = b""
+
+    def _find_trigger(self) -> str | None:
+        """Trigger the driver registered for this device, e.g. als-dev0"""
+        name = read_attr(self.path, "name")
+        index = os.path.basename(self.path)[len("iio:device") :]
+        candidates = []
+        for entry in sorted(os.listdir(self.root)):
+            if entry.startswith("trigger"):
+                try:
+                    candidates.append(read_attr(os.path.join(self.root, entry), "name"))
+                except OSError:
+                    continue
+        for trigger in candidates:
+            if trigger == f"{name}-dev{index}":
+                return trigger
+        return next((t for t in candidates if t.startswith(f"{name}-")), None)
+
+    def _start_buffer(self):
+        if self.channel.endswith("_input"):
+            raise ValueError(f"{self.channel} is not a buffered channel")
+        scan_dir = os.path.join(self.path, "scan_elements")
+        elements = os.listdir(scan_dir)
+        self.mode = "buffer"
+
+        write_attr(self.path, "buffer/enable", 0)
+        if os.path.isdir(os.path.join(self.path, "trigger")):
+            if not read_attr(self.path, "trigger/current_trigger"):
+                trigger = self._find_trigger()
+                if trigger is None:
+                    raise ValueError("no trigger for the device")
+                write_attr(self.path, "trigger/current_trigger", trigger)
+
+        # only the light channel is captured, samples are one element each
+        for element in elements:
+            if element.endswith("_en"):
+                write_attr(scan_dir, element, int(element == f"{self.prefix}_en"))
+        self.scan = ScanType(read_attr(scan_dir, f"{self.prefix}_type"))
+        write_attr(self.path, "buffer/enable", 1)
+
+        node = os.path.join(self.dev_root, os.path.basename(self.path))
+        self.fd = os.open(node, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        self.source = self.scheduler.io_add_watch(self.fd, self._on_buffer)
+
+    def _on_buffer(self):
+        data = self.partial
+        while True:
+            try:
+                chunk = os.read(self.fd, 4096)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            if not chunk:
+                # the device went away, keep following light by polling
+                self.logger.warning("Sensor buffer closed, polling instead")
+                self.source = None
+                self._stop()
+                self._start_polling()
+                return False
+            data += chunk
+
+        size = self.scan.size
+        end = len(data) - len(data) % size
+        self.partial = data[end:]
+        if end:
+            # only the newest sample matters, older ones are counted
+            self.samples += end // size - 1
+            self._update(self.to_lux(self.scan.decode(data[end - size : end])))
+        return True
+
+    def _start_polling(self):
+        self.mode = "poll"
+        self.poll_interval = POLL_MIN_INTERVAL
+        self.source = self.scheduler.timeout_add(self.poll_interval, self._poll)
+
+    def _poll(self):
+        previous = self.level
+        try:
+            lux = self.read_lux()
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Reading the light sensor failed: {e}")
+            lux = previous
+
+        # back off while light is stable, react quickly once it moves
+        threshold = POLL_SIGNIFICANT_CHANGE * max(previous or 0, 1)
+        if previous is None or abs(lux - previous) > threshold:
+            self.poll_interval = POLL_MIN_INTERVAL
+        else:
+            self.poll_interval = min(self.poll_interval * 2, POLL_MAX_INTERVAL)
+
+        if lux is not None:
+            self._update(lux)
+        self.source = self.scheduler.timeout_add(self.poll_interval, self._poll)
+        return False
@@ -1,39 +1,147 @@
 import dbus
-from autobrightness.services.abstract import DBusService
+from functools import partial
+from autobrightness.services.abstract import DBusService, PropertyCache
+from autobrightness.services.common import (
+    ClaimAccounting,
+    RecoveryTracking,
+    SignalFilter,
+)
 
+SENSOR_INTERFACE = "net.hadess.SensorProxy"
+# the rest of the interface (accelerometer, proximity) is never decoded
+SENSOR_PROPERTIES = ("LightLevel", "HasAmbientLight")
 
-class SensorProxyDBus(DBusService):
+
+class SensorProxyDBus(RecoveryTracking, ClaimAccounting, DBusService):
     def __init__(self) -> None:
         super().__init__(dbus.SystemBus)
         self.props: dbus.Interface | None = None
         self.iface: dbus.Interface | None = None
         self.proxy = None
+        self.prop_cache: PropertyCache | None = None
+        self.watch = None
+        self.on_sensor_change: callable | None = None
+        # light level when the proxy went away, to tell whether changes were missed
+        self.last_level: int | None = None
+        self.signals = SignalFilter(SENSOR_INTERFACE, SENSOR_PROPERTIES)
+        self._init_claims()
+        self._init_recovery()
 
     def run(self):
-        self.proxy = self.try_get_object(
-            "net.hadess.SensorProxy", "/net/hadess/SensorProxy"
+        self.watch = self.watch_name(
+            "net.hadess.SensorProxy", self.on_appeared, self.on_vanished
+        )
+
+    def stop(self):
+        if self.watch:
+            self.watch.cancel()
+            self.watch = None
+        if self.iface and self.claimed:
+            self.iface.ReleaseLight()
+            self._set_claimed(False)
+
+    def on_appeared(self):
+        """Rebinds to a new proxy instance, properties are fetched and the
+        sensor claimed without blocking"""
+        self._service_found()
+        self.proxy = self.bus.get_object(
+            "net.hadess.SensorProxy", "/net/hadess/SensorProxy", introspect=False
         )
         self.props = dbus.Interface(self.proxy, "org.freedesktop.DBus.Properties")
-        self.iface = dbus.Interface(self.proxy, "net.hadess.SensorProxy")
+        self.props.GetAll(
+            "net.hadess.SensorProxy",
+            reply_handler=partial(self._on_props_fetched, self.proxy),
+            error_handler=partial(self._on_fetch_error, self.proxy),
+        )
+
+    def _on_props_fetched(self, proxy, values):
+        if proxy is not self.proxy:
+            # vanished while GetAll was in flight
+            return
 
+        self.prop_cache = PropertyCache(self.props, "net.hadess.SensorProxy", values)
         if not self.has_ambient_light:
-            raise RuntimeError("Ambient Light Sensor not available")
+            self.logger.error("Ambient Light Sensor not available")
+            return
 
-        self.iface.ClaimLight()
+        iface = dbus.Interface(self.proxy, "net.hadess.SensorProxy")
+        if self.want_claim:
+            iface.ClaimLight(
+                reply_handler=lambda: None, error_handler=self._on_claim_error
+            )
+            self._set_claimed(True)
+        self.iface = iface
 
-    def stop(self):
-        if self.iface:
-            self.iface.ReleaseLight()
+        if self.last_level is not None and self.light_level != self.last_level:
+            self.count_lost()
+        self.last_level = None
+        self._service_bound()
+        if callable(self.on_sensor_change):
+            self.on_sensor_change(self)
+
+    def _on_fetch_error(self, proxy, e: dbus.exceptions.DBusException):
+        if proxy is self.proxy:
+            self.logger.warning(f"Sensor properties unavailable: {e}")
+
+    def on_vanished(self):
+        available = self.iface is not None
+        if self.prop_cache:
+            self.last_level = self.light_level
+        self._service_lost()
+        self._set_claimed(False)
+        self.proxy = self.props = self.iface = self.prop_cache = None
+        if available and callable(self.on_sensor_change):
+            self.on_sensor_change(None)
+
+    def claim(self):
+        """Resumes sensor polling, the call does not block"""
+        self.want_claim = True
+        if self.iface and not self.claimed:
+            self.iface.ClaimLight(
+                reply_handler=lambda: None, error_handler=self._on_claim_error
+            )
+            self._set_claimed(True)
+
+    def release(self):
+        """Lets iio-sensor-proxy stop polling the sensor"""
+        self.want_claim = False
+        if self.iface and self.claimed:
+            self.iface.ReleaseLight(
+                reply_handler=lambda: None, error_handler=self._on_claim_error
+            )
+            self._set_claimed(False)
+
+    def _on_claim_error(self, e: dbus.exceptions.DBusException):
+        self.logger.warning(f"Sensor claim update failed: {e}")
+
+    @property
+    def available(self):
+        return self.iface is not None
 
     @property
     def has_ambient_light(self):
-        v = self.props.Get("net.hadess.SensorProxy", "HasAmbientLight")
-        return bool(v)
+        return bool(self.prop_cache.get("HasAmbientLight"))
 
     @property
     def light_level(self):
-        v = self.props.Get("net.hadess.SensorProxy", "LightLevel")
-        return int(v)
+        return int(self.prop_cache.get("LightLevel"))
+
+    def _on_props_changed(self, fn, interface, changed, invalidated, **kw):
+        selected = self.signals.select(interface, changed, invalidated)
+        if selected is None:
+            return
+        changed, invalidated = selected
+        if self.prop_cache:
+            self.prop_cache.update(interface, changed, invalidated)
+        fn(interface, changed, invalidated, **kw)
 
     def connect_props_changed_signal(self, fn: callable):
-        self.props.connect_to_signal("PropertiesChanged", fn, sender_keyword="sender")
+        self.bus.add_signal_receiver(
+            partial(self._on_props_changed, fn),
+            "PropertiesChanged",
+            "org.freedesktop.DBus.Properties",
+            "net.hadess.SensorProxy",
+            "/net/hadess/SensorProxy",
+            sender_keyword="sender",
+            arg0=SENSOR_INTERFACE,
+        )
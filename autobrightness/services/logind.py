@@ -0,0 +1,38 @@
+import dbus
+from autobrightness.services.abstract import DBusService
+from autobrightness.services.backlight import (
+    LOGIND_NAME,
+    LOGIND_SESSION_IFACE,
+    LOGIND_SESSION_PATH,
+)
+
+
+class LogindSessionDBus(DBusService):
+    """Sets backlight brightness through the logind session of the user"""
+
+    def __init__(self) -> None:
+        super().__init__(dbus.SystemBus)
+        self.iface = None
+
+    def set_brightness(
+        self,
+        subsystem: str,
+        name: str,
+        value: int,
+        reply_handler: callable,
+        error_handler: callable,
+    ):
+        if self.iface is None:
+            proxy = self.bus.get_object(
+                LOGIND_NAME, LOGIND_SESSION_PATH, introspect=False
+            )
+            self.iface = dbus.Interface(proxy, LOGIND_SESSION_IFACE)
+
+        self.iface.SetBrightness(
+            subsystem,
+            name,
+            value,
+            signature="ssu",
+            reply_handler=reply_handler,
+            error_handler=error_handler,
+        )
@@ -1,57 +1,76 @@
 import dbus
-from threading import Timer
 from functools import partial
-import time
 from autobrightness.services.abstract import DBusService
+from autobrightness.services.common import NotificationQueue
+from autobrightness.scheduler import GLibScheduler
 
 
-class NotificationsDBus(DBusService):
-    def __init__(self) -> None:
+class NotificationsDBus(NotificationQueue, DBusService):
+    def __init__(self, scheduler=None) -> None:
         super().__init__(dbus.SessionBus)
         self.interface: dbus.Interface | None = None
-        self.notif_id: int = 0
-        self.notif_timeout: int = 5
-        self.notif_shown_at: float = 0
-        self.timer: Timer | None = None
+        self.watch = None
+        self._init_queue(scheduler or GLibScheduler())
 
     def run(self):
-        proxy = self.try_get_object(
-            "org.freedesktop.Notifications", "/org/freedesktop/Notifications"
+        self.watch = self.watch_name(
+            "org.freedesktop.Notifications", self.on_appeared, self.on_vanished
         )
-        self.interface = dbus.Interface(proxy, "org.freedesktop.Notifications")
 
     def stop(self):
-        if self.notif_id:
+        if self.watch:
+            self.watch.cancel()
+            self.watch = None
+
+        if self.notif_id and self.interface:
             self.interface.CloseNotification(self.notif_id)
 
-        if self.timer and not self.timer.finished.is_set():
-            self.timer.cancel()
+        self._cancel_pending()
+
+    def on_appeared(self):
+        proxy = self.bus.get_object(
+            "org.freedesktop.Notifications", "/org/freedesktop/Notifications"
+        )
+        self.interface = dbus.Interface(proxy, "org.freedesktop.Notifications")
+
+    def on_vanished(self):
+        self.interface = None
+        self.notif_id = 0
+        self.in_flight = False
 
     def _validate(self, fn, notif_id, *args):
         if int(notif_id) == self.notif_id:
             self.notif_id = 0
             fn(*args)
 
+    def _connect_signal(self, signal, fn):
+        self.bus.add_signal_receiver(
+            partial(self._validate, fn),
+            signal,
+            "org.freedesktop.Notifications",
+            "org.freedesktop.Notifications",
+            "/org/freedesktop/Notifications",
+        )
+
     def connect_notif_closed_signal(self, fn):
-        bound_fn = partial(self._validate, fn)
-        self.interface.connect_to_signal("NotificationClosed", bound_fn)
+        self._connect_signal("NotificationClosed", fn)
 
     def connect_notif_action_signal(self, fn):
-        bound_fn = partial(self._validate, fn)
-        self.interface.connect_to_signal("ActionInvoked", bound_fn)
+        self._connect_signal("ActionInvoked", fn)
 
-    def notify(self, title, body):
-        if self.timer and not self.timer.finished.is_set():
-            self.timer.cancel()
+    @property
+    def available(self):
+        return self.interface is not None
 
-        self.timer = Timer(1.0, self._notify, args=[title, body])
-        self.timer.start()
-
-    def _notify(self, title, body):
-        if self.notif_id and time.time() > self.notif_shown_at + self.notif_timeout:
-            self.interface.CloseNotification(self.notif_id)
+    def _close(self, notif_id: int):
+        self.interface.CloseNotification(
+            notif_id,
+            reply_handler=lambda: None,
+            error_handler=self._on_error,
+        )
 
-        self.notif_id = self.interface.Notify(
+    def _send(self, title, body):
+        self.interface.Notify(
             "autobrightness.service",
             self.notif_id,
             "",
@@ -60,5 +79,7 @@ class NotificationsDBus(DBusService):
             ["undo", "Undo"],
             {"urgency": 1, "resident": False},
             self.notif_timeout * 1000,
+            signature="susssasa{sv}i",
+            reply_handler=self._on_notify_reply,
+            error_handler=self._on_notify_error,
         )
-        self.notif_shown_at = time.time()
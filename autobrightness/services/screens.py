@@ -1,106 +1,262 @@
 import dbus
 import weakref
+from functools import partial
 
-from autobrightness.services.abstract import DBusService
+from autobrightness.services.abstract import DBusService, PropertyCache
+from autobrightness.services.common import (
+    SERVICE_UNKNOWN,
+    UNKNOWN_OBJECT,
+    RecoveryTracking,
+    SignalFilter,
+    WritePipeline,
+)
 
+POWERDEVIL = "org.kde.Solid.PowerManagement"
+PROPS_IFACE = "org.freedesktop.DBus.Properties"
+DISPLAY_INTERFACE = "org.kde.ScreenBrightness.Display"
+# limits and label are read once, only brightness changes are followed
+DISPLAY_PROPERTIES = ("Brightness",)
 
-class ScreenBrightnessDBus(DBusService):
-    def __init__(self, name: str, mngr: "ScreensDbus"):
+
+class ScreenBrightnessDBus(WritePipeline, DBusService):
+    def __init__(self, name: str, mngr: "ScreensDbus", values: dict | None = None):
         super().__init__(dbus.SessionBus)
 
         self.name = name
         self.mngr = mngr
 
+        # signatures are given explicitly, no Introspect round-trip needed
         self.proxy = self.bus.get_object(
-            "org.kde.Solid.PowerManagement",
-            f"/org/kde/ScreenBrightness/{self.name}",
+            POWERDEVIL, f"/org/kde/ScreenBrightness/{self.name}", introspect=False
         )
 
-        self.propsIface = dbus.Interface(self.proxy, "org.freedesktop.DBus.Properties")
-        self.brightnessIface = dbus.Interface(
-            self.proxy, "org.kde.ScreenBrightness.Display"
-        )
+        self.propsIface = dbus.Interface(self.proxy, PROPS_IFACE)
+        self.brightnessIface = dbus.Interface(self.proxy, DISPLAY_INTERFACE)
 
-        self.max_brightness = int(
-            self.proxy.Get("org.kde.ScreenBrightness.Display", "MaxBrightness")
-        )
-        self.is_internal = bool(
-            self.proxy.Get("org.kde.ScreenBrightness.Display", "IsInternal")
-        )
-        self.label = str(self.proxy.Get("org.kde.ScreenBrightness.Display", "Label"))
+        self.props = PropertyCache(self.propsIface, DISPLAY_INTERFACE, values)
+        self.max_brightness = int(self.props.get("MaxBrightness"))
+        self.is_internal = bool(self.props.get("IsInternal"))
+        self.label = str(self.props.get("Label"))
+        self.signal_match = None
+        self.signals = SignalFilter(DISPLAY_INTERFACE, DISPLAY_PROPERTIES)
+        self._init_writes()
 
     @property
     def brightness(self):
-        v = self.proxy.Get("org.kde.ScreenBrightness.Display", "Brightness")
-        return int(v)
+        return int(self.props.get("Brightness"))
 
-    def set_brightness(self, value: int):
-        try:
-            self.brightnessIface.SetBrightness(value, 1)
-        except dbus.exceptions.DBusException as e:
-            if (
-                e.get_dbus_name() == "org.freedesktop.DBus.Error.UnknownObject"
-                and self.mngr is not None
-            ):
+    def _send_brightness(self, value: int):
+        self.brightnessIface.SetBrightness(
+            value,
+            1,
+            signature="iu",
+            reply_handler=self._on_write_reply,
+            error_handler=self._on_write_error,
+        )
+
+    def _on_write_reply(self, *args):
+        self._write_finished()
+        self._write_next()
+
+    def _on_write_error(self, e: dbus.exceptions.DBusException):
+        self._write_finished(failed=True)
+
+        name = e.get_dbus_name()
+        if name in (UNKNOWN_OBJECT, SERVICE_UNKNOWN) and self.mngr is not None:
+            # this frame and the pending one never reach the screen
+            self.mngr.count_lost(1 + (self.write_pending is not None))
+            self._drop_writes()
+            if name == UNKNOWN_OBJECT:
                 self.mngr.discover()
-            else:
-                raise
+        else:
+            self.logger.warning(f"SetBrightness failed: {e}")
+            self._write_next()
+
+    def _on_props_changed(self, fn, interface, changed, invalidated, *args, **kw):
+        selected = self.signals.select(interface, changed, invalidated)
+        if selected is None:
+            return
+        changed, invalidated = selected
+        self.props.update(interface, changed, invalidated)
+        fn(interface, changed, invalidated, *args, **kw)
 
     def connect_brightness_changed_signal(self, fn: callable):
-        self.propsIface.connect_to_signal("PropertiesChanged", fn)
+        self.signal_match = self.propsIface.connect_to_signal(
+            "PropertiesChanged",
+            partial(self._on_props_changed, fn),
+            arg0=DISPLAY_INTERFACE,
+        )
+
+    def disconnect(self):
+        if self.signal_match is not None:
+            self.signal_match.remove()
+            self.signal_match = None
+
+
+class ScreensDbus(RecoveryTracking, DBusService):
+    """Follows PowerDevil's displays, rebinding when PowerDevil restarts.
 
+    Display names and properties are fetched asynchronously, a rediscovery
+    requested while one is in flight runs once after it.
+    """
 
-class ScreensDbus(DBusService):
     def __init__(self) -> None:
         super().__init__(dbus.SessionBus)
 
-        self._display: ScreenBrightnessDBus | None = None
-        self.on_internal_display_change: callable | None = None
+        self.displays: dict[str, ScreenBrightnessDBus] = {}
+        self.on_display_change: callable | None = None
+        self.proxy = None
+        self.watch = None
+        self.loading: set = set()
+        self.discovering = False
+        self.rediscover = False
+        # brightness when PowerDevil went away, to tell whether changes were missed
+        self.last_brightness: dict[str, int] = {}
+        self._init_recovery()
 
     def run(self):
-        self.proxy = self.try_get_object(
-            "org.kde.Solid.PowerManagement",
-            "/org/kde/ScreenBrightness",
+        for signal, fn in [
+            ("DisplayAdded", self.on_display_added),
+            ("DisplayRemoved", self.on_display_removed),
+        ]:
+            self.bus.add_signal_receiver(
+                fn,
+                signal,
+                "org.kde.ScreenBrightness",
+                POWERDEVIL,
+                "/org/kde/ScreenBrightness",
+            )
+
+        self.watch = self.watch_name(POWERDEVIL, self.on_appeared, self.on_vanished)
+
+    def stop(self):
+        if self.watch:
+            self.watch.cancel()
+            self.watch = None
+
+    def on_appeared(self):
+        self._service_found()
+        self.proxy = self.bus.get_object(
+            POWERDEVIL, "/org/kde/ScreenBrightness", introspect=False
         )
+        self.discovering = self.rediscover = False
         self.discover()
 
-        self.interface = dbus.Interface(self.proxy, "org.kde.ScreenBrightness")
-        self.interface.connect_to_signal("DisplayAdded", self.on_display_added)
-        self.interface.connect_to_signal("DisplayRemoved", self.on_display_removed)
+    def on_vanished(self):
+        self._service_lost()
+        self.proxy = None
+        self.loading.clear()
+        for name, displ in list(self.displays.items()):
+            self.last_brightness[name] = displ.brightness
+            self.remove_display(name)
 
     def discover(self):
-        all_names = self.proxy.Get("org.kde.ScreenBrightness", "DisplaysDBusNames")
-        for name in all_names:
-            try:
-                displ = ScreenBrightnessDBus(str(name), weakref.proxy(self))
-                if displ.is_internal:
-                    self.internal_display = displ
-                    break
-            except Exception as e:
-                self.logger.warn(e)
+        if self.proxy is None:
+            return
+        if self.discovering:
+            self.rediscover = True
+            return
+
+        self.discovering = True
+        self.proxy.Get(
+            "org.kde.ScreenBrightness",
+            "DisplaysDBusNames",
+            dbus_interface=PROPS_IFACE,
+            reply_handler=partial(self._on_discovered, self.proxy),
+            error_handler=partial(self._on_discover_error, self.proxy),
+        )
+
+    def _on_discovered(self, proxy, all_names):
+        if proxy is not self.proxy:
+            return
+
+        names = [str(name) for name in all_names]
+        for name in list(self.displays):
+            if name not in names:
+                self.remove_display(name)
+        for name in names:
+            self.add_display(name)
+        # still discovering until every display was requested
+        self.discovering = False
+        self._discover_next()
+
+    def _on_discover_error(self, proxy, e: dbus.exceptions.DBusException):
+        if proxy is not self.proxy:
+            return
+        self.discovering = False
+        self.logger.warning(f"Display discovery failed: {e}")
+        self._discover_next()
+
+    def _discover_next(self):
+        if self.rediscover:
+            self.rediscover = False
+            self.discover()
         else:
-            self.internal_display = None
+            self._check_bound()
 
-    @property
-    def internal_display(self):
-        return self._display
+    def _check_bound(self):
+        if self.proxy is not None and not self.discovering and not self.loading:
+            self.last_brightness.clear()
+            self._service_bound()
+
+    def add_display(self, name: str):
+        if name in self.displays or name in self.loading:
+            return
+
+        self.loading.add(name)
+        proxy = self.bus.get_object(
+            POWERDEVIL, f"/org/kde/ScreenBrightness/{name}", introspect=False
+        )
+        proxy.GetAll(
+            DISPLAY_INTERFACE,
+            dbus_interface=PROPS_IFACE,
+            reply_handler=partial(self._on_display_loaded, name),
+            error_handler=partial(self._on_display_error, name),
+        )
+
+    def _on_display_loaded(self, name: str, values: dict):
+        if name not in self.loading:
+            # removed or vanished while its properties were fetched
+            return
+        self.loading.discard(name)
+
+        try:
+            displ = ScreenBrightnessDBus(name, weakref.proxy(self), values)
+        except Exception as e:
+            self.logger.warn(e)
+            self._check_bound()
+            return
+
+        last = self.last_brightness.pop(name, None)
+        if last is not None and last != displ.brightness:
+            self.count_lost()
+        self.displays[name] = displ
+        self._notify(name, displ)
+        self._check_bound()
+
+    def _on_display_error(self, name: str, e: dbus.exceptions.DBusException):
+        if name in self.loading:
+            self.loading.discard(name)
+            self.logger.warning(f"Display {name} unavailable: {e}")
+            self._check_bound()
+
+    def remove_display(self, name: str):
+        self.loading.discard(name)
+        displ = self.displays.pop(name, None)
+        if displ is not None:
+            displ.disconnect()
+            self._notify(name, None)
 
-    @internal_display.setter
-    def internal_display(self, value: ScreenBrightnessDBus | None):
-        self._display = value
+    def _notify(self, name: str, displ: ScreenBrightnessDBus | None):
         try:
-            if callable(self.on_internal_display_change):
-                self.on_internal_display_change(value)
+            if callable(self.on_display_change):
+                self.on_display_change(name, displ)
         except Exception as e:
             self.logger.exception(e)
 
     def on_display_added(self, value, **kw):
-        if not self.internal_display:
-            added_displ = ScreenBrightnessDBus(str(value), weakref.proxy(self))
-            if added_displ.is_internal:
-                self.internal_display = added_displ
+        if self.proxy is not None:
+            self.add_display(str(value))
 
     def on_display_removed(self, value, **kw):
-        name = str(value)
-        if self.internal_display and name == self.internal_display.name:
-            self.internal_display = None
+        self.remove_display(str(value))
@@ -0,0 +1,56 @@
+import dbus
+from autobrightness.services.abstract import DBusService
+
+
+class ScreenSaverDBus(DBusService):
+    """Follows the session lock through org.freedesktop.ScreenSaver"""
+
+    def __init__(self) -> None:
+        super().__init__(dbus.SessionBus)
+        self.active = False
+        self.on_active_change: callable | None = None
+        self.watch = None
+        self.signal_match = None
+
+    def run(self):
+        self.signal_match = self.bus.add_signal_receiver(
+            self.on_active_changed,
+            "ActiveChanged",
+            "org.freedesktop.ScreenSaver",
+            "org.freedesktop.ScreenSaver",
+            "/org/freedesktop/ScreenSaver",
+        )
+        self.watch = self.watch_name(
+            "org.freedesktop.ScreenSaver", self.on_appeared, self.on_vanished
+        )
+
+    def stop(self):
+        if self.watch:
+            self.watch.cancel()
+            self.watch = None
+        if self.signal_match is not None:
+            self.signal_match.remove()
+            self.signal_match = None
+
+    def on_appeared(self):
+        proxy = self.bus.get_object(
+            "org.freedesktop.ScreenSaver",
+            "/org/freedesktop/ScreenSaver",
+            introspect=False,
+        )
+        proxy.GetActive(
+            dbus_interface="org.freedesktop.ScreenSaver",
+            reply_handler=self.on_active_changed,
+            error_handler=self.logger.warning,
+        )
+
+    def on_vanished(self):
+        self.on_active_changed(False)
+
+    def on_active_changed(self, active, *args):
+        active = bool(active)
+        if active != self.active:
+            self.active = active
+            self.logger.debug(f"screensaver active={active}")
+            if callable(self.on_active_change):
+                self.on_active_change(active)
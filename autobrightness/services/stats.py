@@ -0,0 +1,67 @@
+import dbus
+import dbus.service
+
+from autobrightness.services.abstract import DBusService
+from autobrightness.services.common import STATS_NAME, STATS_PATH
+
+
+def to_dbus(value):
+    if isinstance(value, bool):
+        return dbus.Boolean(value)
+    if isinstance(value, int):
+        return dbus.Int64(value)
+    if isinstance(value, float):
+        return dbus.Double(value)
+    if isinstance(value, dict):
+        return dbus.Dictionary(
+            {str(k): to_dbus(v) for k, v in value.items()}, signature="sv"
+        )
+    return dbus.String(str(value))
+
+
+class StatsObject(dbus.service.Object):
+    def __init__(self, bus, get_stats: callable, get_events: callable) -> None:
+        super().__init__(bus, STATS_PATH)
+        self.get_stats = get_stats
+        self.get_events = get_events
+
+    @dbus.service.method(STATS_NAME, out_signature="a{sv}")
+    def GetStats(self):
+        return to_dbus(self.get_stats())
+
+    @dbus.service.method(STATS_NAME, out_signature="aa{sv}")
+    def GetEvents(self):
+        return dbus.Array([to_dbus(e) for e in self.get_events()], signature="a{sv}")
+
+
+class StatsServiceDBus(DBusService):
+    """Exports the daemon's counters on the session bus"""
+
+    def __init__(self, get_stats: callable, get_events: callable = list) -> None:
+        super().__init__(dbus.SessionBus)
+        self.get_stats = get_stats
+        self.get_events = get_events
+        self.name = None
+        self.obj = None
+
+    def run(self):
+        try:
+            self.name = dbus.service.BusName(STATS_NAME, self.bus, do_not_queue=True)
+        except dbus.exceptions.NameExistsException:
+            self.logger.warning(f"{STATS_NAME} is already taken, stats not exported")
+            return
+        self.obj = StatsObject(self.bus, self.get_stats, self.get_events)
+
+    def stop(self):
+        if self.obj:
+            self.obj.remove_from_connection()
+            self.obj = None
+        self.name = None
+
+    def query(self) -> dict:
+        proxy = self.bus.get_object(STATS_NAME, STATS_PATH, introspect=False)
+        return proxy.GetStats(dbus_interface=STATS_NAME)
+
+    def query_events(self) -> list:
+        proxy = self.bus.get_object(STATS_NAME, STATS_PATH, introspect=False)
+        return proxy.GetEvents(dbus_interface=STATS_NAME)
@@ -0,0 +1,9 @@
+import importlib.util
+import sys
+from unittest.mock import Mock
+
+# Mock dbus module before the services are imported, unless dbus-python is
+# installed, so that the fake bus end-to-end tests can share the process
+mock_dbus = Mock()
+if importlib.util.find_spec("dbus") is None:
+    sys.modules["dbus"] = mock_dbus
@@ -0,0 +1,331 @@
+import asyncio
+import os
+import unittest
+
+try:
+    import jeepney
+except ImportError:
+    jeepney = None
+
+from autobrightness.scheduler import AsyncioScheduler
+
+SENSOR_PATH = "/net/hadess/SensorProxy"
+DISPLAY_PATH = "/org/kde/ScreenBrightness/display0"
+
+
+class FakeRouter:
+    """In-process stand-in for a jeepney DBusRouter, answers method calls
+    from `props` and `handlers` and delivers emitted signals to filters"""
+
+    def __init__(self) -> None:
+        from jeepney.io.common import MessageFilters
+
+        self.filters = MessageFilters()
+        self.calls = []
+        self.handlers = {}
+        self.props = {
+            SENSOR_PATH: {"HasAmbientLight": ("b", True), "LightLevel": ("d", 300.0)},
+            "/org/kde/ScreenBrightness": {"DisplaysDBusNames": ("as", ["display0"])},
+            DISPLAY_PATH: {
+                "Brightness": ("i", 500),
+                "MaxBrightness": ("i", 1000),
+                "IsInternal": ("b", True),
+                "Label": ("s", "Built-in"),
+            },
+        }
+
+    def filter(self, rule, *, queue=None, bufsize=1):
+        from jeepney.io.common import FilterHandle
+
+        return FilterHandle(self.filters, rule, queue)
+
+    async def send_and_get_reply(self, msg):
+        from jeepney import HeaderFields, new_error, new_method_return
+
+        fields = msg.header.fields
+        member = fields[HeaderFields.member]
+        self.calls.append((member, msg.body))
+        if member == "GetNameOwner":
+            return new_method_return(msg, "s", (":1.1",))
+        if member == "GetAll":
+            return new_method_return(
+                msg, "a{sv}", (self.props[fields[HeaderFields.path]],)
+            )
+        if member == "GetActive":
+            return new_method_return(msg, "b", (False,))
+        if member == "Notify":
+            return new_method_return(msg, "u", (7,))
+        if member == "Get":
+            value = self.props[fields[HeaderFields.path]][msg.body[1]]
+            return new_method_return(msg, "v", (value,))
+        if member in self.handlers:
+            error = self.handlers[member](*msg.body)
+            if error:
+                return new_error(msg, error)
+        return new_method_return(msg)
+
+    async def send(self, msg):
+        self.calls.append(("send", msg.body))
+
+    def emit(self, path, interface, member, signature, body):
+        from jeepney import DBusAddress, new_signal
+
+        msg = new_signal(
+            DBusAddress(path, interface=interface), member, signature, body
+        )
+        for handle in list(self.filters.matches(msg)):
+            handle.queue.put_nowait(msg)
+
+    def members(self):
+        return [member for member, _ in self.calls]
+
+
+class TestAsyncioScheduler(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.scheduler = AsyncioScheduler(self.loop)
+
+    def test_repeat_and_remove(self):
+        """A callback returning True runs again until its source is removed"""
+        calls = []
+
+        def tick():
+            calls.append(self.scheduler.monotonic())
+            if len(calls) == 3:
+                self.scheduler.source_remove(repeating)
+            return True
+
+        repeating = self.scheduler.timeout_add(0.001, tick)
+        removed = self.scheduler.timeout_add(0.001, calls.append, "removed")
+        self.scheduler.source_remove(removed)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.scheduler.handles, {})
+
+    def test_io_watch(self):
+        """A readable descriptor runs its watch until the watch returns False"""
+        r, w = os.pipe()
+        self.addCleanup(os.close, r)
+        self.addCleanup(os.close, w)
+        reads = []
+
+        def on_readable():
+            reads.append(os.read(r, 1))
+            return len(reads) < 2
+
+        self.scheduler.io_add_watch(r, on_readable)
+        os.write(w, b"abc")
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+
+        self.assertEqual(reads, [b"a", b"b"])
+        self.assertEqual(self.scheduler.readers, {})
+
+
+@unittest.skipIf(jeepney is None, "jeepney not installed")
+class TestAsyncBackend(unittest.TestCase):
+    def setUp(self):
+        from autobrightness.services.autobrightness import AutoBrightnessService
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.loop.close)
+        self.addCleanup(asyncio.set_event_loop, None)
+        self.router = FakeRouter()
+
+        self.service = AutoBrightnessService(
+            AsyncioScheduler(self.loop), backend="asyncio"
+        )
+        self.service.debounce_interval = 0.01
+        self.service.transition_duration = 0.02
+        self.service.fast_transition_duration = 0.02
+        for client in (
+            self.service.screens_dbus,
+            self.service.sensor_proxy_dbus,
+            self.service.notif_dbus,
+            self.service.screensaver_dbus,
+        ):
+            client.router = self.router
+        self.service.notif_dbus.delay = 0.01
+
+    def tearDown(self):
+        from autobrightness.services import aio
+
+        self.service.stop()
+        self.loop.run_until_complete(aio.shutdown())
+
+    def run_for(self, seconds: float):
+        self.loop.run_until_complete(asyncio.sleep(seconds))
+
+    def start(self):
+        self.service.run()
+        self.run_for(0.01)
+
+    def test_startup(self):
+        """Sensor and display attach without blocking calls"""
+        self.start()
+
+        sensor = self.service.sensor_proxy_dbus
+        self.assertTrue(sensor.available)
+        self.assertEqual(sensor.claims, 1)
+        self.assertEqual(self.service.current_light_level, 300)
+        self.assertEqual(self.service.controllers["display0"].display.label, "Built-in")
+        self.assertEqual(self.service.controllers["display0"].max_brightness, 1000)
+        self.assertIn("ClaimLight", self.router.members())
+
+    def test_lux_signal_reaches_display(self):
+        """LightLevel signal results in SetBrightness writes to the bucket target"""
+        written = []
+        self.router.handlers["SetBrightness"] = lambda value, flags: written.append(
+            value
+        )
+        self.start()
+
+        # enough samples to move the median filter
+        for _ in range(3):
+            self.router.emit(
+                SENSOR_PATH,
+                "org.freedesktop.DBus.Properties",
+                "PropertiesChanged",
+                "sa{sv}as",
+                ("net.hadess.SensorProxy", {"LightLevel": ("d", 5000.0)}, []),
+            )
+        self.run_for(0.2)
+
+        self.assertEqual(self.service.lux_signals, 3)
+        self.assertEqual(written[-1], 1000)
+        display = self.service.controllers["display0"].display
+        self.assertEqual(display.writes_issued, len(written))
+
+    def test_unrelated_signals_dropped(self):
+        """Sensor signals without the light level are counted, not acted on"""
+        self.start()
+        for interface, changed in [
+            ("net.hadess.SensorProxy", {"AccelerometerOrientation": ("s", "normal")}),
+            ("net.hadess.SensorProxy.Compass", {"CompassHeading": ("d", 90.0)}),
+            ("net.hadess.SensorProxy", {"LightLevel": ("d", 310.0)}),
+        ]:
+            self.router.emit(
+                SENSOR_PATH,
+                "org.freedesktop.DBus.Properties",
+                "PropertiesChanged",
+                "sa{sv}as",
+                (interface, changed, []),
+            )
+        self.run_for(0.01)
+
+        # the compass signal is not matched by the arg0 rule at all
+        stats = self.service.get_stats()["sensor_signals"]
+        self.assertEqual(stats, {"received": 2, "acted_on": 1})
+        self.assertEqual(self.service.lux_signals, 1)
+
+    def test_manual_change_notifies(self):
+        """External brightness change offsets the curve and shows a notification"""
+        self.start()
+
+        self.router.emit(
+            DISPLAY_PATH,
+            "org.freedesktop.DBus.Properties",
+            "PropertiesChanged",
+            "sa{sv}as",
+            ("org.kde.ScreenBrightness.Display", {"Brightness": ("i", 700)}, []),
+        )
+        self.run_for(0.05)
+
+        self.assertNotEqual(
+            self.service.controllers["display0"].user_brightness_bias, 0
+        )
+        self.assertIn("Notify", self.router.members())
+        self.assertEqual(self.service.notif_dbus.sent, 1)
+
+    def test_property_cache_miss(self):
+        """Missing and invalidated properties are fetched with Get"""
+        self.start()
+        display = self.service.controllers["display0"].display
+        self.router.props[DISPLAY_PATH]["Brightness"] = ("i", 600)
+        self.router.emit(
+            DISPLAY_PATH,
+            "org.freedesktop.DBus.Properties",
+            "PropertiesChanged",
+            "sa{sv}as",
+            ("org.kde.ScreenBrightness.Display", {}, ["Brightness"]),
+        )
+        del display.props.values["Label"]
+
+        # the last known value stands in until the reply arrives
+        self.assertEqual(display.brightness, 500)
+        self.assertIsNone(display.props.get("Label"))
+        self.run_for(0.01)
+
+        self.assertEqual(display.brightness, 600)
+        self.assertEqual(display.props.get("Label"), "Built-in")
+        fetched = [body[1] for member, body in self.router.calls if member == "Get"]
+        self.assertEqual(sorted(fetched), ["Brightness", "DisplaysDBusNames", "Label"])
+
+    def test_sensor_vanished_during_claim(self):
+        """A sensor gone while ClaimLight is in flight is not attached"""
+
+        def vanish():
+            # NameOwnerChanged handled before the ClaimLight reply
+            sensor.owner = ""
+            sensor.on_vanished()
+
+        sensor = self.service.sensor_proxy_dbus
+        self.router.handlers["ClaimLight"] = vanish
+        self.start()
+
+        self.assertFalse(sensor.available)
+        self.assertFalse(sensor.claimed)
+
+    def test_unknown_object_rediscovers(self):
+        """SetBrightness on a removed display drops it after rediscovery"""
+        self.router.handlers["SetBrightness"] = (
+            lambda value, flags: "org.freedesktop.DBus.Error.UnknownObject"
+        )
+        self.start()
+
+        self.router.props["/org/kde/ScreenBrightness"]["DisplaysDBusNames"] = (
+            "as",
+            [],
+        )
+        self.service.controllers["display0"].display.set_brightness(100)
+        self.run_for(0.02)
+
+        self.assertEqual(self.service.controllers, {})
+
+    def test_sensor_restart(self):
+        """A new SensorProxy owner is rebound and claimed, the outage measured"""
+        self.start()
+        self.router.props[SENSOR_PATH]["LightLevel"] = ("d", 800.0)
+        self.router.emit(
+            "/org/freedesktop/DBus",
+            "org.freedesktop.DBus",
+            "NameOwnerChanged",
+            "sss",
+            ("net.hadess.SensorProxy", ":1.1", ":1.7"),
+        )
+        self.run_for(0.02)
+
+        sensor = self.service.sensor_proxy_dbus
+        self.assertTrue(sensor.available)
+        self.assertEqual(sensor.claims, 2)
+        self.assertEqual(self.service.current_light_level, 800)
+        stats = self.service.get_stats()["sensor_recovery"]
+        self.assertEqual((stats["outages"], stats["events_lost"]), (1, 1))
+        self.assertEqual(stats["rebind_ms"]["count"], 1)
+
+    def test_stop_releases_sensor(self):
+        """The sensor claim is released on stop and awaited on shutdown"""
+        from autobrightness.services import aio
+
+        self.start()
+        self.service.stop()
+        self.loop.run_until_complete(aio.shutdown())
+
+        self.assertIn("ReleaseLight", self.router.members())
+        self.assertFalse(self.service.sensor_proxy_dbus.claimed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,10 @@
 import unittest
 from unittest.mock import Mock
-import sys
-
-# Mock dbus module before importing AutoBrightnessService
-mock_dbus = Mock()
-sys.modules["dbus"] = mock_dbus
 
+from . import mock_dbus
 from ..autobrightness import AutoBrightnessService
+from autobrightness.controller import DisplayController
+from autobrightness.scheduler import VirtualScheduler
 
 
 class TestAutoBrightnessService(unittest.TestCase):
@@ -29,37 +27,25 @@ class TestAutoBrightnessService(unittest.TestCase):
         # Make the mock behave like the number 5 in comparisons and arithmetic
         type(self.service).step = property(lambda _: 5)
 
-        # Mock threading events
-        self.service.stop_event = Mock()
-        self.service.stop_event.is_set.return_value = False
-        self.service.light_event = Mock()
-        self.service.light_event.is_set.return_value = False
-        self.service.light_event.wait.return_value = True
-        self.service.anim_abort_event = Mock()
-        self.service.anim_abort_event.is_set.return_value = False
-        self.service.anim_abort_event.wait.return_value = True
-
         # Mock display object and attributes
         self.mock_display = Mock()
-        self.service.display = self.mock_display
         self.mock_display.set_brightness = Mock()
         self.mock_display.max_brightness = 10000
         self.mock_display.brightness = 50
+        self.mock_display.is_internal = True
 
-        # Mock display-related attributes
-        self.service.brightness_threshold_delta = 5
-        self.service.max_brightness = 10000
-        self.service.current_brightness = 50
+        self.controller = DisplayController(self.service, self.mock_display)
+        self.service.controllers["display0"] = self.controller
         self.service.current_light_level = 0
 
         # Setup test parameters
-        self.service.user_brightness_bias = 0
-        self.service.inhibited_by_powerdevil = False
+        self.controller.user_brightness_bias = 0
+        self.controller.inhibited_by_powerdevil = False
 
     def test_recommended_brightness_min_light(self):
         """Test brightness calculation at minimum light level"""
         self.service.current_light_level = 0  # No light
-        result = self.service.get_recommended_brightness()
+        result = self.controller.get_recommended_brightness()
 
         # Should be at minimum brightness (15% of 10000)
         self.assertEqual(result, 1500)
@@ -67,21 +53,472 @@ class TestAutoBrightnessService(unittest.TestCase):
     def test_recommended_brightness_max_light(self):
         """Test brightness calculation at maximum light level"""
         self.service.current_light_level = 2000
-        result = self.service.get_recommended_brightness()
+        result = self.controller.get_recommended_brightness()
 
         # Should be at maximum brightness
-        self.assertEqual(result, self.service.max_brightness)
+        self.assertEqual(result, self.controller.max_brightness)
 
     def test_recommended_brightness_with_bias(self):
         """Test brightness calculation with user bias"""
         self.service.current_light_level = 450
         bias = 1000
 
-        baseline = self.service.get_recommended_brightness(bias=0)
-        result = self.service.get_recommended_brightness(bias=bias)
+        baseline = self.controller.get_recommended_brightness(bias=0)
+        result = self.controller.get_recommended_brightness(bias=bias)
 
         self.assertEqual(result - baseline, bias)
 
 
+class DisplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = VirtualScheduler()
+        self.service = AutoBrightnessService(scheduler=self.scheduler)
+        self.service.notif_dbus = Mock()
+
+        self.service.current_light_level = 400
+        self.display, self.writes = self.attach("display0", is_internal=True)
+        self.controller = self.service.controllers["display0"]
+
+    def attach(self, name, is_internal, echo=True):
+        """Adds a display, echoing writes as PropertiesChanged signals"""
+        display = Mock(max_brightness=10000, brightness=5000, is_internal=is_internal)
+        display.name = name
+        writes = []
+
+        def connect(fn):
+            display.on_change = fn
+
+        def set_brightness(value):
+            writes.append(value)
+            if echo:
+                display.on_change(
+                    "org.kde.ScreenBrightness.Display", {"Brightness": value}
+                )
+
+        display.connect_brightness_changed_signal.side_effect = connect
+        display.set_brightness.side_effect = set_brightness
+        self.service.on_screens_change(name, display)
+        return display, writes
+
+
+class TestBrightnessAnimation(DisplayTestCase):
+    def test_debounced_transition(self):
+        """Bucket change is applied once lux is stable for the debounce interval"""
+        self.service.report_light_level(1000)
+        self.scheduler.advance(1.5)
+        self.service.report_light_level(1100)
+        self.scheduler.advance(1.5)
+        self.assertEqual(self.writes, [])
+
+        self.scheduler.run_until_idle()
+        self.assertEqual(self.writes[-1], 7500)
+        self.assertEqual(len(self.writes), self.service.transition_max_writes)
+        self.assertIsNone(self.controller.anim_bright_target)
+
+    def test_noise_within_bucket_does_nothing(self):
+        """Lux changes inside the current bucket schedule no work"""
+        self.service.report_light_level(1000)
+        self.service.report_light_level(400)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.writes, [])
+        self.assertEqual(self.scheduler.wakeups, 0)
+
+    def test_animation_retargets(self):
+        """New lux during animation retargets without waiting for debounce"""
+        self.service.report_light_level(1000)
+        self.scheduler.advance(2.5)
+        self.assertIsNotNone(self.controller.anim_bright_target)
+        self.service.report_light_level(5)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.writes[-1], 1500)
+        self.assertEqual(self.controller.current_brightness, 1500)
+
+    def test_retarget_after_fade_to_zero(self):
+        """A retarget continues from a last frame of 0 not echoed yet"""
+        self.service.on_screens_change("display0", None)
+        display, writes = self.attach("display0", is_internal=True, echo=False)
+        controller = self.service.controllers["display0"]
+        controller.animate_brightness(0)
+        self.scheduler.advance(1.0)
+        self.assertEqual(writes[-1], 0)
+
+        del writes[:]
+        controller.animate_brightness(3000)
+        self.scheduler.advance(1.0)
+        self.assertEqual(writes, sorted(writes))
+        self.assertEqual(writes[-1], 3000)
+
+    def test_startup_skips_debounce(self):
+        """First brightness is applied once both sensor and display are attached"""
+        self.service.on_screens_change("display0", None)
+
+        sensor = Mock(available=True, light_level=5000)
+        self.service.sensor_proxy_dbus = sensor
+        self.service.on_sensor_change(sensor)
+        self.assertEqual(self.writes, [])
+
+        self.service.on_screens_change("display0", self.display)
+        self.assertEqual(len(self.writes), 1)
+
+        self.scheduler.run_until_idle()
+        self.assertEqual(self.writes[-1], 10000)
+
+    def test_stats(self):
+        """Counters and last transition are reported"""
+        self.service.report_light_level(1000)
+        self.service.report_light_level(1100)
+        self.scheduler.run_until_idle()
+
+        stats = self.service.get_stats()
+        self.assertEqual(stats["debounces"], 1)
+        self.assertEqual(stats["bucket_changes"], 1)
+        self.assertEqual(stats["animations_started"], 1)
+
+        transition = stats["displays"]["display0"]["last_transition"]
+        self.assertEqual(transition["actual_writes"], len(self.writes))
+        self.assertEqual(transition["actual_s"], 1.0)
+
+    def test_event_log(self):
+        """Lux reports, animation start, echoes and the final echo are logged"""
+        self.service.report_light_level(1000)
+        self.scheduler.run_until_idle()
+
+        reasons = [e["reason"] for e in self.service.get_events()]
+        self.assertEqual(reasons[:2], ["lux", "anim_start"])
+        self.assertEqual(reasons[-1], "anim_end")
+        self.assertEqual(reasons.count("echo"), len(self.writes) - 1)
+
+    def test_late_echo_not_a_user_change(self):
+        """An echo arriving after the light changed does not offset the curve"""
+        self.service.on_screens_change("display0", None)
+        display, writes = self.attach("display0", is_internal=True, echo=False)
+        controller = self.service.controllers["display0"]
+        display.on_change("org.kde.ScreenBrightness.Display", {"Brightness": 6000})
+        self.service.notif_dbus.notify.reset_mock()
+
+        controller.clear_bias()
+        self.service.report_light_level(1000)
+        display.on_change(
+            "org.kde.ScreenBrightness.Display", {"Brightness": writes[-1]}
+        )
+
+        self.assertEqual(controller.user_brightness_bias, 0)
+        self.service.notif_dbus.notify.assert_not_called()
+        # clearing the bias is a single write, not part of an animation
+        self.assertEqual((controller.echoes, controller.late_echoes), (1, 0))
+
+    def test_late_frame_echo(self):
+        """A frame echoed after the animation stopped is a late echo"""
+        self.service.on_screens_change("display0", None)
+        display, writes = self.attach("display0", is_internal=True, echo=False)
+        controller = self.service.controllers["display0"]
+        self.service.report_light_level(1000)
+        self.scheduler.advance(2.5)
+
+        display.on_change("org.kde.ScreenBrightness.Display", {"Brightness": 9000})
+        display.on_change(
+            "org.kde.ScreenBrightness.Display", {"Brightness": writes[-1]}
+        )
+        self.assertEqual((controller.echoes, controller.late_echoes), (1, 1))
+
+    def test_user_change_during_animation(self):
+        """A change that is not an echo stops the animation and sets the bias"""
+        self.service.report_light_level(1000)
+        self.scheduler.advance(2.5)
+        self.assertIsNotNone(self.controller.anim_bright_target)
+        written = len(self.writes)
+
+        self.display.on_change("org.kde.ScreenBrightness.Display", {"Brightness": 9000})
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(len(self.writes), written)
+        self.assertEqual(self.controller.user_brightness_bias, 9000 - 7500)
+        self.service.notif_dbus.notify.assert_called_once()
+        stats = self.service.get_stats()["displays"]["display0"]
+        self.assertEqual(stats["echoes"], written)
+        self.assertEqual(stats["changes_during_animation"], 1)
+
+    def test_final_echo_missing(self):
+        """An animation whose last frame is never echoed ends on the timeout"""
+        self.service.on_screens_change("display0", None)
+        display, writes = self.attach("display0", is_internal=True, echo=False)
+        controller = self.service.controllers["display0"]
+        self.service.report_light_level(1000)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(writes[-1], 7500)
+        self.assertIsNone(controller.anim_bright_target)
+        self.assertIsNone(controller.settle_from)
+
+    def test_idle_has_no_wakeups(self):
+        """Nothing is scheduled while light level is stable"""
+        self.service.report_light_level(400)
+        self.scheduler.advance(3600)
+
+        self.assertEqual(self.scheduler.wakeups, 0)
+
+
+class TestMultipleDisplays(DisplayTestCase):
+    def setUp(self):
+        super().setUp()
+        # external monitor never echoes, like a DDC write still in flight
+        self.external, self.external_writes = self.attach(
+            "display1", is_internal=False, echo=False
+        )
+
+    def test_displays_animate_concurrently(self):
+        """A display without echoes does not hold back the internal panel"""
+        self.service.report_light_level(1000)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.writes[-1], 7500)
+        self.assertEqual(self.external_writes[-1], 7500)
+        self.assertIsNone(self.controller.anim_bright_target)
+
+    def test_external_write_rate_cap(self):
+        """External displays are written at most max_write_rate times a second"""
+        self.service.report_light_level(1000)
+        self.scheduler.run_until_idle()
+
+        external = self.service.controllers["display1"]
+        cap = self.service.transition_duration * external.max_write_rate + 1
+        self.assertLessEqual(len(self.external_writes), cap)
+        self.assertEqual(len(self.writes), self.service.transition_max_writes)
+
+    def test_display_offset_and_bias(self):
+        """Offset from config and user bias apply to one display only"""
+        self.service.configure({"displays": {"display1": {"offset": -10}}})
+        self.display.on_change("org.kde.ScreenBrightness.Display", {"Brightness": 6000})
+        self.service.report_light_level(1000)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.writes[-1], 7500 + 1000)
+        self.assertEqual(self.external_writes[-1], 7500 - 1000)
+        self.service.notif_dbus.notify.assert_called_once()
+
+    def test_invalid_config_not_applied(self):
+        """A config with an invalid section leaves every section unchanged"""
+        filters = self.service.lux_filter
+        cfg = {
+            "transition": {"duration": 3},
+            "fast_path": {"enabled": False},
+            "filters": [{"type": "ema", "tau": 2}],
+            "displays": {"display1": {"offset": -10}},
+            "curve": {"points": [[0, 10]]},
+        }
+        with self.assertRaises(ValueError):
+            self.service.configure(cfg)
+
+        self.assertEqual(self.service.transition_duration, 1.0)
+        self.assertIsNotNone(self.service.jump_detector)
+        self.assertIs(self.service.lux_filter, filters)
+        self.assertEqual(self.service.display_configs, {})
+        self.assertEqual(self.service.controllers["display1"].offset, 0)
+
+    def test_reload_keeps_filters(self):
+        """Reloading unchanged filters keeps their history and counters"""
+        cfg = {"filters": [{"type": "median", "window": 3}]}
+        self.service.configure(cfg)
+        filters = self.service.lux_filter
+        for value in (100, 100, 5000):
+            filters.push(value)
+        self.scheduler.run_until_idle()
+        passed, suppressed = filters.passed, filters.suppressed
+        samples = list(filters.stages[0].samples)
+
+        self.service.configure({"filters": [{"type": "median", "window": 3}]})
+        self.assertIs(self.service.lux_filter, filters)
+        self.assertEqual(filters.stages[0].samples, samples)
+
+        self.service.configure({"filters": [{"type": "ema", "tau": 2}]})
+        self.assertIsNot(self.service.lux_filter, filters)
+        stats = self.service.get_stats()
+        self.assertEqual(stats["lux_filter_passed"], passed)
+        self.assertEqual(stats["lux_filter_suppressed"], suppressed)
+        self.assertEqual(self.service.lux_filter.last, self.service.current_light_level)
+
+    def test_display_removed(self):
+        """A removed display is no longer written"""
+        self.service.on_screens_change("display1", None)
+        self.service.report_light_level(1000)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.external_writes, [])
+        self.assertEqual(list(self.service.controllers), ["display0"])
+
+    def test_bias_kept_across_restart(self):
+        """Displays coming back after PowerDevil restarted keep their bias"""
+        self.display.on_change("org.kde.ScreenBrightness.Display", {"Brightness": 6000})
+        bias = self.controller.user_brightness_bias
+        self.assertNotEqual(bias, 0)
+
+        for name in ["display0", "display1"]:
+            self.service.on_screens_change(name, None)
+        self.assertEqual(self.service.get_state()["displays"]["display0"]["bias"], bias)
+
+        self.display, self.writes = self.attach("display0", is_internal=True)
+        controller = self.service.controllers["display0"]
+        self.assertEqual(controller.user_brightness_bias, bias)
+        self.assertNotIn("display0", self.service.detached)
+
+
+class TestPowerSave(DisplayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sensor = Mock(available=True, light_level=400)
+        self.service.sensor_proxy_dbus = self.sensor
+
+    def dim(self, value):
+        self.display.on_change(
+            "org.kde.ScreenBrightness.Display", {"Brightness": value}
+        )
+
+    def test_release_while_locked(self):
+        """Sensor is released on lock and claimed again on unlock"""
+        self.service.screensaver_dbus.active = True
+        self.service.on_screensaver_change(True)
+        self.sensor.release.assert_called_once()
+
+        self.service.screensaver_dbus.active = False
+        self.service.on_screensaver_change(False)
+        self.sensor.claim.assert_called_once()
+
+    def test_release_while_dimmed(self):
+        """PowerDevil dimming releases the sensor, undimming claims it"""
+        self.dim(1500)
+        self.assertTrue(self.controller.inhibited_by_powerdevil)
+        self.sensor.release.assert_called_once()
+
+        self.dim(5000)
+        self.assertFalse(self.controller.inhibited_by_powerdevil)
+        self.sensor.claim.assert_called_once()
+
+    def test_release_without_internal_display(self):
+        """Sensor is not needed while the internal display is gone"""
+        self.service.on_screens_change("display0", None)
+        self.sensor.release.assert_called_once()
+
+        self.service.on_screens_change("display0", self.display)
+        self.sensor.claim.assert_called_once()
+
+    def test_first_reading_after_wake_skips_debounce(self):
+        """Light level read after re-claim is applied immediately"""
+        self.service.screensaver_dbus.active = True
+        self.service.on_screensaver_change(True)
+        self.service.screensaver_dbus.active = False
+        self.service.on_screensaver_change(False)
+
+        self.service.handle_sensor_props_change(
+            "net.hadess.SensorProxy", {"LightLevel": 5000}, []
+        )
+        self.assertEqual(len(self.writes), 1)
+        self.scheduler.run_until_idle()
+        self.assertEqual(self.writes[-1], 10000)
+
+    def test_power_save_disabled(self):
+        """With power_save off the claim is kept"""
+        self.service.configure({"power_save": False})
+        self.service.on_screens_change("display0", None)
+
+        self.sensor.release.assert_not_called()
+
+    def test_power_save_reloaded_while_locked(self):
+        """Switching power_save on reload applies to the current lock state"""
+        self.service.screensaver_dbus.active = True
+        self.service.on_screensaver_change(True)
+        self.sensor.release.assert_called_once()
+
+        self.service.configure({"power_save": False})
+        self.sensor.claim.assert_called_once()
+        self.service.configure({"power_save": True})
+        self.assertEqual(self.sensor.release.call_count, 2)
+
+
+class TestFastPath(DisplayTestCase):
+    def setUp(self):
+        super().setUp()
+        # as after the sensor attached
+        self.service.lux_filter.reset(self.service.current_light_level)
+
+    def lux(self, value: int):
+        self.service.handle_sensor_props_change(
+            "net.hadess.SensorProxy", {"LightLevel": value}, []
+        )
+
+    def test_large_jump_skips_debounce(self):
+        """A confirmed jump is applied at once with a short transition"""
+        self.lux(20000)
+        self.assertEqual(self.writes, [])
+        self.scheduler.advance(0.3)
+        self.lux(20000)
+        self.assertEqual(len(self.writes), 1)
+
+        self.scheduler.run_until_idle()
+        self.assertEqual(self.writes[-1], 10000)
+        self.assertLessEqual(len(self.writes), self.service.fast_transition_max_writes)
+
+        stats = self.service.get_stats()
+        self.assertEqual(stats["fast_paths"], 1)
+        # 0.3 s to confirm and 0.25 s of transition
+        self.assertEqual(stats["settle_ms"]["fast"]["<=1000"], 1)
+        self.assertEqual(stats["settle_ms"]["normal"]["count"], 0)
+
+    def test_single_jump_signal(self):
+        """A jump the sensor reports once is confirmed after the window"""
+        self.lux(20000)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.writes[-1], 10000)
+        self.assertLessEqual(len(self.writes), self.service.fast_transition_max_writes)
+        stats = self.service.get_stats()
+        self.assertEqual(stats["fast_paths"], 1)
+        # 1 s window and 0.25 s of transition
+        self.assertEqual(stats["settle_ms"]["fast"]["<=2000"], 1)
+        self.assertEqual(stats["settle_ms"]["normal"]["count"], 0)
+
+    def test_small_change_takes_normal_path(self):
+        """Changes below a decade are debounced, their settle time is reported"""
+        for _ in range(3):
+            self.lux(1000)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.writes[-1], 7500)
+        self.assertEqual(len(self.writes), self.service.transition_max_writes)
+        stats = self.service.get_stats()
+        self.assertEqual(stats["fast_paths"], 0)
+        self.assertEqual(stats["settle_ms"]["normal"]["<=3000"], 1)
+
+    def test_jump_while_dimmed(self):
+        """A jump is not written while dimmed and leaves no settle pending"""
+        self.controller.inhibited_by_powerdevil = True
+        self.lux(20000)
+        self.scheduler.advance(0.3)
+        self.lux(20000)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.writes, [])
+        self.assertIsNone(self.controller.settle_from)
+
+    def test_configuration(self):
+        """Thresholds and the fast transition come from the fast_path section"""
+        self.service.configure({"fast_path": {"enabled": False}})
+        self.assertIsNone(self.service.jump_detector)
+
+        fast = {"ratio": 0.3, "samples": 1, "duration": 0.5, "max_writes": 3}
+        self.service.configure({"fast_path": fast})
+        self.lux(1000)
+        self.assertEqual(self.service.fast_paths, 1)
+        self.assertEqual(self.service.jump_detector.samples, 1)
+        self.scheduler.run_until_idle()
+        self.assertLessEqual(len(self.writes), 3)
+
+        for invalid in ({"ratio": "x"}, {"samples": "2.5"}, {"window": 0}):
+            with self.assertRaises(ValueError):
+                self.service.configure({"fast_path": invalid})
+        self.assertEqual(self.service.jump_detector.ratio, 0.3)
+
+
 if __name__ == "__main__":
     unittest.main()
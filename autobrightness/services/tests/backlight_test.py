@@ -0,0 +1,156 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from ..autobrightness import AutoBrightnessService
+from ..backlight import BacklightDisplay, BacklightScreens, select_devices
+from autobrightness.scheduler import VirtualScheduler
+
+
+def make_device(root: str, name: str, max_brightness=1000, brightness=500, kind="raw"):
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    for attr, value in [
+        ("max_brightness", max_brightness),
+        ("brightness", brightness),
+        ("type", kind),
+    ]:
+        with open(os.path.join(path, attr), "w") as f:
+            f.write(f"{value}\n")
+    return path
+
+
+def write_attr(root: str, name: str, value: int):
+    with open(os.path.join(root, name, "brightness"), "w") as f:
+        f.write(f"{value}\n")
+
+
+class FakeLogind:
+    """Stand-in for the logind session, writes the attribute as logind does
+    before replying, or fails with `error`"""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.calls = []
+        self.error = None
+
+    def set_brightness(self, subsystem, name, value, reply_handler, error_handler):
+        self.calls.append((subsystem, name, value))
+        if self.error:
+            error_handler(Exception(self.error))
+            return
+        write_attr(self.root, name, value)
+        reply_handler()
+
+
+class BacklightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="backlight-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.scheduler = VirtualScheduler()
+        self.logind = FakeLogind(self.root)
+        self.screens = BacklightScreens(self.scheduler, self.logind, self.root)
+        self.changes = []
+        self.screens.on_display_change = lambda name, displ: self.changes.append(
+            (name, displ)
+        )
+        self.addCleanup(self.screens.stop)
+
+
+class TestBacklightScreens(BacklightTestCase):
+    def test_select_devices(self):
+        """Firmware control wins over raw for the panel, DDC/CI monitors stay"""
+        make_device(self.root, "intel_backlight", kind="raw")
+        make_device(self.root, "acpi_video0", max_brightness=100, kind="firmware")
+        make_device(self.root, "ddcci3", max_brightness=100)
+
+        self.assertEqual(select_devices(self.root), ["acpi_video0", "ddcci3"])
+
+        self.screens.run()
+        self.assertEqual(list(self.screens.displays), ["acpi_video0", "ddcci3"])
+        self.assertTrue(self.screens.displays["acpi_video0"].is_internal)
+        self.assertFalse(self.screens.displays["ddcci3"].is_internal)
+
+    def test_write_goes_through_logind(self):
+        """Writes call Session.SetBrightness and the change comes back as echo"""
+        make_device(self.root, "intel_backlight")
+        self.screens.run()
+        display = self.screens.displays["intel_backlight"]
+        fn = Mock()
+        display.connect_brightness_changed_signal(fn)
+
+        display.set_brightness(300)
+        self.assertEqual(self.logind.calls, [("backlight", "intel_backlight", 300)])
+        self.assertFalse(display.write_in_flight)
+
+        self.scheduler.poll_io()
+        fn.assert_called_once_with("backlight", {"Brightness": 300}, [])
+        self.assertEqual(display.brightness, 300)
+
+    def test_external_change(self):
+        """Changes by others are reported once, rewriting the value is not"""
+        make_device(self.root, "intel_backlight")
+        self.screens.run()
+        display = self.screens.displays["intel_backlight"]
+        fn = Mock()
+        display.connect_brightness_changed_signal(fn)
+
+        write_attr(self.root, "intel_backlight", 700)
+        self.scheduler.poll_io()
+        write_attr(self.root, "intel_backlight", 700)
+        self.scheduler.poll_io()
+
+        fn.assert_called_once_with("backlight", {"Brightness": 700}, [])
+
+    def test_failed_write_continues(self):
+        """A rejected write is counted and the pending value still issued"""
+        make_device(self.root, "intel_backlight")
+        self.screens.run()
+        display = self.screens.displays["intel_backlight"]
+        self.logind.error = "Access denied"
+
+        display.set_brightness(300)
+        self.assertEqual(display.writes_failed, 1)
+        self.assertFalse(display.write_in_flight)
+        self.assertIn("intel_backlight", self.screens.displays)
+
+    def test_removed_device(self):
+        """A device disappearing from the tree is reported as removed"""
+        make_device(self.root, "ddcci3", max_brightness=100)
+        self.screens.run()
+
+        shutil.rmtree(os.path.join(self.root, "ddcci3"))
+        self.scheduler.poll_io()
+
+        self.assertEqual(self.screens.displays, {})
+        self.assertEqual(self.changes[-1], ("ddcci3", None))
+
+
+class TestBacklightService(BacklightTestCase):
+    def test_transition_settles_on_echoes(self):
+        """The service animates a sysfs display and ends on the inotify echo"""
+        make_device(self.root, "intel_backlight", brightness=200)
+
+        service = AutoBrightnessService(self.scheduler)
+        service.screens_dbus = self.screens
+        service.sensor_proxy_dbus = Mock(available=True, light_level=5000)
+        service.screensaver_dbus = Mock(active=False)
+        self.screens.on_display_change = service.on_screens_change
+        self.screens.run()
+
+        controller = service.controllers["intel_backlight"]
+        self.assertIsInstance(controller.display, BacklightDisplay)
+        for _ in range(100):
+            self.scheduler.advance(0.05)
+            self.scheduler.poll_io()
+
+        self.assertIsNone(controller.anim_bright_target)
+        self.assertEqual(controller.current_brightness, 1000)
+        self.assertEqual(controller.user_brightness_bias, 0)
+        self.assertEqual(self.logind.calls[-1], ("backlight", "intel_backlight", 1000))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from autobrightness.curve import BrightnessCurve
+
+
+def write_trace(lines: list) -> str:
+    fd, path = tempfile.mkstemp(suffix=".trace")
+    with os.fdopen(fd, "w") as f:
+        for t, kind, *values in lines:
+            f.write("\t".join([f"{t:.3f}", kind, *map(str, values)]) + "\n")
+    return path
+
+
+def two_rooms(periods: int = 20) -> list:
+    """Alternates between a dim room kept at 20% and a bright one at 90%"""
+    lines = [(0, "start"), (0, "display", 1000, 500)]
+    t = 0.0
+    for i in range(periods):
+        lux, brightness = (10, 200) if i % 2 == 0 else (5000, 900)
+        for k in range(30):
+            t += 10
+            lines.append((t, "lux", lux + k % 2))
+            if k == 0:
+                # corrected right after the light changed
+                lines.append((t + 1, "brightness", brightness))
+                lines.append((t + 1, "bias", brightness - 500))
+    return lines
+
+
+@unittest.skipIf(numpy is None, "numpy not installed")
+class TestCalibrate(unittest.TestCase):
+    def setUp(self):
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            os.unlink(path)
+
+    def trace(self, lines: list) -> str:
+        self.paths.append(write_trace(lines))
+        return self.paths[-1]
+
+    def test_fit_follows_corrections(self):
+        """Bucket brightness follows what users set in each light level"""
+        from autobrightness.calibrate import calibrate
+
+        curve, summary = calibrate([self.trace(two_rooms())], buckets=2)
+
+        self.assertEqual(len(curve.buckets), 2)
+        self.assertAlmostEqual(curve.buckets[0][2], 20, delta=3)
+        self.assertAlmostEqual(curve.buckets[1][2], 90, delta=3)
+        self.assertLess(curve.buckets[0][0], 10)
+        self.assertGreater(curve.buckets[1][1], 5000)
+        self.assertEqual(summary["corrections"], 20)
+        self.assertLess(
+            summary["correction_error_fitted"], summary["correction_error_current"]
+        )
+
+    def test_chunk_size_does_not_change_result(self):
+        """Streaming in small chunks gives the same curve as one large chunk"""
+        from autobrightness.calibrate import calibrate
+
+        path = self.trace(two_rooms())
+        small, _ = calibrate([path], buckets=2, chunk_size=7)
+        large, _ = calibrate([path], buckets=2, chunk_size=65536)
+        self.assertEqual(small.buckets, large.buckets)
+
+    def test_dimmed_intervals_ignored(self):
+        """Time spent dimmed by PowerDevil does not pull brightness down"""
+        from autobrightness.calibrate import calibrate
+
+        lines = [(0, "start"), (0, "display", 1000, 800)]
+        for k in range(1, 50):
+            lines.append((k * 10, "lux", 300))
+        lines.append((500, "brightness", 240))  # dimmed to 30%
+        lines.append((500, "bias", -560))
+        for k in range(51, 500):
+            lines.append((k * 10, "lux", 300))
+
+        curve, summary = calibrate([self.trace(lines)], buckets=1)
+        self.assertAlmostEqual(curve.buckets[0][2], 80, delta=0.1)
+        self.assertEqual(summary["corrections"], 0)
+
+    def test_output_is_loadable_json(self):
+        """Curve output has no infinite bounds and loads back into the daemon"""
+        from autobrightness.calibrate import curve_config
+
+        curve = BrightnessCurve.from_points([[0, 10], [1000, 100]], steps=3)
+        text = json.dumps(curve_config(curve), allow_nan=False)
+
+        loaded = BrightnessCurve.from_config(json.loads(text)["curve"])
+        self.assertEqual(len(loaded.buckets), 3)
+        self.assertEqual(loaded.buckets[0][2], curve.buckets[0][2])
+
+    def test_empty_trace(self):
+        """Traces without a display attached cannot be calibrated"""
+        from autobrightness.calibrate import calibrate
+
+        path = self.trace([(0, "start"), (1, "lux", 100)])
+        with self.assertRaises(ValueError):
+            calibrate([path])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import random
+import unittest
+
+from autobrightness.curve import BrightnessCurve, DEFAULT_BUCKETS
+
+
+def linear_index(buckets, lux, idx):
+    # Reference implementation: walk buckets one by one
+    while idx < len(buckets) - 1 and lux >= buckets[idx][1]:
+        idx += 1
+    while idx > 0 and lux < buckets[idx][0]:
+        idx -= 1
+    return idx
+
+
+class TestBrightnessCurve(unittest.TestCase):
+    def test_index_matches_linear_walk(self):
+        """Bisect lookup agrees with walking the bucket list"""
+        curve = BrightnessCurve(DEFAULT_BUCKETS)
+        lut = curve.compile(10000)
+        rnd = random.Random(1)
+
+        idx = curve.initial_index()
+        for _ in range(5000):
+            lux = rnd.choice([rnd.uniform(0, 100), rnd.uniform(0, 20000)])
+            expected = linear_index(curve.buckets, lux, idx)
+            idx = lut.index(lux, idx)
+            self.assertEqual(idx, expected)
+
+    def test_compiled_values(self):
+        """Brightness values are precomputed for max_brightness"""
+        lut = BrightnessCurve(DEFAULT_BUCKETS).compile(400)
+        self.assertEqual(lut.values, [60, 120, 200, 300, 400])
+
+    def test_points_curve(self):
+        """Piecewise log-lux curve is quantized into overlapping buckets"""
+        curve = BrightnessCurve.from_config(
+            {"points": [[0, 10], [100, 50], [10000, 100]], "steps": 8}
+        )
+        lut = curve.compile(100)
+
+        self.assertEqual(len(curve.buckets), 8)
+        self.assertEqual(lut.values, sorted(lut.values))
+        self.assertEqual(lut.index(0, 4), 0)
+        self.assertEqual(lut.index(1e6, 0), 7)
+
+    def test_hysteresis(self):
+        """Lux inside the overlap keeps the current bucket"""
+        lut = BrightnessCurve(DEFAULT_BUCKETS).compile(100)
+        self.assertEqual(lut.index(30, 0), 0)
+        self.assertEqual(lut.index(30, 1), 1)
+
+    def test_invalid_buckets(self):
+        with self.assertRaises(ValueError):
+            BrightnessCurve([(0, 50, 15), (60, 200, 30)])
+        with self.assertRaises(ValueError):
+            BrightnessCurve([(100, 50, 15)])
+        with self.assertRaises(ValueError):
+            BrightnessCurve.from_config({"levels": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from . import fakebus
+
+skip_reason = fakebus.available()
+
+bus = None
+
+
+def setUpModule():
+    global bus
+    if skip_reason:
+        return
+
+    from dbus.mainloop.glib import DBusGMainLoop
+
+    DBusGMainLoop(set_as_default=True)
+    bus = fakebus.FakeBus(max_brightness=1000, brightness=500)
+    bus.start()
+
+
+def tearDownModule():
+    if bus is not None:
+        bus.stop()
+
+
+@unittest.skipIf(skip_reason, skip_reason)
+class TestFakeBusEndToEnd(unittest.TestCase):
+    def setUp(self):
+        from autobrightness.services.autobrightness import AutoBrightnessService
+
+        bus.sensor.SetLightLevel(300.0)
+        bus.display.SetBrightnessExternal(500)
+        bus.display.ResetWrites()
+
+        self.service = AutoBrightnessService()
+        self.service.debounce_interval = 0.05
+        self.service.transition_duration = 0.05
+        self.service.run()
+        fakebus.run_until(lambda: fakebus.DISPLAY_NAME in self.service.controllers)
+        self.controller = self.service.controllers[fakebus.DISPLAY_NAME]
+
+    def tearDown(self):
+        self.service.stop()
+
+    def test_sensor_claimed(self):
+        """ClaimLight is called and the initial light level is read"""
+        self.assertGreaterEqual(int(bus.sensor.GetClaims()), 1)
+        self.assertEqual(self.service.current_light_level, 300)
+
+    def test_lux_signal_reaches_display(self):
+        """LightLevel signal results in SetBrightness writes to the bucket target"""
+        bus.sensor.SetLightLevel(5000.0)
+        fakebus.run_until(lambda: self.controller.current_brightness == 1000)
+
+        writes = bus.display.GetWrites()
+        self.assertEqual(int(writes[-1][1]), 1000)
+
+    def test_manual_change_notifies(self):
+        """External brightness change offsets the curve and shows a notification"""
+        bus.display.SetBrightnessExternal(700)
+        fakebus.run_until(lambda: self.controller.user_brightness_bias == 200)
+        fakebus.run_until(lambda: len(bus.notifications.GetNotifications()) > 0, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
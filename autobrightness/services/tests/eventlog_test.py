@@ -0,0 +1,72 @@
+import unittest
+
+from autobrightness.eventlog import ANIM_START, LUX, EventLog, format_events
+
+
+class TestEventLog(unittest.TestCase):
+    def record(self, log, t, lux):
+        log.record(t, LUX, 0, lux, 2, 500, 400, 0)
+
+    def test_wraps_around(self):
+        """Only the last `size` events are kept, oldest first"""
+        log = EventLog(size=4)
+        log.display_id("display0")
+        for i in range(10):
+            self.record(log, float(i), i * 100)
+
+        events = log.events(now=10.0)
+        self.assertEqual([e["lux"] for e in events], [600, 700, 800, 900])
+        self.assertEqual(events[0]["age_s"], 4.0)
+        self.assertEqual(log.recorded, 10)
+
+    def test_partial(self):
+        """A log which did not wrap yet returns only recorded events"""
+        log = EventLog(size=4)
+        log.display_id("display0")
+        log.record(1.0, ANIM_START, 0, 300, 2, 500, 400, 10)
+
+        (event,) = log.events(now=1.5)
+        self.assertEqual(event["reason"], "anim_start")
+        self.assertEqual(event["display"], "display0")
+        self.assertIn("display0 anim_start: lux=300", format_events([event]))
+
+    def test_preallocated(self):
+        """Columns have a fixed size and are not grown by recording"""
+        log = EventLog(size=8)
+        log.display_id("display0")
+        for i in range(100):
+            self.record(log, float(i), i)
+
+        self.assertEqual(len(log.lux), 8)
+        self.assertEqual(len(log.times), 8)
+
+    def test_display_ids_reused(self):
+        """Ids of removed displays are reused once their events are gone"""
+        log = EventLog(size=4)
+        self.assertEqual(log.display_id("display0"), 0)
+        log.record(1.0, LUX, log.display_id("display1"), 300, 2, 500, 400, 0)
+        log.release_id("display1")
+
+        # still named in the log, a new display gets another id
+        self.assertEqual(log.display_id("display2"), 2)
+        log.release_id("display2")
+        self.assertEqual(log.display_id("display3"), 2)
+        self.assertEqual(log.events(now=2.0)[0]["display"], "display1")
+
+        # a display coming back keeps its id
+        self.assertEqual(log.display_id("display1"), 1)
+
+    def test_hotplug_does_not_grow_ids(self):
+        """Displays attached and removed over and over use a bounded range"""
+        log = EventLog(size=8)
+        for i in range(1000):
+            display = log.display_id(f"display{i}")
+            log.record(float(i), LUX, display, i, 2, 500, 400, 0)
+            log.release_id(f"display{i}")
+
+        self.assertLessEqual(len(log.names), 9)
+        self.assertEqual(log.events(now=1000.0)[-1]["display"], "display999")
+
+
+if __name__ == "__main__":
+    unittest.main()
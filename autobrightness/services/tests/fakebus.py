@@ -0,0 +1,407 @@
+"""Private D-Bus daemon with stand-in SensorProxy, PowerDevil, Notifications
+and optionally a logind session writing into a fake sysfs backlight tree.
+
+`FakeBus` starts a `dbus-daemon` and points both DBUS_SESSION_BUS_ADDRESS and
+DBUS_SYSTEM_BUS_ADDRESS at it, then runs this module as a separate process
+that publishes the fake services. The real clients in `autobrightness.services`
+connect to it unchanged. Each fake object additionally implements the
+`org.autobrightness.Test` interface, used by tests and benchmarks to drive the
+fakes and to read back what they received, with CLOCK_MONOTONIC timestamps
+comparable across processes.
+
+Requires dbus-python, PyGObject and the dbus-daemon binary.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROPS_IFACE = "org.freedesktop.DBus.Properties"
+TEST_IFACE = "org.autobrightness.Test"
+
+SENSOR_NAME = "net.hadess.SensorProxy"
+SENSOR_PATH = "/net/hadess/SensorProxy"
+POWERDEVIL_NAME = "org.kde.Solid.PowerManagement"
+SCREENS_PATH = "/org/kde/ScreenBrightness"
+DISPLAY_NAME = "display0"
+NOTIFICATIONS_NAME = "org.freedesktop.Notifications"
+NOTIFICATIONS_PATH = "/org/freedesktop/Notifications"
+LOGIND_NAME = "org.freedesktop.login1"
+LOGIND_SESSION_PATH = "/org/freedesktop/login1/session/auto"
+
+BUS_CONFIG = """<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:dir={dir}</listen>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+"""
+
+
+def available():
+    """Returns a reason string when the harness cannot run, None otherwise"""
+    from unittest.mock import Mock
+
+    if shutil.which("dbus-daemon") is None:
+        return "dbus-daemon not found"
+    if isinstance(sys.modules.get("dbus"), Mock):
+        return "dbus module is mocked in this process"
+    try:
+        import dbus.mainloop.glib  # noqa: F401
+        from gi.repository import GLib  # noqa: F401
+    except ImportError as e:
+        return str(e)
+    return None
+
+
+def run_until(predicate: callable, timeout: float = 5.0):
+    """Iterates the default GLib main context until predicate() is true"""
+    from gi.repository import GLib
+
+    ctx = GLib.MainContext.default()
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met in time")
+        if not ctx.iteration(False):
+            time.sleep(0.0005)
+
+
+class FakeBus:
+    def __init__(
+        self, max_brightness: int = 1000, brightness: int = 500, backlight: str = ""
+    ) -> None:
+        self.max_brightness = max_brightness
+        self.brightness = brightness
+        # root of a fake /sys/class/backlight the logind session writes to
+        self.backlight = backlight
+        self.tmpdir = None
+        self.daemon = None
+        self.services = None
+        self.address = None
+        self.saved_env = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        self.tmpdir = tempfile.mkdtemp(prefix="autobrightness-bus-")
+        config = os.path.join(self.tmpdir, "bus.conf")
+        with open(config, "w") as f:
+            f.write(BUS_CONFIG.format(dir=self.tmpdir))
+
+        self.daemon = subprocess.Popen(
+            ["dbus-daemon", f"--config-file={config}", "--nofork", "--print-address"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        self.address = self.daemon.stdout.readline().strip()
+
+        for key in ("DBUS_SESSION_BUS_ADDRESS", "DBUS_SYSTEM_BUS_ADDRESS"):
+            self.saved_env[key] = os.environ.get(key)
+            os.environ[key] = self.address
+
+        root = os.path.dirname(
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        )
+        env = dict(os.environ, PYTHONPATH=root)
+        self.services = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "autobrightness.services.tests.fakebus",
+                str(self.max_brightness),
+                str(self.brightness),
+                self.backlight,
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            env=env,
+        )
+        if self.services.stdout.readline().strip() != "ready":
+            self.stop()
+            raise RuntimeError("fake services failed to start")
+
+    def stop(self):
+        for proc in (self.services, self.daemon):
+            if proc is not None and proc.poll() is None:
+                proc.terminate()
+                proc.wait(5)
+        self.services = self.daemon = None
+
+        for key, value in self.saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        self.saved_env = {}
+
+        if self.tmpdir:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+            self.tmpdir = None
+
+    def control(self, name: str, path: str):
+        import dbus
+
+        proxy = dbus.SessionBus().get_object(name, path)
+        return dbus.Interface(proxy, TEST_IFACE)
+
+    @property
+    def sensor(self):
+        return self.control(SENSOR_NAME, SENSOR_PATH)
+
+    @property
+    def display(self):
+        return self.control(POWERDEVIL_NAME, f"{SCREENS_PATH}/{DISPLAY_NAME}")
+
+    @property
+    def notifications(self):
+        return self.control(NOTIFICATIONS_NAME, NOTIFICATIONS_PATH)
+
+    @property
+    def logind(self):
+        import dbus
+
+        proxy = dbus.SystemBus().get_object(LOGIND_NAME, LOGIND_SESSION_PATH)
+        return dbus.Interface(proxy, TEST_IFACE)
+
+
+def serve(max_brightness: int, brightness: int, backlight: str = ""):
+    import dbus
+    import dbus.service
+    from dbus.mainloop.glib import DBusGMainLoop
+    from gi.repository import GLib
+
+    class FakeObject(dbus.service.Object):
+        def __init__(self, bus, path: str, props: dict) -> None:
+            super().__init__(bus, path)
+            self.props = props
+
+        @dbus.service.method(PROPS_IFACE, in_signature="ss", out_signature="v")
+        def Get(self, iface, name):
+            return self.props[iface][name]
+
+        @dbus.service.method(PROPS_IFACE, in_signature="s", out_signature="a{sv}")
+        def GetAll(self, iface):
+            return dbus.Dictionary(self.props.get(iface, {}), signature="sv")
+
+        @dbus.service.signal(PROPS_IFACE, signature="sa{sv}as")
+        def PropertiesChanged(self, iface, changed, invalidated):
+            pass
+
+        def update(self, iface: str, **changed):
+            self.props[iface].update(changed)
+            self.PropertiesChanged(
+                iface,
+                dbus.Dictionary(changed, signature="sv"),
+                dbus.Array([], signature="s"),
+            )
+
+    class FakeSensorProxy(FakeObject):
+        def __init__(self, bus) -> None:
+            super().__init__(
+                bus,
+                SENSOR_PATH,
+                {
+                    SENSOR_NAME: {
+                        "HasAmbientLight": dbus.Boolean(True),
+                        "LightLevel": dbus.Double(0.0),
+                        "LightLevelUnit": dbus.String("lux"),
+                        "HasAccelerometer": dbus.Boolean(True),
+                        "AccelerometerOrientation": dbus.String("normal"),
+                    }
+                },
+            )
+            self.claims = 0
+
+        @dbus.service.method(SENSOR_NAME)
+        def ClaimLight(self):
+            self.claims += 1
+
+        @dbus.service.method(SENSOR_NAME)
+        def ReleaseLight(self):
+            self.claims -= 1
+
+        @dbus.service.method(TEST_IFACE, out_signature="i")
+        def GetClaims(self):
+            return self.claims
+
+        @dbus.service.method(TEST_IFACE, in_signature="d", out_signature="d")
+        def SetLightLevel(self, value):
+            self.update(SENSOR_NAME, LightLevel=dbus.Double(value))
+            return time.monotonic()
+
+        @dbus.service.method(TEST_IFACE, in_signature="s")
+        def SetOrientation(self, value):
+            self.update(SENSOR_NAME, AccelerometerOrientation=dbus.String(value))
+
+        @dbus.service.method(TEST_IFACE, in_signature="uud", out_signature="d")
+        def Burst(self, count, rate, base):
+            """Emits `count` LightLevel changes at `rate` signals per second"""
+            batch = max(1, rate // 100)
+            state = {"sent": 0}
+
+            def emit():
+                n = min(batch, count - state["sent"])
+                for i in range(n):
+                    value = base + (state["sent"] + i) % 2
+                    self.update(SENSOR_NAME, LightLevel=dbus.Double(value))
+                state["sent"] += n
+                return state["sent"] < count
+
+            GLib.timeout_add(10, emit)
+            return time.monotonic()
+
+    class FakeDisplay(FakeObject):
+        def __init__(self, bus) -> None:
+            super().__init__(
+                bus,
+                f"{SCREENS_PATH}/{DISPLAY_NAME}",
+                {
+                    "org.kde.ScreenBrightness.Display": {
+                        "Brightness": dbus.Int32(brightness),
+                        "MaxBrightness": dbus.Int32(max_brightness),
+                        "IsInternal": dbus.Boolean(True),
+                        "Label": dbus.String("Built-in Screen"),
+                    }
+                },
+            )
+            self.writes = []
+
+        @dbus.service.method(
+            "org.kde.ScreenBrightness.Display", in_signature="iu", out_signature=""
+        )
+        def SetBrightness(self, value, flags):
+            self.writes.append((time.monotonic(), int(value)))
+            iface = "org.kde.ScreenBrightness.Display"
+            if self.props[iface]["Brightness"] != value:
+                self.update(iface, Brightness=dbus.Int32(value))
+
+        @dbus.service.method(TEST_IFACE, out_signature="a(di)")
+        def GetWrites(self):
+            return dbus.Array(self.writes, signature="(di)")
+
+        @dbus.service.method(TEST_IFACE)
+        def ResetWrites(self):
+            self.writes = []
+
+        @dbus.service.method(TEST_IFACE, in_signature="i")
+        def SetBrightnessExternal(self, value):
+            self.update(
+                "org.kde.ScreenBrightness.Display", Brightness=dbus.Int32(value)
+            )
+
+    class FakeScreens(FakeObject):
+        def __init__(self, bus) -> None:
+            super().__init__(
+                bus,
+                SCREENS_PATH,
+                {
+                    "org.kde.ScreenBrightness": {
+                        "DisplaysDBusNames": dbus.Array([DISPLAY_NAME], signature="s"),
+                    }
+                },
+            )
+
+        @dbus.service.signal("org.kde.ScreenBrightness", signature="s")
+        def DisplayAdded(self, name):
+            pass
+
+        @dbus.service.signal("org.kde.ScreenBrightness", signature="s")
+        def DisplayRemoved(self, name):
+            pass
+
+    class FakeNotifications(dbus.service.Object):
+        def __init__(self, bus) -> None:
+            super().__init__(bus, NOTIFICATIONS_PATH)
+            self.sent = []
+            self.next_id = 1
+
+        @dbus.service.method(
+            NOTIFICATIONS_NAME, in_signature="susssasa{sv}i", out_signature="u"
+        )
+        def Notify(
+            self, app, replaces_id, icon, summary, body, actions, hints, timeout
+        ):
+            self.sent.append((str(summary), str(body)))
+            if replaces_id:
+                return replaces_id
+            self.next_id += 1
+            return self.next_id - 1
+
+        @dbus.service.method(NOTIFICATIONS_NAME, in_signature="u")
+        def CloseNotification(self, notif_id):
+            self.NotificationClosed(notif_id, 3)
+
+        @dbus.service.signal(NOTIFICATIONS_NAME, signature="uu")
+        def NotificationClosed(self, notif_id, reason):
+            pass
+
+        @dbus.service.signal(NOTIFICATIONS_NAME, signature="us")
+        def ActionInvoked(self, notif_id, action):
+            pass
+
+        @dbus.service.method(TEST_IFACE, out_signature="a(ss)")
+        def GetNotifications(self):
+            return dbus.Array(self.sent, signature="(ss)")
+
+        @dbus.service.method(TEST_IFACE, in_signature="us")
+        def InvokeAction(self, notif_id, action):
+            self.ActionInvoked(notif_id, action)
+
+    class FakeLogindSession(dbus.service.Object):
+        def __init__(self, bus) -> None:
+            super().__init__(bus, LOGIND_SESSION_PATH)
+            self.writes = []
+
+        @dbus.service.method(
+            "org.freedesktop.login1.Session", in_signature="ssu", out_signature=""
+        )
+        def SetBrightness(self, subsystem, name, value):
+            # logind replies once the attribute is written
+            with open(os.path.join(backlight, str(name), "brightness"), "w") as f:
+                f.write(f"{int(value)}\n")
+            self.writes.append((time.monotonic(), int(value)))
+
+        @dbus.service.method(TEST_IFACE, out_signature="a(di)")
+        def GetWrites(self):
+            return dbus.Array(self.writes, signature="(di)")
+
+    DBusGMainLoop(set_as_default=True)
+    system_bus = dbus.SystemBus()
+    session_bus = dbus.SessionBus()
+
+    objects = [
+        FakeSensorProxy(system_bus),
+        FakeScreens(session_bus),
+        FakeDisplay(session_bus),
+        FakeNotifications(session_bus),
+    ]
+    names = [
+        dbus.service.BusName(SENSOR_NAME, system_bus),
+        dbus.service.BusName(POWERDEVIL_NAME, session_bus),
+        dbus.service.BusName(NOTIFICATIONS_NAME, session_bus),
+    ]
+    if backlight:
+        objects.append(FakeLogindSession(system_bus))
+        names.append(dbus.service.BusName(LOGIND_NAME, system_bus))
+
+    print("ready", flush=True)
+    GLib.MainLoop().run()
+    return objects, names
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]), int(sys.argv[2]), sys.argv[3])
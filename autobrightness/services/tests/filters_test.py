@@ -0,0 +1,132 @@
+import unittest
+
+from autobrightness.filters import (
+    EMAFilter,
+    FilterPipeline,
+    JumpDetector,
+    LogDeadbandFilter,
+    MedianFilter,
+    create_filters,
+)
+from autobrightness.scheduler import VirtualScheduler
+
+
+class TestFilterPipeline(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = VirtualScheduler()
+        self.emitted = []
+
+    def pipeline(self, stages):
+        p = FilterPipeline(stages, self.scheduler, self.emitted.append)
+        p.reset(100)
+        return p
+
+    def test_median_drops_spike(self):
+        """Single sample spike never reaches bucket selection"""
+        p = self.pipeline([MedianFilter(window=3)])
+        p.push(5000)
+        self.scheduler.advance(0.2)
+        p.push(100)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.emitted, [])
+        self.assertEqual(p.suppressed, 2)
+
+    def test_median_step_settles(self):
+        """A step change followed by silence passes after the settle time"""
+        p = self.pipeline([MedianFilter(window=3, interval=0.5)])
+        p.push(5000)
+        self.assertEqual(self.emitted, [])
+
+        self.scheduler.run_until_idle()
+        self.assertEqual(self.emitted, [5000])
+
+    def test_ema_converges_without_signals(self):
+        """EMA output reaches the last raw value even if the sensor goes quiet"""
+        p = self.pipeline([EMAFilter(tau=1.0)])
+        self.scheduler.advance(0.1)
+        p.push(1000)
+        self.assertLess(self.emitted[-1], 300)
+
+        self.scheduler.run_until_idle()
+        self.assertEqual(self.emitted[-1], 1000)
+
+    def test_deadband(self):
+        """Small relative changes are suppressed"""
+        p = self.pipeline([LogDeadbandFilter(ratio=0.05)])
+        p.push(105)
+        p.push(200)
+
+        self.assertEqual(self.emitted, [200])
+        self.assertEqual(p.suppressed, 1)
+
+    def test_create_filters(self):
+        stages = create_filters([{"type": "ema", "tau": 2}])
+        self.assertIsInstance(stages[0], EMAFilter)
+        self.assertEqual(stages[0].tau, 2)
+        self.assertEqual(len(create_filters(None)), 2)
+        self.assertEqual(create_filters([]), [])
+
+        with self.assertRaises(ValueError):
+            create_filters([{"type": "kalman"}])
+
+
+class TestJumpDetector(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = VirtualScheduler(start=10.0)
+        self.jumps = []
+        self.jump = JumpDetector(
+            self.scheduler,
+            lambda *jump: self.jumps.append(jump),
+            ratio=1.0,
+            samples=2,
+            window=1.0,
+        )
+
+    def test_confirmed_by_second_sample(self):
+        """A jump of a decade is reported from its first reading on"""
+        self.assertFalse(self.jump.process(5000, 100))
+        self.scheduler.advance(0.4)
+        self.assertTrue(self.jump.process(6000, 100))
+        self.assertEqual(self.jumps, [(6000, 10.0)])
+
+        # confirmed once, the next jump needs new samples
+        self.scheduler.advance(0.2)
+        self.assertFalse(self.jump.process(6000, 100))
+
+    def test_confirmed_by_window(self):
+        """A single reading still past the ratio after the window is a jump"""
+        self.jump.process(5000, 100)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.jumps, [(5000, 10.0)])
+        self.assertEqual(self.scheduler.monotonic(), 11.0)
+
+    def test_spike_and_small_change_ignored(self):
+        """A reading back to normal or a change below the ratio keeps the
+        normal path"""
+        self.jump.process(5000, 100)
+        self.scheduler.advance(0.2)
+        self.jump.process(100, 100)
+        self.scheduler.advance(0.2)
+        self.jump.process(500, 100)
+        self.scheduler.run_until_idle()
+
+        self.assertEqual(self.jumps, [])
+        self.assertEqual(self.scheduler.wakeups, 0)
+
+    def test_direction(self):
+        """Readings in opposite directions do not confirm each other"""
+        self.jump.process(5000, 100)
+        self.scheduler.advance(0.5)
+        self.jump.process(0, 100)
+        self.scheduler.advance(0.2)
+        self.jump.process(1, 100)
+        self.assertEqual(self.jumps, [(1, 10.5)])
+
+        with self.assertRaises(ValueError):
+            JumpDetector(self.scheduler, print, samples=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from ..iio import POLL_MAX_INTERVAL, IIOLightSensor, ScanType, find_sensor
+from autobrightness.scheduler import VirtualScheduler
+
+
+def write(path: str, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(f"{value}\n")
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read().strip()
+
+
+class IIOTestCase(unittest.TestCase):
+    """Fake /sys/bus/iio/devices with an HID ALS and a FIFO as its devnode"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="iio-")
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.root = os.path.join(self.tmp, "devices")
+        self.dev = os.path.join(self.tmp, "dev")
+        self.device = os.path.join(self.root, "iio:device0")
+        os.makedirs(self.dev)
+
+        attrs = {
+            "name": "als",
+            "in_illuminance_raw": 100,
+            "in_illuminance_scale": 0.5,
+            "in_illuminance_offset": 10,
+            "buffer/enable": 0,
+            "trigger/current_trigger": "",
+            "scan_elements/in_illuminance_en": 0,
+            "scan_elements/in_illuminance_type": "le:u32/32>>0",
+            "scan_elements/in_timestamp_en": 1,
+            "scan_elements/in_timestamp_type": "le:s64/64>>0",
+        }
+        for name, value in attrs.items():
+            write(os.path.join(self.device, name), value)
+        write(os.path.join(self.root, "trigger0", "name"), "als-dev0")
+        os.mkfifo(os.path.join(self.dev, "iio:device0"))
+
+        self.scheduler = VirtualScheduler()
+        self.sensor = IIOLightSensor(self.scheduler, self.root, self.dev)
+        self.changes = Mock()
+        self.sensor.connect_props_changed_signal(self.changes)
+        self.addCleanup(self.sensor.stop)
+
+    def push(self, *raw):
+        fd = os.open(os.path.join(self.dev, "iio:device0"), os.O_WRONLY)
+        self.addCleanup(os.close, fd)
+        os.write(fd, b"".join(struct.pack("<I", v) for v in raw))
+
+    def set_raw(self, value: int):
+        write(os.path.join(self.device, "in_illuminance_raw"), value)
+
+    def lux_reported(self) -> list:
+        return [c.args[1]["LightLevel"] for c in self.changes.call_args_list]
+
+
+class TestIIOLightSensor(IIOTestCase):
+    def test_scale_and_offset(self):
+        """The raw reading is converted with (raw + offset) * scale"""
+        on_sensor_change = Mock()
+        self.sensor.on_sensor_change = on_sensor_change
+        self.sensor.run()
+
+        on_sensor_change.assert_called_once_with(self.sensor)
+        self.assertEqual(self.sensor.light_level, 55)
+        self.assertTrue(self.sensor.claimed)
+
+    def test_buffered_capture(self):
+        """Buffer is set up with the driver's trigger and samples are decoded"""
+        self.sensor.run()
+
+        self.assertEqual(self.sensor.mode, "buffer")
+        self.assertEqual(read(f"{self.device}/trigger/current_trigger"), "als-dev0")
+        self.assertEqual(read(f"{self.device}/scan_elements/in_illuminance_en"), "1")
+        self.assertEqual(read(f"{self.device}/scan_elements/in_timestamp_en"), "0")
+        self.assertEqual(read(f"{self.device}/buffer/enable"), "1")
+
+        self.push(1990, 1990, 3990)
+        self.scheduler.poll_io()
+
+        self.changes.assert_called_once_with(
+            "net.hadess.SensorProxy", {"LightLevel": 2000.0}, []
+        )
+        self.assertEqual(self.sensor.samples, 3)
+
+    def test_release_disables_buffer(self):
+        """Capture stops while released and resumes on claim"""
+        self.sensor.run()
+        self.sensor.release()
+
+        self.assertEqual(read(f"{self.device}/buffer/enable"), "0")
+        self.assertIsNone(self.sensor.fd)
+        self.assertEqual(self.sensor.releases, 1)
+
+        self.sensor.claim()
+        self.assertEqual(self.sensor.mode, "buffer")
+        self.assertEqual(self.sensor.claims, 2)
+
+    def test_polling_fallback(self):
+        """Without scan elements the raw value is polled, backing off while stable"""
+        shutil.rmtree(os.path.join(self.device, "scan_elements"))
+        self.sensor.run()
+        self.assertEqual(self.sensor.mode, "poll")
+
+        self.scheduler.advance(10)
+        self.assertEqual(self.sensor.poll_interval, POLL_MAX_INTERVAL)
+        self.changes.assert_not_called()
+
+        self.set_raw(990)
+        self.scheduler.advance(POLL_MAX_INTERVAL)
+        self.assertEqual(self.lux_reported(), [500.0])
+        # polled quickly again after the change, backing off from there
+        self.assertLess(self.sensor.poll_interval, POLL_MAX_INTERVAL)
+
+        self.sensor.release()
+        self.set_raw(1990)
+        self.scheduler.advance(10)
+        self.assertEqual(self.lux_reported(), [500.0])
+
+    def test_processed_channel_polled(self):
+        """A channel already in lux is polled and not scaled"""
+        os.unlink(os.path.join(self.device, "in_illuminance_raw"))
+        write(os.path.join(self.device, "in_illuminance_input"), 321.5)
+        self.sensor.run()
+
+        self.assertEqual(self.sensor.channel, "in_illuminance_input")
+        self.assertEqual(self.sensor.mode, "poll")
+        self.assertEqual(self.sensor.light_level, 321)
+
+    def test_missing_sensor(self):
+        """No light sensor in the tree, the service is never told one appeared"""
+        shutil.rmtree(self.device)
+        self.assertIsNone(find_sensor(self.root))
+
+        self.sensor.on_sensor_change = Mock()
+        self.sensor.run()
+        self.assertFalse(self.sensor.available)
+        self.sensor.on_sensor_change.assert_not_called()
+
+
+class TestScanType(unittest.TestCase):
+    def test_decode(self):
+        """Endianness, sign and shift of the kernel scan type are honoured"""
+        self.assertEqual(ScanType("le:u16/16>>0").decode(b"\x34\x12"), 0x1234)
+        # 12 significant bits stored in the top of a big endian 16 bit word
+        self.assertEqual(ScanType("be:s12/16>>4").decode(b"\xff\xf0"), -1)
+        self.assertEqual(ScanType("le:u24/32X2>>0").size, 4)
+        with self.assertRaises(ValueError):
+            ScanType("garbage")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+
+from ..illuminance import SensorProxyDBus
+
+
+class TestSensorClaim(unittest.TestCase):
+    def setUp(self):
+        self.clock = Mock(return_value=100.0)
+        patcher = patch("time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.sensor = SensorProxyDBus()
+        self.sensor.iface = Mock()
+        self.sensor.claimed = True
+        self.sensor.state_since = 100.0
+
+    def test_release_and_claim(self):
+        """Claim changes are sent once and do not block"""
+        self.sensor.release()
+        self.sensor.release()
+        self.sensor.iface.ReleaseLight.assert_called_once()
+        self.assertIn("reply_handler", self.sensor.iface.ReleaseLight.call_args.kwargs)
+
+        self.sensor.claim()
+        self.sensor.claim()
+        self.sensor.iface.ClaimLight.assert_called_once()
+        self.assertEqual((self.sensor.claims, self.sensor.releases), (1, 1))
+
+    def test_claim_times(self):
+        """Time is accounted to the claimed and released states"""
+        self.clock.return_value = 110.0
+        self.sensor.release()
+        self.clock.return_value = 140.0
+
+        self.assertEqual(self.sensor.claim_times(), (10.0, 30.0))
+
+    def test_release_before_appeared(self):
+        """A release before the sensor appears is applied on appearance"""
+        self.sensor.iface = None
+        self.sensor.claimed = False
+        self.sensor.release()
+
+        self.assertFalse(self.sensor.want_claim)
+        self.assertEqual(self.sensor.releases, 0)
+
+
+class TestSensorSignals(unittest.TestCase):
+    def setUp(self):
+        self.sensor = SensorProxyDBus()
+        self.sensor.bus = Mock()
+        self.fn = Mock()
+        self.sensor.connect_props_changed_signal(self.fn)
+        self.receiver = self.sensor.bus.add_signal_receiver.call_args.args[0]
+
+    def test_match_rule_narrowed(self):
+        """Only PropertiesChanged of the sensor interface is subscribed to"""
+        kw = self.sensor.bus.add_signal_receiver.call_args.kwargs
+        self.assertEqual(kw["arg0"], "net.hadess.SensorProxy")
+
+    def test_unrelated_properties_dropped(self):
+        """Accelerometer updates are counted and dropped, light is passed on"""
+        for _ in range(3):
+            self.receiver(
+                "net.hadess.SensorProxy", {"AccelerometerOrientation": "normal"}, []
+            )
+        self.receiver(
+            "net.hadess.SensorProxy",
+            {"LightLevel": 120, "AccelerometerOrientation": "left-up"},
+            [],
+            sender=":1.4",
+        )
+
+        self.fn.assert_called_once_with(
+            "net.hadess.SensorProxy", {"LightLevel": 120}, [], sender=":1.4"
+        )
+        self.assertEqual(self.sensor.signals.as_dict(), {"received": 4, "acted_on": 1})
+
+
+class TestSensorRecovery(unittest.TestCase):
+    def setUp(self):
+        self.sensor = SensorProxyDBus()
+        self.sensor.bus = Mock()
+        self.sensor.on_sensor_change = Mock()
+        self.props = Mock()
+        self.iface = Mock()
+        self.interfaces = patch.object(
+            sys.modules[SensorProxyDBus.__module__].dbus,
+            "Interface",
+            side_effect=[self.props, self.iface] * 2,
+        )
+        self.interfaces.start()
+        self.addCleanup(self.interfaces.stop)
+
+    def appear(self, level: int):
+        self.sensor.on_appeared()
+        self.props.GetAll.call_args.kwargs["reply_handler"](
+            {"HasAmbientLight": True, "LightLevel": level}
+        )
+
+    def test_rebind_without_blocking(self):
+        """Properties are fetched asynchronously and the sensor claimed again"""
+        self.appear(40)
+        self.assertTrue(self.sensor.available)
+        self.assertEqual(self.sensor.light_level, 40)
+        self.iface.ClaimLight.assert_called_once()
+        self.assertIn("reply_handler", self.props.GetAll.call_args.kwargs)
+        self.sensor.on_sensor_change.assert_called_once_with(self.sensor)
+
+        self.sensor.on_vanished()
+        self.assertFalse(self.sensor.available)
+        self.sensor.on_sensor_change.assert_called_with(None)
+
+        self.appear(900)
+        self.assertEqual(self.iface.ClaimLight.call_count, 2)
+        stats = self.sensor.recovery_stats()
+        self.assertEqual((stats["outages"], stats["events_lost"]), (1, 1))
+        self.assertEqual(stats["recovery_ms"]["count"], 1)
+
+    def test_startup_is_not_an_outage(self):
+        """A proxy absent at startup is only waited for"""
+        self.sensor.on_vanished()
+        self.appear(40)
+        self.assertEqual(self.sensor.recovery_stats()["outages"], 0)
+
+    def test_owner_replaced(self):
+        """A new owner without a gap is a vanish followed by an appearance"""
+        self.sensor.run()
+        owner_changed = self.sensor.bus.watch_name_owner.call_args.args[1]
+        owner_changed(":1.5")
+        self.props.GetAll.call_args.kwargs["reply_handler"](
+            {"HasAmbientLight": True, "LightLevel": 40}
+        )
+        owner_changed(":1.5")
+        self.assertEqual(self.props.GetAll.call_count, 1)
+
+        owner_changed(":1.9")
+        self.assertEqual(self.sensor.outages, 1)
+        self.assertEqual(self.props.GetAll.call_count, 2)
+
+    def test_stale_reply_ignored(self):
+        """GetAll answered after the proxy vanished does not bind"""
+        self.sensor.on_appeared()
+        reply = self.props.GetAll.call_args.kwargs["reply_handler"]
+        self.sensor.on_vanished()
+
+        reply({"HasAmbientLight": True, "LightLevel": 40})
+        self.assertFalse(self.sensor.available)
+        self.sensor.on_sensor_change.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from autobrightness.metrics import Histogram
+
+
+class TestHistogram(unittest.TestCase):
+    def test_observe(self):
+        h = Histogram(bounds=(1, 10, 100))
+        for v in (0.5, 1, 5, 50, 500, 5000):
+            h.observe(v)
+
+        d = h.as_dict()
+        self.assertEqual(d["<=1"], 2)
+        self.assertEqual(d["<=10"], 1)
+        self.assertEqual(d["<=100"], 1)
+        self.assertEqual(d[">100"], 2)
+        self.assertEqual(d["count"], 6)
+        self.assertEqual(d["sum"], 5556.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import Mock
+
+from ..notifications import NotificationsDBus
+from autobrightness.scheduler import VirtualScheduler
+
+
+class TestNotifications(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = VirtualScheduler()
+        self.notif = NotificationsDBus(self.scheduler)
+        self.iface = Mock()
+        self.notif.interface = self.iface
+
+    def reply(self, notif_id=7):
+        self.iface.Notify.call_args.kwargs["reply_handler"](notif_id)
+
+    def bodies(self):
+        return [c.args[4] for c in self.iface.Notify.call_args_list]
+
+    def test_burst_is_coalesced(self):
+        """Updates within the delay result in a single Notify with the last body"""
+        for i in range(50):
+            self.notif.notify("Brightness set manually", f"{i}%")
+            self.scheduler.advance(0.05)
+        self.scheduler.run_until_idle()
+        self.reply()
+
+        self.assertEqual(self.bodies(), ["49%"])
+        self.assertEqual(self.notif.coalesced, 49)
+        self.assertEqual(self.notif.sent, 1)
+        self.assertEqual(self.notif.notif_id, 7)
+
+    def test_single_call_in_flight(self):
+        """An update ready while Notify is in flight is sent after the reply"""
+        self.notif.notify("title", "a")
+        self.scheduler.run_until_idle()
+        self.notif.notify("title", "b")
+        self.scheduler.run_until_idle()
+        self.assertEqual(self.bodies(), ["a"])
+
+        self.reply()
+        self.assertEqual(self.bodies(), ["a", "b"])
+        self.assertEqual(self.iface.Notify.call_args.args[1], 7)
+
+    def test_error_continues(self):
+        """A failed Notify is not counted as delivered"""
+        self.notif.notify("title", "a")
+        self.scheduler.run_until_idle()
+        with self.assertLogs(level="WARNING"):
+            self.iface.Notify.call_args.kwargs["error_handler"](Exception("failed"))
+
+        self.assertFalse(self.notif.in_flight)
+        self.assertEqual(self.notif.sent, 0)
+
+    def test_stop_cancels_pending(self):
+        """Nothing is sent after stop"""
+        self.notif.notify("title", "a")
+        self.notif.stop()
+        self.scheduler.run_until_idle()
+
+        self.iface.Notify.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import pstats
+import tempfile
+import tracemalloc
+import unittest
+
+from autobrightness.profiling import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.profiler = Profiler(os.path.join(self.tmp.name, "autobrightness"))
+
+    def files(self, suffix):
+        names = os.listdir(self.profiler.directory)
+        return [
+            os.path.join(self.profiler.directory, n)
+            for n in names
+            if n.endswith(suffix)
+        ]
+
+    def test_toggle_profile(self):
+        """First toggle starts a session, the second one writes a .pstats file"""
+        self.assertTrue(self.profiler.toggle_profile())
+        sum(range(1000))
+        self.assertTrue(self.profiler.toggle_profile())
+
+        (path,) = self.files(".pstats")
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+        self.assertIsNone(self.profiler.profile)
+
+    def test_stop_without_session(self):
+        """Stopping while no session runs writes nothing"""
+        self.assertIsNone(self.profiler.stop_profile())
+
+    def test_toggle_memory(self):
+        """Stacks are dumped each time, tracing runs between two toggles"""
+        self.profiler.toggle_memory()
+        self.assertTrue(tracemalloc.is_tracing())
+        self.profiler.toggle_memory()
+        self.assertFalse(tracemalloc.is_tracing())
+
+        self.assertEqual(len(self.files(".txt")), 2)
+        (path,) = self.files(".tracemalloc")
+        self.assertIsInstance(tracemalloc.Snapshot.load(path), tracemalloc.Snapshot)
+
+
+if __name__ == "__main__":
+    unittest.main()
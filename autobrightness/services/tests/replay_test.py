@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+
+from ..autobrightness import AutoBrightnessService
+from autobrightness.replay import replay
+from autobrightness.scheduler import VirtualScheduler
+from autobrightness.trace import TraceRecorder, read_trace
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".trace")
+        os.close(fd)
+
+        self.now = 100.0
+        recorder = TraceRecorder(self.path, clock=lambda: self.now)
+        recorder.record("display", 10000, 5000)
+        # lux flickers around a bucket boundary, then settles in bright light
+        for lux in [400, 700, 300, 800, 300, 900, 2500]:
+            self.now += 1.0
+            recorder.record("lux", lux)
+        self.now += 10.0
+        recorder.record("brightness", 9000)
+        recorder.close()
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def replay(self, debounce):
+        service = AutoBrightnessService(scheduler=VirtualScheduler(), backend="replay")
+        service.debounce_interval = debounce
+        return replay(self.path, service)
+
+    def test_read_trace_rebases_sessions(self):
+        """Appended sessions are laid out one after another"""
+        recorder = TraceRecorder(self.path, clock=lambda: 5.0)
+        recorder.record("lux", 1)
+        recorder.close()
+
+        times = [t for t, kind, values in read_trace(self.path)]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(times[-1], 17.0)
+
+    def test_replay_counts(self):
+        """Replay reports writes, debounces and bucket changes"""
+        stats = self.replay(debounce=2.0)
+
+        self.assertEqual(stats["lux_events"], 7)
+        self.assertEqual(stats["external_changes"], 1)
+        self.assertEqual(stats["animations"], 1)
+        self.assertGreater(stats["debounces"], 0)
+        self.assertGreater(stats["brightness_writes"], 0)
+        self.assertEqual(stats["notifications"], 1)
+
+    def test_replay_shorter_debounce(self):
+        """Short debounce lets flicker through as extra transitions"""
+        slow = self.replay(debounce=2.0)
+        fast = self.replay(debounce=0.5)
+
+        self.assertGreater(fast["animations"], slow["animations"])
+        self.assertGreater(fast["brightness_writes"], slow["brightness_writes"])
+
+
+class TestVirtualScheduler(unittest.TestCase):
+    def test_repeat_and_remove(self):
+        """Removed sources leave the queue at once, also from their callback"""
+        scheduler = VirtualScheduler()
+        calls = []
+
+        def tick():
+            calls.append(scheduler.monotonic())
+            if len(calls) == 3:
+                scheduler.source_remove(repeating)
+            return True
+
+        repeating = scheduler.timeout_add(1.0, tick)
+        for _ in range(1000):
+            scheduler.source_remove(scheduler.timeout_add(5.0, calls.append, 0))
+        self.assertEqual(len(scheduler.queue), 1)
+
+        scheduler.run_until_idle()
+        self.assertEqual(calls, [1.0, 2.0, 3.0])
+        self.assertEqual(scheduler.queue, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
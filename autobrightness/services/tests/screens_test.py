@@ -0,0 +1,252 @@
+import unittest
+from unittest.mock import Mock, patch
+import sys
+
+from ..screens import ScreenBrightnessDBus, ScreensDbus
+
+screens = sys.modules[ScreenBrightnessDBus.__module__]
+
+
+class ScreenBrightnessTestCase(unittest.TestCase):
+    def setUp(self):
+        self.mngr = Mock()
+        self.props = Mock()
+        self.props.GetAll.return_value = {
+            "Brightness": 500,
+            "MaxBrightness": 1000,
+            "IsInternal": True,
+            "Label": "Built-in Screen",
+        }
+
+        with patch.object(ScreenBrightnessDBus, "bus", Mock()), patch.object(
+            screens.dbus, "Interface", return_value=self.props
+        ):
+            self.display = ScreenBrightnessDBus("display0", self.mngr)
+
+        self.iface = Mock()
+        self.display.brightnessIface = self.iface
+
+
+class TestScreenBrightnessWrites(ScreenBrightnessTestCase):
+    def reply(self, n=-1):
+        kw = self.iface.SetBrightness.call_args_list[n].kwargs
+        kw["reply_handler"]()
+
+    def written(self):
+        return [c.args[0] for c in self.iface.SetBrightness.call_args_list]
+
+    def test_single_write_in_flight(self):
+        """Frames issued while a write is in flight are merged into the newest"""
+        self.display.set_brightness(10)
+        self.display.set_brightness(20)
+        self.display.set_brightness(30)
+        self.assertEqual(self.written(), [10])
+
+        self.reply()
+        self.assertEqual(self.written(), [10, 30])
+
+        self.reply()
+        self.assertFalse(self.display.write_in_flight)
+        self.assertEqual(self.display.writes_issued, 2)
+        self.assertEqual(self.display.writes_merged, 1)
+
+    def test_write_error_continues_with_pending(self):
+        """A failed write is counted and the pending frame is still issued"""
+        self.display.set_brightness(10)
+        self.display.set_brightness(20)
+
+        err = Mock()
+        err.get_dbus_name.return_value = "org.freedesktop.DBus.Error.Failed"
+        with self.assertLogs(level="WARNING"):
+            self.iface.SetBrightness.call_args.kwargs["error_handler"](err)
+
+        self.assertEqual(self.written(), [10, 20])
+        self.assertEqual(self.display.writes_failed, 1)
+
+    def test_unknown_object_rediscovers(self):
+        """UnknownObject drops pending frames and triggers rediscovery"""
+        self.display.set_brightness(10)
+        self.display.set_brightness(20)
+
+        err = Mock()
+        err.get_dbus_name.return_value = "org.freedesktop.DBus.Error.UnknownObject"
+        self.iface.SetBrightness.call_args.kwargs["error_handler"](err)
+
+        self.assertEqual(self.written(), [10])
+        self.assertFalse(self.display.write_in_flight)
+        self.mngr.discover.assert_called_once()
+
+
+class TestScreenBrightnessProperties(ScreenBrightnessTestCase):
+    def test_single_get_all(self):
+        """Construction fetches all properties with one GetAll"""
+        self.props.GetAll.assert_called_once()
+        self.props.Get.assert_not_called()
+        self.assertEqual(self.display.max_brightness, 1000)
+        self.assertTrue(self.display.is_internal)
+
+    def test_brightness_from_signal(self):
+        """Brightness reads are served from PropertiesChanged updates"""
+        fn = Mock()
+        self.display.connect_brightness_changed_signal(fn)
+        receiver = self.props.connect_to_signal.call_args.args[1]
+
+        self.assertEqual(self.display.brightness, 500)
+        receiver("org.kde.ScreenBrightness.Display", {"Brightness": 700}, [])
+
+        self.assertEqual(self.display.brightness, 700)
+        self.props.Get.assert_not_called()
+        fn.assert_called_once()
+        self.assertEqual(self.display.props.misses, 0)
+
+    def test_signal_filtered(self):
+        """Only Brightness changes of the display interface reach the controller"""
+        fn = Mock()
+        self.display.connect_brightness_changed_signal(fn)
+        call = self.props.connect_to_signal.call_args
+        self.assertEqual(call.kwargs["arg0"], "org.kde.ScreenBrightness.Display")
+
+        receiver = call.args[1]
+        receiver("org.kde.ScreenBrightness.Display", {"Label": "Panel"}, [])
+        fn.assert_not_called()
+
+        receiver("org.kde.ScreenBrightness.Display", {"Brightness": 300}, [])
+        fn.assert_called_once_with(
+            "org.kde.ScreenBrightness.Display", {"Brightness": 300}, []
+        )
+        self.assertEqual(self.display.signals.as_dict(), {"received": 2, "acted_on": 1})
+
+    def test_missing_property_fetched_once(self):
+        """Properties absent from GetAll cost one Get, then hit the cache"""
+        self.props.Get.return_value = 5
+        self.assertEqual(self.display.props.get("Extra"), 5)
+        self.assertEqual(self.display.props.get("Extra"), 5)
+
+        self.props.Get.assert_called_once()
+        self.assertEqual(self.display.props.misses, 1)
+
+
+class TestScreensDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.screens = ScreensDbus()
+        self.screens.proxy = Mock()
+        self.screens.on_display_change = Mock()
+        self.brightness = {}
+
+        # properties of each display are fetched asynchronously with GetAll
+        self.screens.bus = Mock()
+        self.screens.bus.get_object.return_value.GetAll.side_effect = (
+            lambda *args, **kw: kw["reply_handler"]({})
+        )
+
+        def display(name, mngr, values):
+            return Mock(
+                name=name,
+                is_internal=name == "display0",
+                brightness=self.brightness.get(name, 500),
+            )
+
+        patcher = patch.object(screens, "ScreenBrightnessDBus", side_effect=display)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def discover(self, *names):
+        self.screens.discover()
+        self.screens.proxy.Get.call_args.kwargs["reply_handler"](list(names))
+
+    def test_all_displays_tracked(self):
+        """Every display name is tracked, not only the internal one"""
+        self.discover("display0", "display1")
+
+        self.assertEqual(list(self.screens.displays), ["display0", "display1"])
+        self.assertEqual(self.screens.on_display_change.call_count, 2)
+
+    def test_rediscover_reports_changes_only(self):
+        """Rediscovery adds and removes the difference"""
+        self.discover("display0", "display1")
+        self.screens.on_display_change.reset_mock()
+        removed = self.screens.displays["display1"]
+
+        self.discover("display0", "display2")
+
+        self.assertEqual(list(self.screens.displays), ["display0", "display2"])
+        removed.disconnect.assert_called_once()
+        calls = [c.args for c in self.screens.on_display_change.call_args_list]
+        self.assertEqual(calls[0], ("display1", None))
+        self.assertEqual(calls[1][0], "display2")
+
+    def test_discovery_coalesced(self):
+        """Rediscovery requested while one is in flight runs once after it"""
+        self.screens.discover()
+        self.screens.discover()
+        self.screens.discover()
+        self.assertEqual(self.screens.proxy.Get.call_count, 1)
+
+        self.screens.proxy.Get.call_args.kwargs["reply_handler"](["display0"])
+        self.assertEqual(self.screens.proxy.Get.call_count, 2)
+
+    def test_signals(self):
+        """DisplayAdded and DisplayRemoved update the tracked displays"""
+        self.screens.on_display_added("display1")
+        self.screens.on_display_added("display1")
+        self.assertEqual(list(self.screens.displays), ["display1"])
+
+        self.screens.on_display_removed("display1")
+        self.assertEqual(self.screens.displays, {})
+        self.assertEqual(self.screens.on_display_change.call_count, 2)
+
+    def test_restart_rebinds(self):
+        """PowerDevil restarting is an outage, changes missed meanwhile are counted"""
+        self.discover("display0", "display1")
+        self.assertTrue(self.screens.bound)
+
+        self.screens.on_vanished()
+        self.assertEqual(self.screens.displays, {})
+        self.assertFalse(self.screens.bound)
+
+        # display1 was changed while nobody was watching
+        self.brightness["display1"] = 200
+        with patch.object(self.screens.bus, "get_object") as get_object:
+            self.screens.on_appeared()
+        get_object.return_value.Get.call_args.kwargs["reply_handler"](
+            ["display0", "display1"]
+        )
+
+        self.assertEqual(list(self.screens.displays), ["display0", "display1"])
+        self.assertTrue(self.screens.bound)
+        stats = self.screens.recovery_stats()
+        self.assertEqual((stats["outages"], stats["events_lost"]), (1, 1))
+        self.assertEqual(stats["recovery_ms"]["count"], 1)
+
+    def test_vanished_while_loading(self):
+        """A display whose properties arrive after PowerDevil left is dropped"""
+        handlers = []
+        self.screens.bus.get_object.return_value.GetAll.side_effect = (
+            lambda *args, **kw: handlers.append(kw["reply_handler"])
+        )
+        self.discover("display0")
+        self.screens.on_vanished()
+
+        handlers[0]({})
+        self.assertEqual(self.screens.displays, {})
+        self.screens.on_display_change.assert_not_called()
+
+
+class TestScreenBrightnessRecovery(ScreenBrightnessTestCase):
+    def test_service_unknown_counts_lost_frames(self):
+        """Writes failing because PowerDevil exited are lost, not retried"""
+        self.display.set_brightness(10)
+        self.display.set_brightness(20)
+
+        err = Mock()
+        err.get_dbus_name.return_value = "org.freedesktop.DBus.Error.ServiceUnknown"
+        self.iface.SetBrightness.call_args.kwargs["error_handler"](err)
+
+        self.assertEqual(self.iface.SetBrightness.call_count, 1)
+        self.mngr.count_lost.assert_called_once_with(2)
+        # the name watch rebinds, not the write path
+        self.mngr.discover.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
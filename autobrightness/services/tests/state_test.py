@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from ..autobrightness import AutoBrightnessService
+from autobrightness.scheduler import VirtualScheduler
+from autobrightness.state import StateWriter, load_state, save_state
+
+
+class TestStateFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "autobrightness", "state.json")
+
+    def test_round_trip(self):
+        """Saved state is loaded back, no temporary files are left behind"""
+        save_state(self.path, {"light_level": 300})
+
+        self.assertEqual(load_state(self.path)["light_level"], 300)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["state.json"])
+
+    def test_missing_or_other_version(self):
+        """Missing files and snapshots of another format version are ignored"""
+        self.assertIsNone(load_state(self.path))
+
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as f:
+            json.dump({"version": 0}, f)
+        self.assertIsNone(load_state(self.path))
+
+    def test_bounded_rate(self):
+        """Changes within min_interval are folded into one write"""
+        scheduler = VirtualScheduler()
+        get_state = Mock(return_value={})
+        writer = StateWriter(self.path, scheduler, get_state, min_interval=30)
+
+        writer.mark_dirty()
+        scheduler.run_until_idle()
+        for _ in range(100):
+            writer.mark_dirty()
+            scheduler.advance(0.1)
+        self.assertEqual(writer.writes, 1)
+
+        scheduler.run_until_idle()
+        self.assertEqual(writer.writes, 2)
+        self.assertEqual(scheduler.monotonic(), 30)
+
+        writer.mark_dirty()
+        writer.flush()
+        self.assertEqual(writer.writes, 3)
+        scheduler.run_until_idle()
+        self.assertEqual(writer.writes, 3)
+
+
+class TestWarmStart(unittest.TestCase):
+    def display(self, brightness):
+        display = Mock(max_brightness=10000, brightness=brightness, is_internal=True)
+        display.name = "display0"
+        display.label = "Built-in Screen"
+        return display
+
+    def test_restore(self):
+        """Bucket and bias of a previous run apply to the first decision"""
+        service = AutoBrightnessService(scheduler=VirtualScheduler())
+        service.on_screens_change("display0", self.display(5000))
+        controller = service.controllers["display0"]
+        controller.current_bucket_idx = 3
+        controller.user_brightness_bias = 500
+        state = json.loads(json.dumps(service.get_state()))
+
+        restarted = AutoBrightnessService(scheduler=VirtualScheduler())
+        restarted.restore_state(state)
+        restarted.on_screens_change("display0", self.display(8000))
+        controller = restarted.controllers["display0"]
+
+        self.assertEqual(controller.current_bucket_idx, 3)
+        self.assertEqual(controller.user_brightness_bias, 500)
+        # 600 lux lies in the overlap of buckets 2 and 3, bucket 3 is kept
+        restarted.current_light_level = 600
+        self.assertEqual(controller.get_recommended_brightness(500), 8000)
+
+    def test_changed_curve_keeps_bias_only(self):
+        """A bucket index is not restored into a different curve"""
+        service = AutoBrightnessService(scheduler=VirtualScheduler())
+        service.restore_state(
+            {
+                "curve": "other",
+                "light_level": 600,
+                "displays": {
+                    "display0": {"max_brightness": 10000, "bucket": 3, "bias": 500}
+                },
+            }
+        )
+        service.on_screens_change("display0", self.display(5000))
+        controller = service.controllers["display0"]
+
+        self.assertEqual(service.current_light_level, 600)
+        self.assertEqual(controller.current_bucket_idx, 2)
+        self.assertEqual(controller.user_brightness_bias, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
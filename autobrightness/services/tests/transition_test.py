@@ -0,0 +1,92 @@
+import unittest
+
+from autobrightness.transition import EchoWindow, Transition, plan_transition
+
+
+class TestPlanTransition(unittest.TestCase):
+    def test_write_budget(self):
+        """Full range transition fits in max_writes and ends on target"""
+        values = plan_transition(0, 10000, 10000, max_writes=20)
+        self.assertLessEqual(len(values), 20)
+        self.assertEqual(values[-1], 10000)
+        self.assertEqual(values, sorted(values))
+
+    def test_perceptual_spacing(self):
+        """Steps are smaller at low brightness than at high brightness"""
+        values = plan_transition(0, 10000, 10000, max_writes=20)
+        steps = [b - a for a, b in zip(values, values[1:])]
+        self.assertLess(steps[0], steps[-1])
+
+    def test_small_delta(self):
+        """Small transitions use no more writes than brightness steps"""
+        self.assertEqual(plan_transition(10, 13, 100, max_writes=20), [11, 12, 13])
+        self.assertEqual(plan_transition(50, 50, 100, max_writes=20), [])
+        self.assertEqual(plan_transition(60, 40, 100, max_writes=20)[-1], 40)
+
+
+class TestTransition(unittest.TestCase):
+    def test_on_time(self):
+        """Frames are due evenly over the planned duration"""
+        t = Transition([1, 2, 3, 4, 5], duration=1.0, started_at=10.0)
+        written = []
+        now = 10.0
+        while not t.done:
+            written.append(t.next_value(now))
+            now += t.delay(now)
+
+        self.assertEqual(written, [1, 2, 3, 4, 5])
+        self.assertEqual(t.finished_at, 11.0)
+        self.assertEqual(t.dropped, 0)
+
+    def test_late_tick_drops_frames(self):
+        """A late tick skips overdue frames instead of drifting"""
+        t = Transition([1, 2, 3, 4, 5], duration=1.0, started_at=0.0)
+        self.assertEqual(t.next_value(0.0), 1)
+        self.assertEqual(t.next_value(0.8), 4)
+        self.assertEqual(t.dropped, 2)
+        self.assertAlmostEqual(t.delay(0.8), 0.2)
+
+
+class TestEchoWindow(unittest.TestCase):
+    def test_echo_settles_earlier_writes(self):
+        """Writes merged before an echoed one are not expected anymore"""
+        window = EchoWindow()
+        for value in (10, 20, 30):
+            window.expect(value, 0.0)
+
+        self.assertTrue(window.match(20, 0.1))
+        self.assertEqual(len(window), 1)
+        self.assertFalse(window.match(10, 0.1))
+        self.assertTrue(window.match(30, 0.1))
+        self.assertEqual(len(window), 0)
+
+    def test_repeated_value(self):
+        """The echo of a value written twice settles the newest write"""
+        window = EchoWindow()
+        for value in (10, 20, 10):
+            window.expect(value, 0.0)
+
+        self.assertEqual(window.match(10, 0.1), (3, 10, 0.0, False))
+        self.assertEqual(len(window), 0)
+
+    def test_frame_flag(self):
+        """The matched write tells animation frames from single writes"""
+        window = EchoWindow()
+        window.expect(10, 0.0, frame=True)
+        window.expect(20, 0.1)
+
+        self.assertTrue(window.match(10, 0.2)[3])
+        self.assertFalse(window.match(20, 0.2)[3])
+
+    def test_expiry(self):
+        """Writes never echoed stop matching after the timeout"""
+        window = EchoWindow(timeout=1.0)
+        window.expect(10, 0.0)
+        window.expect(20, 0.5)
+
+        self.assertFalse(window.match(10, 1.2))
+        self.assertTrue(window.match(20, 1.2))
+
+
+if __name__ == "__main__":
+    unittest.main()
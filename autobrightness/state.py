@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import tempfile
+
+STATE_VERSION = 1
+
+
+def state_path() -> str:
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.expanduser(
+        "~/.local/state"
+    )
+    return os.path.join(state_home, "autobrightness", "state.json")
+
+
+def load_state(path: str) -> dict | None:
+    """Reads a state snapshot, None when missing or from another version"""
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if not isinstance(state, dict):
+        raise ValueError(f"{path}: expected a JSON object")
+    if state.get("version") != STATE_VERSION:
+        return None
+    return state
+
+
+def save_state(path: str, state: dict):
+    """Writes the snapshot to a temporary file and renames it over `path`,
+    so a crash never leaves a partially written file behind"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": STATE_VERSION, **state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class StateWriter:
+    """Saves snapshots from `get_state` at most once per `min_interval`.
+
+    `mark_dirty` schedules a single write, further changes before it runs
+    are folded into it. Nothing is scheduled while the state is unchanged.
+    """
+
+    def __init__(
+        self, path: str, scheduler, get_state: callable, min_interval: float = 30.0
+    ) -> None:
+        self.path = path
+        self.scheduler = scheduler
+        self.get_state = get_state
+        self.min_interval = min_interval
+        self.dirty = False
+        self.source: int | None = None
+        self.last_write: float | None = None
+        self.writes = 0
+        self.logger = logging.getLogger(__name__)
+
+    def mark_dirty(self):
+        self.dirty = True
+        if self.source is not None:
+            return
+
+        delay = 0.0
+        if self.last_write is not None:
+            delay = max(
+                self.last_write + self.min_interval - self.scheduler.monotonic(), 0
+            )
+        self.source = self.scheduler.timeout_add(delay, self.on_timeout)
+
+    def on_timeout(self):
+        self.source = None
+        self.write()
+        return False
+
+    def flush(self):
+        if self.source is not None:
+            self.scheduler.source_remove(self.source)
+            self.source = None
+        if self.dirty:
+            self.write()
+
+    def write(self):
+        self.dirty = False
+        self.last_write = self.scheduler.monotonic()
+        try:
+            save_state(self.path, self.get_state())
+            self.writes += 1
+        except OSError as e:
+            self.logger.warning(f"Failed to save state: {e}")
@@ -0,0 +1,44 @@
+import time
+
+
+class TraceRecorder:
+    """Appends service events to a line-delimited trace file.
+
+    Each line is `<monotonic seconds>\\t<kind>\\t<values...>`, where kind is one
+    of `start`, `display`, `lux`, `brightness`, `bias`, `anim_start`, `anim_stop`.
+    """
+
+    def __init__(self, path: str, clock: callable = time.monotonic) -> None:
+        self.clock = clock
+        self.file = open(path, "a", buffering=1)
+        self.record("start")
+
+    def record(self, kind: str, *values):
+        fields = "".join(f"\t{v}" for v in values)
+        self.file.write(f"{self.clock():.3f}\t{kind}{fields}\n")
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path: str):
+    """Yields (timestamp, kind, values) tuples from a trace file.
+
+    Timestamps are rebased so that sessions appended to the same file
+    follow each other without gaps or going backwards.
+    """
+    offset = None
+    last = 0.0
+
+    with open(path) as f:
+        for line in f:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2:
+                continue
+
+            t = float(fields[0])
+            if fields[1] == "start" or offset is None:
+                offset = last - t
+
+            last = t + offset
+            yield last, fields[1], [int(v) for v in fields[2:]]
@@ -0,0 +1,133 @@
+from collections import deque
+
+
+def plan_transition(
+    start: int, target: int, max_brightness: int, max_writes: int, gamma: float = 2.2
+) -> list:
+    """Brightness values for each frame of a transition from start to target.
+
+    Frames are evenly spaced in perceived lightness, approximated as
+    (brightness / max_brightness) ** (1 / gamma), so steps are small near
+    black and larger near full brightness. Consecutive duplicates are
+    dropped, the last value is always the target.
+    """
+    if start == target or max_brightness <= 0:
+        return []
+
+    inv = 1 / gamma
+    p0 = (min(max(start, 0), max_brightness) / max_brightness) ** inv
+    p1 = (min(max(target, 0), max_brightness) / max_brightness) ** inv
+    frame_count = max(1, min(max_writes, abs(target - start)))
+
+    values = []
+    for i in range(1, frame_count + 1):
+        p = p0 + (p1 - p0) * i / frame_count
+        value = round(max_brightness * p**gamma)
+        if not values or value != values[-1]:
+            values.append(value)
+
+    values[-1] = target
+    return values
+
+
+class Transition:
+    """Frame schedule of one transition against a monotonic clock deadline.
+
+    The first frame is written immediately and the last one is due after
+    `duration`, frame i is due at `started_at + i * interval`. When a tick
+    comes late the frames already overdue are dropped and only the newest
+    one is written, so the transition ends on time instead of drifting.
+    """
+
+    def __init__(self, values: list, duration: float, started_at: float) -> None:
+        self.values = values
+        self.duration = duration
+        self.interval = duration / max(len(values) - 1, 1)
+        self.started_at = started_at
+        self.next_frame = 0
+        self.writes = 0
+        self.dropped = 0
+        self.last_value: int | None = None
+        self.finished_at: float | None = None
+
+    @property
+    def target(self) -> int:
+        return self.values[-1]
+
+    @property
+    def done(self) -> bool:
+        return self.next_frame >= len(self.values)
+
+    def next_value(self, now: float) -> int:
+        """Value to write at `now`, counting overdue frames as dropped"""
+        due = int((now - self.started_at) / self.interval)
+        due = min(max(due, self.next_frame), len(self.values) - 1)
+
+        self.dropped += due - self.next_frame
+        self.next_frame = due + 1
+        self.writes += 1
+        self.last_value = self.values[due]
+        if self.done:
+            self.finished_at = now
+        return self.last_value
+
+    def delay(self, now: float) -> float:
+        """Seconds until the next frame is due"""
+        return max(self.started_at + self.next_frame * self.interval - now, 0)
+
+
+# echoes later than this are not expected anymore, PowerDevil answers within
+# milliseconds, DDC monitors within a few hundred
+ECHO_TIMEOUT = 2.0
+
+
+class EchoWindow:
+    """Brightness values written whose change signal has not come back yet.
+
+    Writes are tagged with increasing sequence numbers. A change matching an
+    expected value is the echo of the newest write of that value, and writes
+    before it are settled too, they were merged or echoed already since
+    signals arrive in order. Lookup is a dict access, settled and expired
+    writes leave from the front of the queue.
+    """
+
+    def __init__(self, timeout: float = ECHO_TIMEOUT) -> None:
+        self.timeout = timeout
+        self.seq = 0
+        self.pending: deque = deque()
+        self.latest: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def expect(self, value: int, now: float, frame: bool = False):
+        """`frame` marks writes of an animation, as opposed to single writes"""
+        self._expire(now)
+        self.seq += 1
+        self.pending.append((self.seq, value, now, frame))
+        self.latest[value] = self.seq
+
+    def match(self, value: int, now: float) -> tuple | None:
+        """(seq, value, time, frame) of the write `value` is the echo of,
+        settling it, None if `value` is no echo"""
+        self._expire(now)
+        seq = self.latest.get(value)
+        if seq is None:
+            return None
+        while self.pending[0][0] < seq:
+            self._settle()
+        return self._settle()
+
+    def clear(self):
+        self.pending.clear()
+        self.latest.clear()
+
+    def _expire(self, now: float):
+        while self.pending and now - self.pending[0][2] > self.timeout:
+            self._settle()
+
+    def _settle(self) -> tuple:
+        entry = seq, value, _, _ = self.pending.popleft()
+        if self.latest.get(value) == seq:
+            del self.latest[value]
+        return entry
@@ -0,0 +1,127 @@
+"""Compares the dbus-python/GLib and the asyncio/jeepney backends.
+
+Starts the daemon once per backend against the fake D-Bus services and
+reports for each:
+- time from process start to the first brightness write, as logged
+- resident memory after startup, from /proc/PID/status
+- CPU time spent in the daemon per lux signal during a burst, from
+  /proc/PID/stat
+
+Usage: python -m benchmarks.backends [--burst N] [--rate N] [--json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from autobrightness.services.tests import fakebus
+
+FIRST_WRITE = re.compile(r"First brightness write (\d+) ms after start")
+
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    raise ValueError("VmRSS missing")
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime, fields 14 and 15 counting from the pid
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def lux_signals() -> int:
+    import dbus
+    from autobrightness.services.common import STATS_NAME, STATS_PATH
+
+    proxy = dbus.SessionBus().get_object(STATS_NAME, STATS_PATH, introspect=False)
+    return int(proxy.GetStats(dbus_interface=STATS_NAME)["lux_signals"])
+
+
+def wait_for(predicate: callable, timeout: float):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("condition not met in time")
+        time.sleep(0.01)
+
+
+def measure(backend: str, bus, burst: int, rate: int) -> dict:
+    bus.sensor.SetLightLevel(5000.0)
+    bus.display.SetBrightnessExternal(500)
+
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, XDG_STATE_HOME=home, XDG_CONFIG_HOME=home)
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "autobrightness.cli", "--backend", backend],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env=env,
+        )
+        try:
+            startup_ms = None
+            for line in proc.stdout:
+                match = FIRST_WRITE.search(line)
+                if match:
+                    startup_ms = int(match.group(1))
+                    break
+            if startup_ms is None:
+                raise RuntimeError(f"{backend}: daemon exited before the first write")
+
+            # let the initial transition finish before sampling memory
+            time.sleep(2)
+            rss = rss_kib(proc.pid)
+
+            received = lux_signals()
+            cpu_start = cpu_seconds(proc.pid)
+            bus.sensor.Burst(burst, rate, 300.0)
+            wait_for(lambda: lux_signals() - received >= burst, timeout=60)
+            cpu = cpu_seconds(proc.pid) - cpu_start
+        finally:
+            proc.terminate()
+            proc.wait(5)
+
+    return {
+        "startup_to_first_write_ms": startup_ms,
+        "rss_kib": rss,
+        "burst_cpu_us_per_signal": round(cpu / burst * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser("backends")
+    parser.add_argument("--burst", type=int, default=5000)
+    parser.add_argument("--rate", type=int, default=2000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reason = fakebus.available()
+    if reason:
+        print(f"cannot run: {reason}", file=sys.stderr)
+        return 1
+
+    results = {}
+    with fakebus.FakeBus(max_brightness=1000, brightness=500) as bus:
+        for backend in ("dbus", "asyncio"):
+            results[backend] = measure(backend, bus, args.burst, args.rate)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for backend, result in results.items():
+            print(f"{backend}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Compares brightness write latency of PowerDevil and the sysfs backlight path.
+
+Runs both display clients against the fake D-Bus services and reports, per
+SetBrightness call:
+- call to reply, as seen by the WritePipeline latency histogram
+- call to the brightness change being observed, a PropertiesChanged signal
+  from PowerDevil, an inotify event on the backlight attribute otherwise
+
+The fake PowerDevil answers directly, on a real system it forwards every
+write to logind or its helper, so the PowerDevil numbers are a lower bound
+and the difference is the extra daemon hop per frame.
+
+Usage: python -m benchmarks.backlight [--writes N] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from autobrightness.services.tests import fakebus
+
+
+def summary(samples: list) -> dict:
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1] * 1000, 3),
+    }
+
+
+def measure(display, count: int) -> dict:
+    seen = {}
+    display.connect_brightness_changed_signal(
+        lambda _, changed, *args: seen.setdefault(
+            int(changed["Brightness"]), time.monotonic()
+        )
+    )
+
+    replies = []
+    changes = []
+    for i in range(count):
+        value = 100 + i % 2 * 100
+        seen.clear()
+        started = time.monotonic()
+        display.set_brightness(value)
+        fakebus.run_until(lambda: not display.write_in_flight)
+        replies.append(time.monotonic() - started)
+        fakebus.run_until(lambda: value in seen)
+        changes.append(seen[value] - started)
+
+    display.disconnect()
+    return {"reply": summary(replies), "change_observed": summary(changes)}
+
+
+def main():
+    parser = argparse.ArgumentParser("backlight")
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reason = fakebus.available()
+    if reason:
+        print(f"cannot run: {reason}", file=sys.stderr)
+        return 1
+
+    from dbus.mainloop.glib import DBusGMainLoop
+    from autobrightness.scheduler import GLibScheduler
+    from autobrightness.services.backlight import BacklightScreens
+    from autobrightness.services.logind import LogindSessionDBus
+    from autobrightness.services.screens import ScreenBrightnessDBus
+
+    DBusGMainLoop(set_as_default=True)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        device = os.path.join(root, "intel_backlight")
+        os.makedirs(device)
+        for attr, value in [("max_brightness", 1000), ("brightness", 500)]:
+            with open(os.path.join(device, attr), "w") as f:
+                f.write(f"{value}\n")
+
+        with fakebus.FakeBus(max_brightness=1000, brightness=500, backlight=root):
+            results["powerdevil"] = measure(
+                ScreenBrightnessDBus(fakebus.DISPLAY_NAME, None), args.writes
+            )
+
+            screens = BacklightScreens(GLibScheduler(), LogindSessionDBus(), root)
+            screens.run()
+            try:
+                results["backlight"] = measure(
+                    screens.displays["intel_backlight"], args.writes
+                )
+            finally:
+                screens.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for path, result in results.items():
+            print(f"{path}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""End-to-end benchmarks against the fake D-Bus services.
+
+Runs the real daemon clients against a private dbus-daemon and reports:
+- latency from a LightLevel signal to the first SetBrightness call
+- SetBrightness calls per brightness transition
+- CPU time spent in the daemon process per lux signal during a burst
+
+Usage: python -m benchmarks.dbus_e2e [--transitions N] [--burst N] [--rate N]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from autobrightness.services.tests import fakebus
+
+
+def measure_transitions(bus, service, count: int):
+    latencies = []
+    writes = []
+    lux_levels = [5000.0, 10.0]
+    display = service.controllers[fakebus.DISPLAY_NAME]
+
+    for i in range(count):
+        lux = lux_levels[i % 2]
+        bus.display.ResetWrites()
+        emitted_at = float(bus.sensor.SetLightLevel(lux))
+
+        target = display.get_recommended_brightness(bias=display.user_brightness_bias)
+        fakebus.run_until(
+            lambda: display.anim_bright_target is None
+            and display.current_brightness == target,
+            timeout=60,
+        )
+
+        transition = bus.display.GetWrites()
+        if transition:
+            latencies.append(float(transition[0][0]) - emitted_at)
+            writes.append(len(transition))
+
+    return latencies, writes
+
+
+def measure_burst(bus, service, count: int, rate: int):
+    received = service.lux_signals
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+
+    # alternate between two values inside one bucket so only signal cost counts
+    bus.sensor.Burst(count, rate, 300.0)
+    fakebus.run_until(lambda: service.lux_signals - received >= count, timeout=60)
+
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+    return cpu, wall
+
+
+def main():
+    parser = argparse.ArgumentParser("dbus_e2e")
+    parser.add_argument("--transitions", type=int, default=6)
+    parser.add_argument("--burst", type=int, default=5000)
+    parser.add_argument("--rate", type=int, default=5000)
+    parser.add_argument("--debounce", type=float, default=None)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reason = fakebus.available()
+    if reason:
+        print(f"cannot run: {reason}", file=sys.stderr)
+        return 1
+
+    from dbus.mainloop.glib import DBusGMainLoop
+    from autobrightness.services.autobrightness import AutoBrightnessService
+
+    DBusGMainLoop(set_as_default=True)
+
+    with fakebus.FakeBus(max_brightness=1000, brightness=500) as bus:
+        bus.sensor.SetLightLevel(300.0)
+
+        service = AutoBrightnessService()
+        if args.debounce is not None:
+            service.debounce_interval = args.debounce
+        service.run()
+        fakebus.run_until(lambda: fakebus.DISPLAY_NAME in service.controllers)
+        controller = service.controllers[fakebus.DISPLAY_NAME]
+        fakebus.run_until(lambda: controller.anim_bright_target is None, timeout=60)
+
+        try:
+            latencies, writes = measure_transitions(bus, service, args.transitions)
+            cpu, wall = measure_burst(bus, service, args.burst, args.rate)
+        finally:
+            service.stop()
+
+    results = {
+        "debounce_s": service.debounce_interval,
+        "signal_to_first_write_ms": round(statistics.median(latencies) * 1000, 2),
+        "signal_to_first_write_minus_debounce_ms": round(
+            (statistics.median(latencies) - service.debounce_interval) * 1000, 2
+        ),
+        "writes_per_transition": statistics.median(writes),
+        "burst_signals": args.burst,
+        "burst_rate_per_s": round(args.burst / wall),
+        "burst_cpu_us_per_signal": round(cpu / args.burst * 1e6, 2),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
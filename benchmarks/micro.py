@@ -0,0 +1,211 @@
+"""Micro-benchmarks of the brightness decision path on a virtual clock.
+
+Each case runs a number of events through the real service code without
+D-Bus traffic and reports:
+- CPU time per event, the best of several repeats
+- peak memory allocated while the events run, traced with tracemalloc
+- memory blocks still allocated after all events ran, which grows with the
+  event count when something leaks
+
+Results are compared with benchmarks/baselines.json, the runner exits with 1
+when CPU time or peak memory grows by more than --tolerance, or when more
+blocks are retained than in the baseline plus a small slack. The daemon
+runs under CPUQuota=5%, so per-event cost is what matters.
+
+Usage: python -m benchmarks.micro [--case NAME] [--update-baseline] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from autobrightness.curve import BrightnessCurve
+from autobrightness.replay import FakeDisplay
+from autobrightness.scheduler import VirtualScheduler
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+REPEATS = 7
+
+# absolute slack on top of the relative tolerance for allocation metrics,
+# far below the event count of each case so a per-event leak always fails
+PEAK_SLACK_KIB = 16
+RETAINED_SLACK = 32
+
+
+def make_service(curve: BrightnessCurve | None = None):
+    from autobrightness.services.autobrightness import AutoBrightnessService
+
+    service = AutoBrightnessService(scheduler=VirtualScheduler(), backend="replay")
+    if curve is not None:
+        service.set_curve(curve)
+    display = FakeDisplay(max_brightness=10000, brightness=5000)
+    service.on_screens_change(display.name, display)
+    return service, service.controllers[display.name]
+
+
+def lux_sweep(count: int) -> list:
+    # deterministic walk over 0..100000 lux, evenly spread in log space
+    return [round(10 ** (5 * ((i * 7919) % count) / count)) for i in range(count)]
+
+
+def recommended_brightness(count: int):
+    """Bucket lookup for random lux over a 1000 bucket curve"""
+    curve = BrightnessCurve.from_points(
+        [[0, 5], [100, 40], [1000, 70], [100000, 100]], steps=1000
+    )
+    service, controller = make_service(curve)
+    controller.get_recommended_brightness()  # compile the lookup table
+    lux = lux_sweep(count)
+
+    def run():
+        for value in lux:
+            service.current_light_level = value
+            controller.get_recommended_brightness(bias=100)
+
+    return run
+
+
+def echo_storm(count: int):
+    """Writes echoed by the display while an animation is running"""
+    service, controller = make_service()
+    values = [5001 + i % 100 for i in range(count)]
+
+    def run():
+        controller.anim_bright_target = 9000
+        now = service.scheduler.monotonic()
+        for value in values:
+            controller.write(value, now)
+
+    return run
+
+
+def sensor_burst(count: int):
+    """LightLevel signals alternating inside one bucket"""
+    service, controller = make_service()
+    props = [{"LightLevel": 300 + (i % 2) * 20} for i in range(count)]
+
+    def run():
+        for changed in props:
+            service.scheduler.advance(0.01)
+            service.handle_sensor_props_change("net.hadess.SensorProxy", changed, [])
+        service.scheduler.run_until_idle()
+
+    return run
+
+
+def transition_cycle(count: int):
+    """Lux jump, debounce, planned transition and echoes until settled"""
+    service, controller = make_service()
+
+    def run():
+        for i in range(count):
+            lux = 5000 if i % 2 == 0 else 5
+            for _ in range(3):
+                service.handle_sensor_props_change(
+                    "net.hadess.SensorProxy", {"LightLevel": lux}, []
+                )
+            service.scheduler.run_until_idle()
+
+    return run
+
+
+CASES = {
+    "recommended_brightness": (recommended_brightness, 50000),
+    "echo_storm": (echo_storm, 200000),
+    "sensor_burst": (sensor_burst, 20000),
+    "transition_cycle": (transition_cycle, 1000),
+}
+
+
+def measure(name: str) -> dict:
+    setup, count = CASES[name]
+
+    best = None
+    for _ in range(REPEATS):
+        run = setup(count)
+        started = time.process_time()
+        run()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    run = setup(count)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    stats = after.filter_traces(own).compare_to(before.filter_traces(own), "filename")
+    retained = sum(s.count_diff for s in stats)
+    return {
+        "events": count,
+        "cpu_us_per_event": round(best / count * 1e6, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "retained_blocks": max(retained, 0),
+    }
+
+
+def regressions(name: str, result: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    limits = {
+        "cpu_us_per_event": baseline["cpu_us_per_event"] * (1 + tolerance),
+        "peak_kib": baseline["peak_kib"] * (1 + tolerance) + PEAK_SLACK_KIB,
+        "retained_blocks": baseline["retained_blocks"] + RETAINED_SLACK,
+    }
+    for key, limit in limits.items():
+        if result[key] > limit:
+            found.append(f"{name}: {key} {result[key]} > {limit:.3f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser("micro")
+    parser.add_argument("--case", choices=sorted(CASES), action="append")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Allowed relative growth over the baseline, default 0.5",
+    )
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+
+    results = {name: measure(name) for name in args.case or CASES}
+
+    if args.update_baseline:
+        baselines.update(results)
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    found = []
+    for name, result in results.items():
+        if name in baselines and not args.update_baseline:
+            found += regressions(name, result, baselines[name], args.tolerance)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print(f"{name}: " + ", ".join(f"{k}={v}" for k, v in result.items()))
+    for line in found:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,10 +6,11 @@ setup(
     version="0.1.4",
     description="Adjusts screen brighness based on ambient light sensor (ALS)",
     packages=find_packages(
-        exclude=["contrib", "docs", "autobrightness.services.tests"]
+        exclude=["contrib", "docs", "benchmarks", "autobrightness.services.tests"]
     ),
     install_requires=[
         "dbus-python>=1.3.2",
     ],
+    extras_require={"asyncio": ["jeepney>=0.8"], "calibrate": ["numpy"]},
     entry_points={"console_scripts": ["autobrightnesscli = autobrightness.cli:main"]},
 )